@@ -1,4 +1,4 @@
-from os import environ
+from os import environ, cpu_count
 from tempfile import gettempdir
 from pathlib import Path
 
@@ -25,5 +25,86 @@ TEMP_DIR = Path(gettempdir())
 # Memory limit in bytes per test case
 DEFAULT_MEMORY_LIMIT = 100 * 1024 * 1024  # 1MB
 
-# Time limit in seconds per test case
-DEFAULT_TIMEOUT = 5  # 5 seconds
\ No newline at end of file
+# Time limit per test case, in seconds of CPU time used by the test
+DEFAULT_TIMEOUT = 5  # 5 seconds
+
+# A test is also stopped once it has run for this many times its time limit, however little
+# CPU time it has used (e.g. it is sleeping, or waiting for a CPU on a saturated host)
+WALL_TIME_FACTOR = float(environ.get("WALL_TIME_FACTOR", 3))
+
+# Run a test which exceeds its time limit once more, after the submission's other tests and
+# once the container is mostly idle, before reporting the timeout
+RETRY_TLE = environ.get("RETRY_TLE", "false").lower() == "true"
+
+# Seconds a retry waits for the container to become mostly idle before running anyway
+RETRY_TLE_IDLE_WAIT = float(environ.get("RETRY_TLE_IDLE_WAIT", 10))
+
+# Maximum bytes of stdout/stderr kept per test case (the start and end are kept)
+MAX_OUTPUT_BYTES = int(environ.get("MAX_OUTPUT_BYTES", 64 * 1024))
+
+# Run all test cases for a submission through a single harness process
+# (where the executor supports it) instead of one process per test case
+BATCH_EXECUTION = environ.get("BATCH_EXECUTION", "true").lower() == "true"
+
+# Number of test cases a batch harness runs concurrently
+BATCH_WORKERS = int(environ.get("BATCH_WORKERS", 1))
+
+# Time limit in seconds for compiling a submission (for compiled languages)
+COMPILE_TIMEOUT = int(environ.get("COMPILE_TIMEOUT", 30))
+
+# Pool of pre-warmed runtime workers used to run batched submissions
+POOL_ENABLED = environ.get("POOL_ENABLED", "true").lower() == "true"
+
+# Number of idle workers kept warm per process
+POOL_SIZE = int(environ.get("POOL_SIZE", 1))
+
+# Number of submissions a worker runs before being replaced
+POOL_MAX_USES = int(environ.get("POOL_MAX_USES", 50))
+
+# Seconds a worker may sit idle before being reaped
+POOL_IDLE_TIMEOUT = int(environ.get("POOL_IDLE_TIMEOUT", 300))
+
+# Maximum number of test processes running at once across the container
+# (shared by every Celery worker process), defaults to the number of CPUs
+MAX_CONCURRENT_TESTS = int(environ.get("MAX_CONCURRENT_TESTS", cpu_count() or 1))
+
+# Number of results sent per message to the output queue (0 sends one 'result'
+# message per test case instead of batched 'result_batch' messages)
+RESULT_BATCH_SIZE = int(environ.get("RESULT_BATCH_SIZE", 10))
+
+# Seconds a result may wait to be batched before it is sent
+RESULT_BATCH_INTERVAL = float(environ.get("RESULT_BATCH_INTERVAL", 0.25))
+
+# Port the main worker process serves Prometheus metrics on (0 disables it), and the
+# directory where every Celery worker process records its metrics
+METRICS_PORT = int(environ.get("METRICS_PORT", 9100))
+METRICS_DIR = environ.get("METRICS_DIR", str(TEMP_DIR / "execution-metrics"))
+
+# Log level for the structured (JSON) logs
+LOG_LEVEL = environ.get("LOG_LEVEL", "INFO")
+
+# Where to export trace spans - a Zipkin collector URL or file:///path (disabled if empty)
+TRACE_EXPORT_URL = environ.get("TRACE_EXPORT_URL", "")
+
+# Redis the submission service stages test suites in, for submissions which reference a
+# suite instead of carrying their test cases
+SUITE_REDIS_URL = environ.get("SUITE_REDIS_URL", BROKER)
+
+# Directory staged test suites are cached in, shared by every Celery worker process
+SUITE_CACHE_DIR = Path(environ.get("SUITE_CACHE_DIR", str(TEMP_DIR / "openjudge-suites")))
+
+# Number of parsed test suites each Celery worker process keeps in memory
+SUITE_MEMORY_CACHE_SIZE = int(environ.get("SUITE_MEMORY_CACHE_SIZE", 32))
+
+# Run each test process in its own cgroup v2 leaf, which limits its memory, CPU and number
+# of processes and reports exactly what it used. Requires a writable cgroup v2 hierarchy at
+# CGROUP_ROOT delegated to the container - the processes in it are moved to a leaf on start.
+# Batch harnesses which run tests as threads of one process (Java's) can't give each test a
+# leaf, so with this enabled those executors ignore BATCH_EXECUTION and POOL_ENABLED and run
+# each test in its own process and leaf
+CGROUP_SANDBOX = environ.get("CGROUP_SANDBOX", "false").lower() == "true"
+CGROUP_ROOT = Path(environ.get("CGROUP_ROOT", "/sys/fs/cgroup"))
+
+# CPUs a test process may use at once (cpu.max), and processes/threads it may run (pids.max)
+CGROUP_CPU_LIMIT = float(environ.get("CGROUP_CPU_LIMIT", 1))
+CGROUP_PIDS_LIMIT = int(environ.get("CGROUP_PIDS_LIMIT", 128))
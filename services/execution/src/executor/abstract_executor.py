@@ -3,16 +3,100 @@ This file defines the abstract executor class, which is used to execute code for
 All new languages must implement the abstract executor class.
 """
 
-import subprocess
 import asyncio
+import logging
 import shutil
+import signal
+import time
 import gc
-from os import makedirs
+from os import makedirs, killpg
+from pathlib import Path
 from uuid import uuid4
-from typing import List, Dict, Any
+from json import loads, dumps, JSONDecodeError
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 
-from src.config import TEMP_DIR, DEFAULT_MEMORY_LIMIT, DEFAULT_TIMEOUT
+from src.config import (
+    TEMP_DIR,
+    DEFAULT_MEMORY_LIMIT,
+    DEFAULT_TIMEOUT,
+    WALL_TIME_FACTOR,
+    RETRY_TLE,
+    RETRY_TLE_IDLE_WAIT,
+    BATCH_EXECUTION,
+    BATCH_WORKERS,
+    POOL_ENABLED,
+    POOL_MAX_USES,
+    MAX_OUTPUT_BYTES,
+    LANGUAGE,
+)
+from src.instrumentation import record_test, SUBMISSION_DURATION
+from src.tracing import Span, TraceContext, record_child
 from src.sandbox.secure_executor import SecureSandbox
+from src.sandbox.pool import WorkerPool, get_pool
+from src.sandbox import cgroup
+from src.sandbox.resources import Leaf, process_cpu_time
+from src.executor.scheduler import scheduler
+
+# Longest result line accepted from a batch harness
+BATCH_LINE_LIMIT = 4 * MAX_OUTPUT_BYTES + 64 * 1024
+
+TRUNCATED_MARKER = b"\n... output truncated ...\n"
+
+# Seconds between checks of the CPU time used by a running test
+CPU_POLL_INTERVAL = 0.05
+
+# Resource usage fields reported by batch harnesses alongside each result, and included
+# in each result sent to the output queue (null where they were not measured)
+USAGE_FIELDS = ("wall_time", "cpu_time", "max_rss")
+
+logger = logging.getLogger("execution")
+
+
+def _kill_process_group(pid: int) -> None:
+    """
+    Kills a process started in its own session and everything it started.
+    """
+    try:
+        killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _truncate_output(data: bytes, limit: int) -> bytes:
+    """
+    Truncates output longer than limit bytes, keeping the start and the end (which holds
+    the actual output line for the stderr protocol used by the test runners).
+    """
+    if len(data) <= limit + len(TRUNCATED_MARKER):
+        return data
+    half = limit // 2
+    return data[:half] + TRUNCATED_MARKER + data[-half:]
+
+
+async def _read_stream(stream: asyncio.StreamReader, limit: int) -> bytes:
+    """
+    Reads a stream until EOF, keeping at most limit bytes from its start and its end.
+    The rest is discarded as it arrives so a noisy process cannot exhaust memory.
+    """
+    half = limit // 2
+    head = bytearray()
+    tail = bytearray()
+    truncated = False
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            break
+        if len(head) < half:
+            take = half - len(head)
+            head += chunk[:take]
+            chunk = chunk[take:]
+        tail += chunk
+        if len(tail) > half:
+            del tail[:len(tail) - half]
+            truncated = True
+    if truncated:
+        return bytes(head) + TRUNCATED_MARKER + bytes(tail)
+    return bytes(head + tail)
 
 class AbstractExecutor:
     def __init__(
@@ -23,6 +107,10 @@ class AbstractExecutor:
         submission_code: str,
         submission_id: str,
         send_results: callable,
+        hidden: Optional[list] = None,
+        trace: Optional[TraceContext] = None,
+        fail_fast: bool = False,
+        tests_file: Optional[Path] = None,
         ):
         # Initialise fields
         self.submission_id = submission_id
@@ -32,11 +120,37 @@ class AbstractExecutor:
         self.outputs = outputs
         self.num_tests = len(inputs)
         self.send_results = send_results
+        self.hidden = hidden or [False] * self.num_tests
+        # Trace context that spans for building the submission and each test belong to
+        self.trace = trace
+        # File the test runners read test cases from - a staged suite cached by the
+        # container, otherwise written for the submission by _write_test_suite
+        self.tests_file = tests_file
 
+        # The time limit is on the CPU time a test uses, so that tests waiting for a CPU on
+        # a busy container do not time out - the wall clock limit only stops tests which
+        # are not using the CPU (e.g. sleeping) from running forever
         self.timeout = DEFAULT_TIMEOUT
+        self.wall_timeout = DEFAULT_TIMEOUT * WALL_TIME_FACTOR
         self.memory_limit = DEFAULT_MEMORY_LIMIT
         self.secure_exec = SecureSandbox(DEFAULT_MEMORY_LIMIT, DEFAULT_TIMEOUT)
 
+        # Set by _build_test_files if the submission cannot be built (e.g. compile error)
+        self.build_error = None
+
+        # In fail fast mode, the first failed test stops the submission - tests still
+        # running are killed and every test without a result is reported as skipped
+        self.fail_fast = fail_fast
+        self.stopped = False
+        self.reported = set()
+        # Process group of each test running in its own process, by test index
+        self.running = {}
+
+        # With RETRY_TLE, tests which timed out are run once more after the others, and
+        # only the result of the retry is reported
+        self.retry_tle = RETRY_TLE
+        self.retries = []
+
     def __enter__(self):
         """
         Context manager entry to set up the sandboxed environment 
@@ -51,6 +165,8 @@ class AbstractExecutor:
         Context manager exit to destroy the sandboxed environment when complete
         """
         shutil.rmtree(self.test_dir)
+        # Including the cgroups of tests whose harness was killed while they were running
+        cgroup.remove_leaves(f"{self.test_dir.name}-")
     
     def run(self):
         """
@@ -64,24 +180,40 @@ class AbstractExecutor:
                   - timeout: Whether the test timeouted
                   - stdout: The stdout of the test (used for user debugging)
                   - stderr: The stderr of the test (filtered before being returned)
+                  In fail fast mode, tests after the first failure are reported as skipped.
+                  With RETRY_TLE, tests which time out are retried once, after the others.
         """
-        self._build_test_files()
-
-        # Clean up memory that is no longer needed
-        # del self.submission_code, self.test_cases
-        # gc.collect()
-        
-        # Start all test processes
-        processes = []
-        for i in range(self.num_tests):
-            processes.append(self.__start_sandboxed(i))
-        
-        # Wait for all to complete and handle results
-        asyncio.run(self.__collect_tests_async(processes))
-
-    def __start_sandboxed(self, test_num: int):
+        with SUBMISSION_DURATION.labels(LANGUAGE).time():
+            with Span("build", self.trace, {"language": LANGUAGE}):
+                self._build_test_files()
+
+            # Clean up memory that is no longer needed
+            # del self.submission_code, self.test_cases
+            # gc.collect()
+
+            if self.build_error is not None:
+                # A build error fails every test - report it once without starting any tests
+                for i in range(self.num_tests):
+                    self.__publish_result(i, 1, b"", self.build_error)
+            elif self._batches_enabled() and self._get_batch_command(self._get_test_order()) is not None:
+                # Run every test through a single harness process where supported
+                asyncio.run(self.__collect_batch_async())
+            else:
+                # Run each test in its own process as scheduler slots become available
+                asyncio.run(self.__collect_tests_async())
+
+            if self.retries and not self.stopped:
+                asyncio.run(self.__retry_tests_async())
+
+            if self.stopped:
+                for i in self._get_test_order():
+                    if i not in self.reported:
+                        self.__publish_skipped(i)
+
+    async def __start_sandboxed(self, test_num: int, leaf: Optional[Leaf] = None) -> asyncio.subprocess.Process:
         """ 
-        Set up a fully sandboxed environment in which to start a test
+        Set up a fully sandboxed environment in which to start a test, inside the test's
+        leaf cgroup if it has one
         """
         # cmd = ["bash", "-c", f"ulimit -v {self.memory_limit // 1024} && timeout {self.timeout}s "] + self._get_execution_command(test_num)
         # cmd = self._get_execution_command(test_num)
@@ -92,51 +224,335 @@ class AbstractExecutor:
         #     stderr=subprocess.PIPE
         # )
         # proc = self.secure_exec.execute_nsjail(self._get_execution_command(test_num))
-        proc = subprocess.Popen(
-            self._get_execution_command(test_num),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+        # Each test runs in its own session so that a timeout kills everything it started
+        command = self._get_execution_command(test_num)
+        if leaf is not None:
+            command = leaf.wrap(command)
+        return await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
         )
-        return (test_num, proc)
 
-    async def __collect_tests_async(self,
-                                processes: list[subprocess.Popen]
-                                ) -> Dict[str, List[Dict[str, Any]]]:
+    async def __collect_tests_async(self) -> None:
+        """
+        Starts a process for each test case, in priority order, as slots become available
+        from the container's scheduler, and collects the results asynchronously.
         """
-        Collects all test cases asynchronously.
+        async with scheduler.submission():
+            tasks = []
+            for i in self._get_test_order():
+                await scheduler.acquire()
+                if self.stopped:
+                    scheduler.release()
+                    break
+                tasks.append(asyncio.create_task(self.__run_test_async(i)))
 
-        Returns:
-            dict: The results of the submission against the tests.
+            # Wait for all tasks to complete
+            await asyncio.gather(*tasks)
+
+    async def __retry_tests_async(self) -> None:
         """
-        # Create tasks for all test processes and wait for them to complete
-        tasks = []
-        for i, proc in processes:
-            task = asyncio.create_task(self.__process_result_async(i, proc))
-            tasks.append(task)
+        Runs the tests which timed out once more, one at a time, each once the container
+        is mostly idle (or RETRY_TLE_IDLE_WAIT seconds have passed), so that a test which
+        only timed out because the container was saturated can still pass.
+        """
+        batch = self._batches_enabled() and self._get_batch_command(self.retries) is not None
+        async with scheduler.submission():
+            for test_index in self.retries:
+                if self.stopped:
+                    break
+                await scheduler.acquire_idle(wait=RETRY_TLE_IDLE_WAIT)
+                if not batch:
+                    # Releases the slot once done
+                    await self.__run_test_async(test_index)
+                    continue
+                try:
+                    await self.__run_batch_async([test_index])
+                finally:
+                    scheduler.release()
 
-        # Wait for all tasks to complete
-        await asyncio.gather(*tasks)
+    async def __run_test_async(self, test_index: int) -> None:
+        """
+        Runs a single test case in its own process, releasing its scheduler slot once done.
+        """
+        leaf = None
+        try:
+            leaf = cgroup.create_leaf(
+                f"{self.test_dir.name}-{test_index}", cgroup.test_limits(self._get_cgroup_memory_limit())
+            )
+            started = time.monotonic()
+            proc = await self.__start_sandboxed(test_index, leaf)
+            self.running[test_index] = proc.pid
+            await self.__process_result_async(test_index, proc, started, leaf)
+        finally:
+            self.running.pop(test_index, None)
+            if leaf is not None:
+                await leaf.remove_async()
+            scheduler.release()
 
-    async def __process_result_async(self, test_index: int, process: subprocess.Popen) -> None:
+    async def __collect_batch_async(self) -> None:
         """
-        Processes the result from a subprocess asynchronously.
+        Runs the tests through the executor's batch harness, publishing each result as
+        it is streamed back. A warm worker from the worker pool is used if available.
+        If the harness exits before reporting every test (e.g. it was killed), a new
+        harness is started for the tests that are still pending.
+
+        The harness runs up to BATCH_WORKERS tests at once, so that many slots are held
+        from the container's scheduler for as long as it runs.
+        """
+        pending = self._get_test_order()
+        slots = max(1, min(BATCH_WORKERS, len(pending)))
+        async with scheduler.submission():
+            await scheduler.acquire(slots)
+            try:
+                await self.__run_batch_async(pending)
+            finally:
+                scheduler.release(slots)
+
+    async def __run_batch_async(self, pending: List[int]) -> None:
+        """
+        Runs the pending tests through a pooled worker or batch harness processes.
+        """
+        # Try a warm worker first - it reports a done marker once the job is complete
+        try:
+            pool = self.get_worker_pool()
+        except Exception:
+            logger.exception("Failed to start worker pool")
+            pool = None
+        if pool is not None:
+            worker = pool.checkout()
+            healthy = False
+            try:
+                async with worker.output(BATCH_LINE_LIMIT) as stdout:
+                    worker.submit(self._get_worker_job(pending))
+                    healthy = await self.__read_batch_results(
+                        stdout.readline,
+                        lambda: _kill_process_group(worker.process.pid),
+                        pending
+                    )
+            except OSError as e:
+                logger.warning("Pool worker failed", extra={"fields": {"submission_id": self.submission_id, "error": str(e)}})
+            finally:
+                pool.checkin(worker, healthy)
+
+        while pending and not self.stopped:
+            process = await asyncio.create_subprocess_exec(
+                *self._get_batch_command(pending),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+                limit=BATCH_LINE_LIMIT
+            )
+            stderr_task = asyncio.create_task(_read_stream(process.stderr, MAX_OUTPUT_BYTES))
+
+            remaining = len(pending)
+            hung = False
+
+            def kill():
+                nonlocal hung
+                # Also called to stop a fail fast submission, which isn't the harness's fault
+                hung = not self.stopped
+                _kill_process_group(process.pid)
+
+            await self.__read_batch_results(process.stdout.readline, kill, pending)
+
+            returncode = await process.wait()
+            _kill_process_group(process.pid)
+            stderr = await stderr_task
+            if len(pending) == remaining:
+                # The harness could not run any test - report its failure for the rest
+                if hung:
+                    error = (
+                        f"The test runner was killed after sending no results for "
+                        f"{self._get_batch_line_timeout():g} seconds (exit code {returncode})."
+                    )
+                else:
+                    error = f"The test runner exited with code {returncode} without running the test."
+                stderr = stderr.decode(errors="replace").strip()
+                if stderr:
+                    error += f"\n{stderr}"
+                for test_index in pending:
+                    self.__publish_runner_failed(test_index, error)
+                break
+
+    async def __read_batch_results(
+        self,
+        readline: Callable[[], Awaitable[bytes]],
+        kill: Callable[[], None],
+        pending: List[int]
+        ) -> bool:
+        """
+        Reads result lines from a batch harness until it exits or reports that it is done,
+        publishing each result and removing its test from pending. The harness is killed
+        if a test fails in fail fast mode.
+
+        Args:
+            readline (callable): Reads the next line from the harness's stdout.
+            kill (callable): Kills the harness.
+            pending (List[int]): The indices of tests which have not yet been reported.
+
+        Returns:
+            bool: Whether the harness reported that it was done.
+        """
+        while True:
+            try:
+                line = await asyncio.wait_for(readline(), self._get_batch_line_timeout())
+            except (asyncio.TimeoutError, ValueError):
+                # The harness stopped responding or sent an oversized line - kill it
+                kill()
+                return False
+            if not line:
+                return False
+            try:
+                res = loads(line)
+            except JSONDecodeError:
+                continue
+            if res.get("done"):
+                return True
+            test_index = res.get("test_number")
+            if test_index not in pending:
+                continue
+            pending.remove(test_index)
+            self.__publish_result(
+                test_index, res["returncode"], res["stdout"].encode(), res["stderr"].encode(),
+                usage={field: res.get(field) for field in USAGE_FIELDS + ("oom_killed",)}
+            )
+            if self.stopped:
+                kill()
+                return False
+
+    async def __process_result_async(
+        self,
+        test_index: int,
+        process: asyncio.subprocess.Process,
+        started: float,
+        leaf: Optional[Leaf] = None
+        ) -> None:
+        """
+        Waits for a test process to exit, killing it if it exceeds the time limit, and
+        publishes its result. Output is read as it is produced, up to MAX_OUTPUT_BYTES
+        per stream.
 
         Args:
             test_index (int): The index of the test case.
-            process (subprocess.Popen): The subprocess running the test.
+            process (asyncio.subprocess.Process): The subprocess running the test.
+            started (float): The monotonic time the process was started at.
+            leaf (Leaf): The test's cgroup, which its resource usage is read from.
+        """
+        stdout_task = asyncio.create_task(_read_stream(process.stdout, MAX_OUTPUT_BYTES))
+        stderr_task = asyncio.create_task(_read_stream(process.stderr, MAX_OUTPUT_BYTES))
+
+        timed_out = await self.__wait_within_limits(process, started, leaf)
+
+        # Kill the test (if it timed out) and anything it left running, which would
+        # otherwise hold the output pipes open
+        _kill_process_group(process.pid)
+        await process.wait()
+        wall_time = time.monotonic() - started
+        usage = {"wall_time": wall_time}
+        if leaf is not None:
+            # Including anything which left the test's session
+            leaf.kill()
+            usage.update(leaf.usage())
+        stdout, stderr = await asyncio.gather(stdout_task, stderr_task)
+
+        self.__publish_result(test_index, process.returncode, stdout, stderr, timed_out, usage)
+
+    async def __wait_within_limits(
+        self,
+        process: asyncio.subprocess.Process,
+        started: float,
+        leaf: Optional[Leaf] = None
+        ) -> bool:
+        """
+        Waits for a test process to exit, until it has used more than the time limit in
+        CPU time or run for longer than the wall clock limit. CPU time is read from the
+        test's cgroup, which includes anything it started, or otherwise from /proc.
 
         Returns:
-            tuple: (test_index, result_dict) to maintain order.
+            bool: Whether the test exceeded a time limit (and is still running).
         """
-        # Create a future to run communicate in a thread pool
-        loop = asyncio.get_event_loop()
-        stdout, stderr = await loop.run_in_executor(
-            None,
-            lambda: process.communicate()
-        )
+        while True:
+            remaining = started + self.wall_timeout - time.monotonic()
+            if remaining <= 0:
+                return True
+            try:
+                await asyncio.wait_for(process.wait(), min(CPU_POLL_INTERVAL, remaining))
+                return False
+            except asyncio.TimeoutError:
+                pass
+            if leaf is not None:
+                cpu_time = leaf.cpu_time()
+            else:
+                cpu_time = process_cpu_time(process.pid)
+            if cpu_time >= self.timeout:
+                return True
+
+    def __publish_result(
+        self,
+        test_index: int,
+        returncode: int,
+        stdout: bytes,
+        stderr: bytes,
+        timed_out: bool = False,
+        usage: Optional[dict] = None
+        ) -> None:
+        """
+        Converts the outcome of a test into the result format and sends it to the output queue.
+        Once a fail fast submission has stopped, results of tests that were killed or still
+        finishing are discarded, as those tests are reported as skipped.
+
+        Args:
+            test_index (int): The index of the test case.
+            returncode (int): The return code of the test.
+            stdout (bytes): The standard output of the test.
+            stderr (bytes): The standard error of the test.
+            timed_out (bool): Whether the test was killed for exceeding the time limit.
+            usage (dict): Any of wall_time, cpu_time and max_rss measured for the test,
+                          included in the result and recorded as metrics, and oom_killed
+                          if the test ran in a cgroup.
+        """
+        if self.stopped:
+            return
+        usage = dict(usage or {})
+        oom_killed = usage.pop("oom_killed", None)
+        stdout = _truncate_output(stdout, MAX_OUTPUT_BYTES)
+        stderr = _truncate_output(stderr, MAX_OUTPUT_BYTES)
 
         # Process the result using the subclass implementation
-        res = self._get_result(process.returncode, stdout, stderr)
+        if timed_out:
+            res = {
+                "passed": False,
+                "timeout": True,
+                "memory_exceeded": False,
+                "output": "",
+                "stdout": stdout.decode(errors="replace"),
+                "stderr": f"The code exceeded the time limit of {self.timeout} seconds."
+            }
+        elif oom_killed:
+            # The kernel killed the test for exceeding its cgroup's memory limit
+            res = {
+                "passed": False,
+                "timeout": False,
+                "memory_exceeded": True,
+                "output": "",
+                "stdout": stdout.decode(errors="replace"),
+                "stderr": "The code attempted to use more memory than allowed."
+            }
+        else:
+            res = self._get_result(returncode, stdout, stderr)
+
+        if res["timeout"] and self.retry_tle and test_index not in self.retries:
+            # Report the result of the retry instead
+            self.retries.append(test_index)
+            record_test(LANGUAGE, "retried", usage)
+            logger.debug("Retrying timed out test", extra={"fields": {
+                "submission_id": self.submission_id, "test_number": test_index, **usage
+            }})
+            return
+
         result = {
             "submission_id": self.submission_id,
             "test_number": test_index,
@@ -145,24 +561,116 @@ class AbstractExecutor:
             "expected": self.outputs[test_index],
             "output": res["output"],
             "stdout": res["stdout"],
-            "error": "timeout" if res["timeout"] else "memory_limit_exceeded" if res["memory_exceeded"] else res["stderr"]
+            "error": "timeout" if res["timeout"] else "memory_limit_exceeded" if res["memory_exceeded"] else res["stderr"],
+            **{field: usage.get(field) for field in USAGE_FIELDS}
         }
+        if test_index in self.retries:
+            result["retried"] = True
 
         # Send the result back via the output queue
         self.send_results(result)
-        print(f"Result of test {test_index}:\n", result)
-        # print("Applied async")
+        self.reported.add(test_index)
+        if self.fail_fast and not res["passed"]:
+            self.__stop()
+
+        outcome = "timeout" if res["timeout"] else "memory_exceeded" if res["memory_exceeded"] else "passed" if res["passed"] else "failed"
+        record_test(LANGUAGE, outcome, usage)
+        if usage.get("wall_time") is not None:
+            record_child(
+                f"test {test_index}", self.trace, time.time() - usage["wall_time"], usage["wall_time"],
+                {"test_number": test_index, "outcome": outcome, **usage}
+            )
+        logger.debug("Test completed", extra={"fields": {
+            "submission_id": self.submission_id, "test_number": test_index, "outcome": outcome, **usage
+        }})
+
+    def __stop(self) -> None:
+        """
+        Stops a fail fast submission after a failed test, killing the tests still running
+        in their own processes. Batch harnesses are killed by the reader of their results.
+        """
+        self.stopped = True
+        for pid in self.running.values():
+            _kill_process_group(pid)
+        logger.debug("Stopping after failed test", extra={"fields": {
+            "submission_id": self.submission_id, "remaining": self.num_tests - len(self.reported)
+        }})
+
+    def __publish_runner_failed(self, test_index: int, error: str) -> None:
+        """
+        Sends the result of a test that was not run because its batch harness failed, so
+        the result says nothing about the submission's code. It is never a pass, whatever
+        the harness exited with.
+        """
+        if self.stopped:
+            return
+        self.send_results({
+            "submission_id": self.submission_id,
+            "test_number": test_index,
+            "passed": False,
+            "runner_failed": True,
+            "inputs": self.inputs[test_index],
+            "expected": self.outputs[test_index],
+            "output": "",
+            "stdout": "",
+            "error": error
+        })
+        self.reported.add(test_index)
+        record_test(LANGUAGE, "runner_failed", {})
+
+    def __publish_skipped(self, test_index: int) -> None:
+        """
+        Sends the result of a test that was not run because an earlier test failed.
+        """
+        self.send_results({
+            "submission_id": self.submission_id,
+            "test_number": test_index,
+            "passed": False,
+            "skipped": True,
+            "inputs": self.inputs[test_index],
+            "expected": self.outputs[test_index],
+            "output": "",
+            "stdout": "",
+            "error": "skipped"
+        })
+        self.reported.add(test_index)
+        record_test(LANGUAGE, "skipped", {})
 
     def _build_test_files(self):
         """
         Builds the test files for the submission.
 
         Each executor should implement this method to build the relevant test files
-        needed to run each test case in parallel against the submission code.
+        needed to run each test case in parallel against the submission code. Any
+        compilation should happen here, once per submission - if it fails, set
+        self.build_error to the error output and every test will fail with it.
         """
         # Implement in subclasses
         raise NotImplementedError
 
+    def _get_test_order(self) -> List[int]:
+        """
+        Returns the indices of the test cases in the order they should be run. Visible
+        tests are run before hidden ones, and tests with the smallest inputs first, so
+        that the results the user can see (and quick results) arrive early.
+        """
+        return sorted(
+            range(self.num_tests),
+            key=lambda i: (bool(self.hidden[i]) if i < len(self.hidden) else False, len(dumps(self.inputs[i])))
+        )
+
+    def _write_test_suite(self):
+        """
+        Writes the inputs and expected outputs to tests.json in the test directory, unless
+        the submission's suite is already cached, setting self.tests_file for the test
+        runners to read test cases from.
+        """
+        if self.tests_file is not None:
+            return
+        self.tests_file = self.test_dir / "tests.json"
+        with open(self.tests_file, "w") as tests_file:
+            tests_file.write(dumps({"inputs": self.inputs, "outputs": self.outputs}))
+
     def _get_execution_command(self, test_number: int) -> str:
         """
         Returns the command that needs to be executed to run the test case.
@@ -176,6 +684,117 @@ class AbstractExecutor:
         # Implement in subclasses
         raise NotImplementedError
 
+    def _get_batch_command(self, test_numbers: List[int]) -> Optional[list]:
+        """
+        Returns the command that runs the given test cases in a single harness process.
+
+        The harness must write one JSON object per line to stdout for each test as it
+        completes, containing test_number, returncode, stdout and stderr, where the
+        returncode/stdout/stderr follow the same conventions as _get_execution_command.
+
+        Args:
+            test_numbers (List[int]): The indices of the test cases to execute.
+
+        Returns:
+            Optional[list]: The command to run the tests, or None if batching is not supported.
+        """
+        return None
+
+    @classmethod
+    def _batch_runs_tests_in_cgroups(cls) -> bool:
+        """
+        Returns whether the batch harness (and warm worker) runs each test in its own leaf
+        cgroup, as given by _get_test_cgroups.
+        """
+        return False
+
+    @classmethod
+    def _batches_enabled(cls) -> bool:
+        """
+        Returns whether tests are run through the batch harness, if the executor has one.
+        When tests run in cgroups, harnesses which can't give each test its own leaf are
+        not used, so each test runs in its own process and leaf instead.
+        """
+        return BATCH_EXECUTION and (cls._batch_runs_tests_in_cgroups() or cgroup.tests_cgroup() is None)
+
+    @classmethod
+    def get_worker_pool(cls) -> Optional[WorkerPool]:
+        """
+        Returns this process's pool of warm workers for the executor, if pooling is
+        enabled and the executor supports it.
+        """
+        if not POOL_ENABLED or not cls._batches_enabled():
+            return None
+        return get_pool(cls.__name__, cls._get_worker_command, cls._get_worker_max_uses())
+
+    @classmethod
+    def _get_worker_max_uses(cls) -> int:
+        """
+        Returns the number of jobs a warm worker runs before it is replaced.
+        """
+        return POOL_MAX_USES
+
+    @classmethod
+    def _get_worker_command(cls) -> Optional[list]:
+        """
+        Returns the command that starts a warm worker for the worker pool.
+
+        A worker reads jobs (as returned by _get_worker_job) from stdin, one JSON object
+        per line, and for each job writes result lines to stdout using the batch harness
+        format, followed by a {"done": true} line. Submissions must not be able to affect
+        later jobs run by the same worker.
+
+        Returns:
+            Optional[list]: The command to start a worker, or None if pooling is not supported.
+        """
+        return None
+
+    def _get_worker_job(self, test_numbers: List[int]) -> dict:
+        """
+        Returns the job sent to a warm worker to run the given test cases.
+
+        Args:
+            test_numbers (List[int]): The indices of the test cases to execute.
+
+        Returns:
+            dict: The job description.
+        """
+        raise NotImplementedError
+
+    def _get_batch_line_timeout(self) -> float:
+        """
+        Returns how long to wait for the next result line from a batch harness before
+        treating it as hung. The harness enforces the per-test time limits itself, so
+        this only needs to cover the wall clock limit plus start up overhead.
+        """
+        return self.wall_timeout * 2 + 5
+
+    def _get_cgroup_memory_limit(self) -> int:
+        """
+        Returns the memory.max of each test's cgroup. Runtimes which need memory beyond
+        the submission's own (such as the JVM's) should add it here.
+        """
+        return self.memory_limit
+
+    def _get_test_cgroups(self) -> Optional[dict]:
+        """
+        Returns where a batch harness should create a leaf cgroup for each test it runs,
+        as {"parent": str, "prefix": str, "limits": dict}, naming each leaf with the
+        prefix followed by the test number and writing each limit to the named file.
+
+        Returns:
+            Optional[dict]: The cgroups for the harness to create, or None if tests do not
+                            run in cgroups.
+        """
+        tests = cgroup.tests_cgroup()
+        if tests is None:
+            return None
+        return {
+            "parent": str(tests),
+            "prefix": f"{self.test_dir.name}-",
+            "limits": cgroup.test_limits(self._get_cgroup_memory_limit()),
+        }
+
     def _get_result(self, returncode: int, stdout: bytes, stderr: bytes) -> dict:
         """
         Collects the result from the subprocess running the test case.
@@ -0,0 +1,59 @@
+import javax.json.*;
+import java.io.*;
+import java.lang.reflect.*;
+import java.net.*;
+
+/**
+ * Pre-warmed, single use JVM worker for Java submissions, used by the worker pool.
+ *
+ * Starts ahead of time and waits for one job on stdin (a JSON object on a single line):
+ *
+ *     {"test_dir": str, "tests": "0,1,2", "tests_file": str, "timeout_ms": int,
+ *      "wall_timeout_ms": int}
+ *
+ * The compiled TestRunner and Solution classes are loaded from test_dir, and
+ * TestRunner.runBatch writes the result lines to stdout exactly as when run with --batch,
+ * reading test cases from tests_file (by default tests.json in test_dir). A
+ * {"done": true} line follows once the job has completed, and the JVM then halts: threads,
+ * static state and redirected streams left behind by a submission must not be able to
+ * affect a later job, so the pool starts a new worker for the next submission instead.
+ * If a test times out, runBatch halts the JVM before the done line.
+ */
+public class JavaPoolWorker {
+    public static void main(String[] args) throws IOException {
+        PrintStream protocol = System.out;
+        PrintStream originalErr = System.err;
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in));
+
+        // Load the JSON implementation before the job arrives
+        Json.createObjectBuilder().add("done", true).build().toString();
+
+        String line = in.readLine();
+        if (line != null) {
+            try (JsonReader reader = Json.createReader(new StringReader(line))) {
+                JsonObject job = reader.readObject();
+                String testDir = job.getString("test_dir");
+                String testsFile = job.getString("tests_file", new File(testDir, "tests.json").getPath());
+                long timeoutMillis = job.getJsonNumber("timeout_ms").longValue();
+                long wallTimeoutMillis = job.containsKey("wall_timeout_ms")
+                    ? job.getJsonNumber("wall_timeout_ms").longValue() : timeoutMillis;
+                runJob(testDir, testsFile, job.getString("tests"), timeoutMillis, wallTimeoutMillis);
+            } catch (Throwable e) {
+                originalErr.println("Failed to run job: " + e);
+            }
+            protocol.println(Json.createObjectBuilder().add("done", true).build().toString());
+            protocol.flush();
+        }
+        // Without running shutdown hooks, which the submission may have registered
+        Runtime.getRuntime().halt(0);
+    }
+
+    private static void runJob(String testDir, String testsFile, String tests, long timeoutMillis, long wallTimeoutMillis) throws Exception {
+        URL[] urls = { new File(testDir).toURI().toURL() };
+        try (URLClassLoader loader = new URLClassLoader(urls, JavaPoolWorker.class.getClassLoader())) {
+            Class<?> runner = loader.loadClass("TestRunner");
+            Method runBatch = runner.getMethod("runBatch", String.class, long.class, long.class, String.class);
+            runBatch.invoke(null, testsFile, timeoutMillis, wallTimeoutMillis, tests);
+        }
+    }
+}
@@ -0,0 +1,404 @@
+"""
+Batched test harness for Python submissions.
+
+The harness imports the submission once and then forks a child process per test
+case, so every test shares the already loaded interpreter and submission module
+while still running in its own address space with its own limits. The import itself
+runs in a child under the same limits as a test, which the harness kills if it uses
+more than the time limit. Results are streamed back on stdout as one JSON object per
+line, in the order tests finish:
+
+    {"test_number": int, "returncode": int, "stdout": str, "stderr": str,
+     "wall_time": float, "cpu_time": float, "max_rss": int}
+
+wall_time and cpu_time are in seconds and max_rss is the peak resident memory in bytes,
+as reported for the child by wait4. The time taken to import the submission is included
+in (and counts towards the limits of) every test, as when each test imports it itself.
+
+With --cgroup, each test runs in its own leaf cgroup (see src/sandbox/resources.py) instead of
+under RLIMIT_AS, given as {"parent": str, "prefix": str, "limits": {file: value}}. cpu_time
+and max_rss are then read from the leaf, and each line also contains oom_killed.
+
+The returncode/stderr protocol matches the single test runner used by the
+PythonExecutor (0 = passed, 232 = wrong answer with the output on the last line
+of stderr, 124 = timeout), so results can be processed by the same code path.
+
+--timeout limits the CPU time each test uses (including anything it started, if it runs
+in a cgroup), and --wall-timeout how long it may run for (by default --timeout).
+
+Usage:
+    python python_harness.py <test_dir> <function_name> [--tests 0,1,2]
+                             [--tests-file PATH] [--workers N] [--timeout S]
+                             [--wall-timeout S] [--memory-limit B] [--max-output B]
+                             [--cgroup JSON]
+
+Test cases are read from --tests-file, by default tests.json in test_dir.
+"""
+
+import os
+import sys
+import time
+import select
+import signal
+import resource
+import argparse
+import traceback
+from json import loads, dumps
+from pathlib import Path
+from tempfile import TemporaryFile
+from typing import Optional
+
+# The resource helpers are shared with the executor, from the service root above src
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from src.sandbox.resources import Leaf, process_cpu_time  # noqa: E402
+
+TESTS_FILE = "tests.json"
+TIMEOUT_EXIT_CODE = 124
+FAILED_EXIT_CODE = 232
+POLL_INTERVAL = 0.002
+CPU_POLL_INTERVAL = 0.05
+TRUNCATED_MARKER = b"\n... output truncated ...\n"
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("test_dir")
+    parser.add_argument("function_name")
+    parser.add_argument("--tests", default=None)
+    parser.add_argument("--tests-file", default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=5)
+    parser.add_argument("--wall-timeout", type=float, default=None)
+    parser.add_argument("--memory-limit", type=int, default=0)
+    parser.add_argument("--max-output", type=int, default=0)
+    parser.add_argument("--cgroup", type=loads, default=None)
+    return parser.parse_args(argv)
+
+
+def decode(value):
+    """Test values arrive either as JSON strings or as already decoded values."""
+    return loads(value) if isinstance(value, str) else value
+
+
+def load_function(test_dir: str, function_name: str):
+    """
+    Imports the submission module once and returns the function under test.
+
+    Raises:
+        Exception: Any error raised while importing the submission.
+    """
+    sys.path.insert(0, test_dir)
+    import submission
+    return getattr(submission, function_name)
+
+
+def import_error() -> str:
+    """Returns the error to report for every test when importing the submission failed."""
+    if isinstance(sys.exc_info()[1], MemoryError):
+        # Reported as the memory limit being exceeded, as when a test runs out of memory
+        return "MemoryError: Cannot allocate memory"
+    return traceback.format_exc()
+
+
+def used_cpu_time() -> float:
+    """Returns the CPU time used by this process and the children it has waited for."""
+    usage = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+def run_test(function, inputs, expected) -> int:
+    """
+    Runs a single test case inside a forked child. Mirrors the single test runner.
+
+    Returns:
+        int: The exit code for the child process.
+    """
+    try:
+        output = function(*decode(inputs))
+        if output != decode(expected):
+            print("\n", output, sep="", file=sys.stderr)
+            return FAILED_EXIT_CODE
+        print("\nPassed but here is output: ", output, file=sys.stderr)
+        return 0
+    except MemoryError:
+        print("MemoryError: Cannot allocate memory", file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+
+
+def start_test(function, test_number: int, inputs, expected, memory_limit: int, protocol_fd: int, cgroup: dict = None) -> dict:
+    """
+    Forks a child process to run a single test case with stdout/stderr captured.
+
+    Returns:
+        dict: Bookkeeping for the running child.
+    """
+    leaf = Leaf.create(cgroup["parent"], f"{cgroup['prefix']}{test_number}", cgroup["limits"]) if cgroup else None
+    stdout_file, stderr_file = TemporaryFile(), TemporaryFile()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        # Child - apply limits, redirect output and run the test
+        code = 1
+        try:
+            os.setsid()
+            os.close(protocol_fd)
+            if leaf:
+                # Memory is then limited by the leaf, which counts what the test actually uses
+                leaf.enter()
+            elif memory_limit:
+                resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(stdout_file.fileno(), 1)
+            os.dup2(stderr_file.fileno(), 2)
+            code = run_test(function, inputs, expected)
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(code)
+    return {
+        "test_number": test_number,
+        "pid": pid,
+        "started": time.monotonic(),
+        "cpu_checked": time.monotonic(),
+        "stdout": stdout_file,
+        "stderr": stderr_file,
+        "leaf": leaf,
+    }
+
+
+def cpu_time(child: dict) -> float:
+    """
+    Returns the CPU time a running test has used so far - read from its cgroup, which
+    includes anything it started, or otherwise from /proc for the test process itself.
+    """
+    if child["leaf"]:
+        return child["leaf"].cpu_time()
+    return process_cpu_time(child["pid"])
+
+
+def read_output(file, limit: int) -> str:
+    """
+    Reads a captured output file, keeping only the start and end if it exceeds limit bytes.
+    """
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    if limit and size > limit:
+        half = limit // 2
+        data = file.read(half) + TRUNCATED_MARKER
+        file.seek(size - half)
+        data += file.read(half)
+    else:
+        data = file.read()
+    file.close()
+    return data.decode(errors="replace")
+
+
+def finish_test(child: dict, status: int, usage: resource.struct_rusage, timed_out: bool, max_output: int) -> dict:
+    """
+    Builds the result line for a child that has exited.
+    """
+    if timed_out:
+        returncode = TIMEOUT_EXIT_CODE
+    elif os.WIFSIGNALED(status):
+        returncode = 128 + os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status)
+    result = {
+        "test_number": child["test_number"],
+        "returncode": returncode,
+        "stdout": read_output(child["stdout"], max_output),
+        "stderr": read_output(child["stderr"], max_output),
+        "wall_time": round(time.monotonic() - child["started"], 6),
+        "cpu_time": round(usage.ru_utime + usage.ru_stime, 6),
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss": usage.ru_maxrss * 1024,
+    }
+    if child["leaf"]:
+        result.update(child["leaf"].usage())
+        result["cpu_time"] = round(result["cpu_time"], 6)
+        child["leaf"].remove()
+    return result
+
+
+def run_batch(args: argparse.Namespace, out) -> None:
+    """
+    Runs the requested test cases, writing a result line to out as each completes.
+
+    The submission is imported, and the tests forked, by a child process which is limited
+    like a test - in its own leaf cgroup or under RLIMIT_AS. Until it has imported the
+    submission it is killed if it exceeds the time limits, and each test is then reported
+    as having timed out (or run out of memory, if it was killed for that).
+    """
+    with open(args.tests_file or os.path.join(args.test_dir, TESTS_FILE), "r") as f:
+        suite = loads(f.read())
+    if args.tests:
+        pending = [int(i) for i in args.tests.split(",")]
+    else:
+        pending = list(range(len(suite["inputs"])))
+
+    cgroup = args.cgroup
+    leaf = Leaf.create(cgroup["parent"], f"{cgroup['prefix']}import", cgroup["limits"]) if cgroup else None
+    ready_read, ready_write = os.pipe()
+    out.flush()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(ready_read)
+            if leaf:
+                leaf.enter()
+            elif args.memory_limit:
+                resource.setrlimit(resource.RLIMIT_AS, (args.memory_limit, args.memory_limit))
+            run_tests(args, out, suite, pending, ready_write)
+        finally:
+            try:
+                out.flush()
+            finally:
+                os._exit(0)
+    os.close(ready_write)
+
+    try:
+        failed = wait_for_import(pid, ready_read, leaf, args)
+        if failed is not None:
+            for test_number in pending:
+                out.write(dumps({"test_number": test_number, **failed}) + "\n")
+            out.flush()
+    finally:
+        os.close(ready_read)
+        if leaf:
+            # Also kills anything the submission left running
+            leaf.remove()
+
+
+def wait_for_import(pid: int, ready_fd: int, leaf: Optional[Leaf], args: argparse.Namespace) -> Optional[dict]:
+    """
+    Waits for the child running the tests, killing it if importing the submission exceeds
+    the time limits.
+
+    Returns:
+        dict: The result to report for every test if the import did not finish, or None
+              once the child has run the tests.
+    """
+    started = time.monotonic()
+    wall_timeout = args.wall_timeout or args.timeout
+    timed_out = False
+    while True:
+        # The child writes to the pipe once the import has finished, or closes it by exiting
+        readable, _, _ = select.select([ready_fd], [], [], CPU_POLL_INTERVAL)
+        if readable and os.read(ready_fd, 1):
+            os.waitpid(pid, 0)
+            return None
+        if readable:
+            break
+        used = leaf.cpu_time() if leaf else process_cpu_time(pid)
+        if used >= args.timeout or time.monotonic() - started >= wall_timeout:
+            timed_out = True
+            break
+
+    os.kill(pid, signal.SIGKILL)
+    if leaf:
+        leaf.kill()
+    _, status, usage = os.wait4(pid, 0)
+    result = {
+        "returncode": TIMEOUT_EXIT_CODE,
+        "stdout": "",
+        "stderr": "",
+        "wall_time": round(time.monotonic() - started, 6),
+        "cpu_time": round(usage.ru_utime + usage.ru_stime, 6),
+        "max_rss": usage.ru_maxrss * 1024,
+    }
+    if leaf:
+        result.update(leaf.usage())
+        result["cpu_time"] = round(result["cpu_time"], 6)
+    if result.get("oom_killed"):
+        result["returncode"] = 137
+    elif not timed_out:
+        # The submission ended the process while being imported
+        code = 128 + os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        result.update(returncode=1, stderr=f"The submission exited with code {code} while being imported.")
+    return result
+
+
+def run_tests(args: argparse.Namespace, out, suite: dict, pending: list, ready_fd: int) -> None:
+    """
+    Imports the submission and runs the pending tests, in the child started by run_batch.
+    ready_fd is written to once the import has finished.
+    """
+    inputs, outputs = suite["inputs"], suite["outputs"]
+
+    def emit(result: dict):
+        out.write(dumps(result) + "\n")
+        out.flush()
+
+    # Import the submission once - every test is forked from this state
+    import_started, import_cpu = time.monotonic(), used_cpu_time()
+    try:
+        function = load_function(args.test_dir, args.function_name)
+    except BaseException:
+        error = import_error()
+        for test_number in pending:
+            emit({"test_number": test_number, "returncode": 1, "stdout": "", "stderr": error})
+        return
+    finally:
+        os.write(ready_fd, b"1")
+        os.close(ready_fd)
+    import_wall = time.monotonic() - import_started
+    import_cpu = used_cpu_time() - import_cpu
+
+    # What the import used is taken from each test's limits, and added to its usage
+    timeout = args.timeout - import_cpu
+    wall_timeout = (args.wall_timeout or args.timeout) - import_wall
+    running = []
+    while pending or running:
+        while pending and len(running) < max(1, args.workers):
+            test_number = pending.pop(0)
+            running.append(start_test(
+                function, test_number, inputs[test_number], outputs[test_number],
+                args.memory_limit, out.fileno(), args.cgroup
+            ))
+
+        time.sleep(POLL_INTERVAL)
+        for child in list(running):
+            pid, status, usage = os.wait4(child["pid"], os.WNOHANG)
+            timed_out = False
+            if pid == 0:
+                now = time.monotonic()
+                if now - child["started"] < wall_timeout:
+                    if now - child["cpu_checked"] < CPU_POLL_INTERVAL:
+                        continue
+                    child["cpu_checked"] = now
+                    if cpu_time(child) < timeout:
+                        continue
+                # Exceeded the time limit - kill the test and everything it started
+                timed_out = True
+                try:
+                    os.killpg(child["pid"], signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                _, status, usage = os.wait4(child["pid"], 0)
+            running.remove(child)
+            result = finish_test(child, status, usage, timed_out, args.max_output)
+            result["wall_time"] = round(result["wall_time"] + import_wall, 6)
+            result["cpu_time"] = round(result["cpu_time"] + import_cpu, 6)
+            emit(result)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+
+    # Keep the result stream on its own descriptor and send anything the submission
+    # prints at import time to stderr so it cannot corrupt the protocol
+    out = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    run_batch(args, out)
+    out.close()
+
+
+if __name__ == "__main__":
+    main()
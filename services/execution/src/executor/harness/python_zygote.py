@@ -0,0 +1,73 @@
+"""
+Warm fork server for Python submissions, used by the worker pool.
+
+The zygote starts once, pre-imports the harness and commonly used standard library
+modules, then waits for jobs on stdin (one JSON object per line):
+
+    {"test_dir": str, "function_name": str, "tests": "0,1,2", "tests_file": str,
+     "workers": int, "timeout": float, "wall_timeout": float, "memory_limit": int, "max_output": int,
+     "cgroup": dict}
+
+For each job it forks a child which runs the batch harness against the submission
+in test_dir, so the submission is never imported into the zygote itself and the
+zygote can safely be reused. Result lines are written to stdout exactly as by the
+batch harness, followed by a {"done": true} line once the job has completed.
+"""
+
+import os
+import sys
+from json import loads, dumps
+
+import python_harness
+
+# Pre-import modules commonly used by submissions so forked children start warm
+import collections, functools, itertools, heapq, bisect, math, re, string, typing  # noqa: F401
+
+
+def run_job(job: dict, out) -> None:
+    """
+    Runs a single job in a forked child and waits for it to complete.
+    """
+    args = python_harness.parse_args([
+        job["test_dir"], job["function_name"],
+        "--tests", job["tests"],
+        "--tests-file", job.get("tests_file") or os.path.join(job["test_dir"], python_harness.TESTS_FILE),
+        "--workers", str(job["workers"]),
+        "--timeout", str(job["timeout"]),
+        "--wall-timeout", str(job.get("wall_timeout") or job["timeout"]),
+        "--memory-limit", str(job["memory_limit"]),
+        "--max-output", str(job.get("max_output", 0)),
+    ] + (["--cgroup", dumps(job["cgroup"])] if job.get("cgroup") else []))
+    out.flush()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.chdir(job["test_dir"])
+            python_harness.run_batch(args, out)
+        finally:
+            try:
+                out.flush()
+            finally:
+                os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def main():
+    # Keep the result stream on its own descriptor, as in the batch harness
+    out = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        try:
+            run_job(loads(line), out)
+        except Exception as e:
+            print(f"Failed to run job: {e}", file=sys.stderr)
+        out.write(dumps({"done": True}) + "\n")
+        out.flush()
+
+
+if __name__ == "__main__":
+    main()
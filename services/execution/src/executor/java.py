@@ -1,8 +1,26 @@
 """
 Executor for Java code.
 """
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import List
+from uuid import uuid4
+
+from src.config import COMPILE_TIMEOUT, DEFAULT_MEMORY_LIMIT, MAX_OUTPUT_BYTES, TEMP_DIR
 from src.executor.abstract_executor import AbstractExecutor
 
+# Libraries available to the test runner
+CLASSPATH = "/usr/share/java/javax.json-api.jar:/usr/share/java/javax.json.jar"
+
+# Warm JVM worker used by the worker pool, compiled once per container
+WORKER_SOURCE = Path(__file__).parent / "harness" / "JavaPoolWorker.java"
+WORKER_CLASSES = TEMP_DIR / "openjudge-java-pool-worker"
+
+# Memory the JVM needs beyond the heap (metaspace, code cache, thread stacks and GC data)
+JVM_MEMORY_OVERHEAD = 128 * 1024 * 1024
+
 class JavaExecutor(AbstractExecutor):
     def _build_test_files(self):
         """
@@ -14,28 +32,49 @@ class JavaExecutor(AbstractExecutor):
             submission_file.write(self.submission_code)
 
         # Create the test runner file (similar to Python's test_runner.py)
+        # The runner runs a single test from the test suite file with --test or, with
+        # --batch, every requested test from it in a single JVM
         test_code = f'''
 import javax.json.*;
 import java.io.*;
+import java.lang.management.*;
 import java.lang.reflect.*;
+import java.util.concurrent.*;
+import java.util.concurrent.atomic.*;
 
 public class TestRunner {{
+    // Milliseconds between checks of the CPU time used by a running test
+    private static final long CPU_POLL_MILLIS = 20;
+
+    // Bytes of each output stream kept per test in batch mode
+    private static final int MAX_OUTPUT_BYTES = {MAX_OUTPUT_BYTES};
+
     public static void main(String[] args) {{
-        if (args.length != 2) {{
-            System.err.println("Usage: java TestRunner <input_json> <expected_json>");
+        if (args.length == 5 && args[0].equals("--batch")) {{
+            System.exit(runBatch(args[1], Long.parseLong(args[2]), Long.parseLong(args[3]), args[4]));
+        }}
+        if (args.length != 3 || !args[0].equals("--test")) {{
+            System.err.println("Usage: java TestRunner --test <tests_file> <test_number>");
             System.exit(1);
         }}
 
         try {{
-            // Parse JSON using javax.json
-            JsonReader inputReader = Json.createReader(new StringReader(args[0]));
-            JsonValue inputJson = inputReader.readValue();
-            inputReader.close();
+            JsonObject suite = readSuite(args[1]);
+            int index = Integer.parseInt(args[2]);
+            JsonValue inputJson = decode(suite.getJsonArray("inputs").get(index));
+            JsonValue expectedJson = decode(suite.getJsonArray("outputs").get(index));
 
-            JsonReader expectedReader = Json.createReader(new StringReader(args[1]));
-            JsonValue expectedJson = expectedReader.readValue();
-            expectedReader.close();
+            System.exit(runTest(inputJson, expectedJson));
+        }} catch (Exception e) {{
+            System.err.println("Error: " + e.getMessage());
+            e.printStackTrace();
+            System.exit(1);
+        }}
+    }}
 
+    // Run a single test case, returning the exit code for the result
+    private static int runTest(JsonValue inputJson, JsonValue expectedJson) {{
+        try {{
             // Convert JSON array to Object array for parameters
             Object[] parameters = jsonArrayToObjectArray((JsonArray) inputJson);
 
@@ -53,17 +92,181 @@ public class TestRunner {{
             if (!outputJson.equals(expectedJsonString)) {{
                 System.err.println();
                 System.err.print(outputJson);
-                System.exit(232);
+                return 232;
             }}
 
             System.err.println();
             System.err.print("Passed but here is output: " + outputJson);
-            System.exit(0);
+            return 0;
 
-        }} catch (Exception e) {{
+        }} catch (OutOfMemoryError e) {{
+            System.err.println("Error: Cannot allocate memory");
+            return 1;
+        }} catch (Throwable e) {{
             System.err.println("Error: " + e.getMessage());
             e.printStackTrace();
-            System.exit(1);
+            return 1;
+        }}
+    }}
+
+    // Run the given tests from the tests file in this JVM, printing one JSON result per line.
+    // A test times out once its thread has used timeoutMillis of CPU time, or has run for
+    // wallTimeoutMillis. It cannot be stopped safely, so the JVM halts after reporting it
+    // and the executor starts a new JVM for the tests that remain.
+    // Also called by the pool's warm JVM worker, with classes loaded by a fresh class loader.
+    public static int runBatch(String testsPath, long timeoutMillis, long wallTimeoutMillis, String testNumbers) {{
+        PrintStream protocol = System.out;
+        PrintStream originalErr = System.err;
+        JsonObject suite;
+        try {{
+            suite = readSuite(testsPath);
+        }} catch (Exception e) {{
+            System.err.println("Error: " + e.getMessage());
+            return 1;
+        }}
+        JsonArray inputs = suite.getJsonArray("inputs");
+        JsonArray outputs = suite.getJsonArray("outputs");
+
+        ThreadMXBean threads = ManagementFactory.getThreadMXBean();
+        AtomicReference<Thread> worker = new AtomicReference<>();
+        ExecutorService executor = Executors.newSingleThreadExecutor(r -> {{
+            Thread thread = new Thread(r);
+            thread.setDaemon(true);
+            worker.set(thread);
+            return thread;
+        }});
+
+        for (String testNumber : testNumbers.split(",")) {{
+            int index = Integer.parseInt(testNumber);
+            JsonValue inputJson = decode(inputs.get(index));
+            JsonValue expectedJson = decode(outputs.get(index));
+
+            // Capture anything the test prints
+            BoundedOutputStream stdout = new BoundedOutputStream(MAX_OUTPUT_BYTES);
+            BoundedOutputStream stderr = new BoundedOutputStream(MAX_OUTPUT_BYTES);
+            System.setOut(new PrintStream(stdout, true));
+            System.setErr(new PrintStream(stderr, true));
+
+            int code;
+            boolean timedOut = false;
+            long started = System.nanoTime();
+            // CPU time of the test's thread when it started, and once it has finished
+            AtomicLong cpuStarted = new AtomicLong(-1);
+            AtomicLong cpuUsed = new AtomicLong(-1);
+            Future<Integer> future = executor.submit(() -> {{
+                long cpu = threads.getCurrentThreadCpuTime();
+                cpuStarted.set(cpu);
+                try {{
+                    return runTest(inputJson, expectedJson);
+                }} finally {{
+                    cpuUsed.set(threads.getCurrentThreadCpuTime() - cpu);
+                }}
+            }});
+            long cpuTime = 0;
+            while (true) {{
+                try {{
+                    code = future.get(CPU_POLL_MILLIS, TimeUnit.MILLISECONDS);
+                    break;
+                }} catch (TimeoutException e) {{
+                    if (cpuStarted.get() >= 0) {{
+                        cpuTime = threads.getThreadCpuTime(worker.get().getId()) - cpuStarted.get();
+                    }}
+                    if (cpuTime >= timeoutMillis * 1000000L || System.nanoTime() - started >= wallTimeoutMillis * 1000000L) {{
+                        code = 124;
+                        timedOut = true;
+                        break;
+                    }}
+                }} catch (Exception e) {{
+                    System.err.println("Error: " + e.getMessage());
+                    code = 1;
+                    break;
+                }}
+            }}
+            if (cpuUsed.get() >= 0) {{
+                cpuTime = cpuUsed.get();
+            }}
+
+            System.setOut(protocol);
+            System.setErr(originalErr);
+            protocol.println(Json.createObjectBuilder()
+                .add("test_number", index)
+                .add("returncode", code)
+                .add("stdout", stdout.toString())
+                .add("stderr", stderr.toString())
+                .add("wall_time", (System.nanoTime() - started) / 1e9)
+                .add("cpu_time", cpuTime / 1e9)
+                .build()
+                .toString());
+            protocol.flush();
+
+            if (timedOut) {{
+                Runtime.getRuntime().halt(124);
+            }}
+        }}
+        return 0;
+    }}
+
+    // Keeps only the first and last limit / 2 bytes written to it, like the executor does
+    // with the output of test processes, so a test printing without end cannot exhaust
+    // the JVM's memory
+    private static class BoundedOutputStream extends OutputStream {{
+        private final byte[] head;
+        private final byte[] tail;
+        private int headSize = 0;
+        private long tailWritten = 0;
+
+        BoundedOutputStream(int limit) {{
+            head = new byte[limit / 2];
+            tail = new byte[limit / 2];
+        }}
+
+        @Override
+        public synchronized void write(int b) {{
+            if (headSize < head.length) {{
+                head[headSize++] = (byte) b;
+            }} else if (tail.length > 0) {{
+                tail[(int) (tailWritten++ % tail.length)] = (byte) b;
+            }}
+        }}
+
+        @Override
+        public synchronized void write(byte[] b, int off, int len) {{
+            for (int i = off; i < off + len; i++) {{
+                write(b[i]);
+            }}
+        }}
+
+        @Override
+        public synchronized String toString() {{
+            ByteArrayOutputStream out = new ByteArrayOutputStream();
+            out.write(head, 0, headSize);
+            if (tailWritten <= tail.length) {{
+                out.write(tail, 0, (int) tailWritten);
+            }} else {{
+                byte[] marker = "\\n... output truncated ...\\n".getBytes();
+                int start = (int) (tailWritten % tail.length);
+                out.write(marker, 0, marker.length);
+                out.write(tail, start, tail.length - start);
+                out.write(tail, 0, start);
+            }}
+            return out.toString();
+        }}
+    }}
+
+    // Read the test suite file - {{"inputs": [...], "outputs": [...]}}
+    private static JsonObject readSuite(String testsPath) throws IOException {{
+        try (JsonReader reader = Json.createReader(new FileReader(testsPath))) {{
+            return reader.readObject();
+        }}
+    }}
+
+    // Test values are either JSON encoded strings or JSON values
+    private static JsonValue decode(JsonValue value) {{
+        if (value.getValueType() != JsonValue.ValueType.STRING) {{
+            return value;
+        }}
+        try (JsonReader reader = Json.createReader(new StringReader(((JsonString) value).getString()))) {{
+            return reader.readValue();
         }}
     }}
 
@@ -160,6 +363,22 @@ public class TestRunner {{
         with open(self.test_dir / "TestRunner.java", "w") as test_file:
             test_file.write(test_code)
 
+        self._write_test_suite()
+
+        # Compile once for all test cases - a compile error fails every test
+        try:
+            proc = subprocess.run(
+                ["javac", "-cp", CLASSPATH, "Solution.java", "TestRunner.java"],
+                cwd=self.test_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=COMPILE_TIMEOUT
+            )
+            if proc.returncode != 0:
+                self.build_error = proc.stdout + proc.stderr
+        except subprocess.TimeoutExpired:
+            self.build_error = f"Compilation exceeded the time limit of {COMPILE_TIMEOUT} seconds.".encode()
+
     def _get_execution_command(self, test_number: int) -> list:
         """
         Returns the command to execute the Java test file.
@@ -169,15 +388,89 @@ public class TestRunner {{
             test_number (int): The test number to execute.
 
         Returns:
-            list: The command to compile and run the test.
+            list: The command to run the (already compiled) test.
         """
         # Return command as list (like Python executor)
-        # Java requires compilation before execution, then run with JSON parameters
+        # Classes are compiled once in _build_test_files, and the test case is read from the suite file
+        return [
+            "java", f"-Xmx{self.memory_limit // (1024 * 1024)}m", "-cp", f"{self.test_dir}:{CLASSPATH}",
+            "TestRunner", "--test", str(self.tests_file), str(test_number)
+        ]
+
+    def _get_batch_command(self, test_numbers: List[int]) -> list:
+        """
+        Returns the command to run the given tests in a single JVM.
+
+        Args:
+            test_numbers (List[int]): The test numbers to execute.
+
+        Returns:
+            list: The command to run the tests.
+        """
         return [
-            "bash", "-c",
-            f"cd {self.test_dir} && javac -cp /usr/share/java/javax.json-api.jar:/usr/share/java/javax.json.jar *.java && java -cp .:/usr/share/java/javax.json-api.jar:/usr/share/java/javax.json.jar TestRunner '{self.inputs[test_number]}' '{self.outputs[test_number]}'"
+            "java", f"-Xmx{self.memory_limit // (1024 * 1024)}m", "-cp", f"{self.test_dir}:{CLASSPATH}",
+            "TestRunner", "--batch", str(self.tests_file),
+            str(int(self.timeout * 1000)), str(int(self.wall_timeout * 1000)),
+            ",".join(str(i) for i in test_numbers)
         ]
 
+    def _get_cgroup_memory_limit(self) -> int:
+        """
+        Returns the memory.max of each test's cgroup - the heap limit plus the JVM's own
+        memory, so exceeding the heap is still reported by the OutOfMemoryError handler.
+        """
+        return self.memory_limit + JVM_MEMORY_OVERHEAD
+
+    @classmethod
+    def _get_worker_max_uses(cls) -> int:
+        """
+        A submission can leave threads, static state and redirected streams behind in
+        the JVM which ran it, so each warm JVM runs a single job and is then replaced.
+        """
+        return 1
+
+    @classmethod
+    def _get_worker_command(cls) -> list:
+        """
+        Returns the command to start a warm JVM worker for the worker pool, compiling
+        the worker first if this container has not done so yet.
+        """
+        if not (WORKER_CLASSES / "JavaPoolWorker.class").exists():
+            # Compile into a unique directory and move it into place, as several
+            # processes may be starting pools at the same time
+            build_dir = TEMP_DIR / str(uuid4())
+            subprocess.run(
+                ["javac", "-cp", CLASSPATH, "-d", str(build_dir), str(WORKER_SOURCE)],
+                check=True,
+                timeout=COMPILE_TIMEOUT
+            )
+            try:
+                os.rename(build_dir, WORKER_CLASSES)
+            except OSError:
+                shutil.rmtree(build_dir, ignore_errors=True)
+        return [
+            "java", f"-Xmx{DEFAULT_MEMORY_LIMIT // (1024 * 1024)}m",
+            "-cp", f"{WORKER_CLASSES}:{CLASSPATH}", "JavaPoolWorker"
+        ]
+
+    def _get_worker_job(self, test_numbers: List[int]) -> dict:
+        """
+        Returns the job for a warm JVM worker to run the given tests.
+
+        Args:
+            test_numbers (List[int]): The test numbers to execute.
+
+        Returns:
+            dict: The job description.
+        """
+        return {
+            "test_dir": str(self.test_dir),
+            "tests": ",".join(str(i) for i in test_numbers),
+            "tests_file": str(self.tests_file),
+            "timeout_ms": int(self.timeout * 1000),
+            "wall_timeout_ms": int(self.wall_timeout * 1000),
+        }
+
     def _get_result(self, returncode: int, stdout: bytes, stderr: bytes) -> dict:
         """
         Processes the result from a Java test execution.
@@ -1,28 +1,44 @@
 """
 Executor for Python code.
 """
+from pathlib import Path
+from json import dumps
+from typing import List
+
+from src.config import BATCH_WORKERS, MAX_OUTPUT_BYTES
 from src.executor.abstract_executor import AbstractExecutor
 
+# Harness used to run every test case of a submission in a single process
+HARNESS = Path(__file__).parent / "harness" / "python_harness.py"
+
+# Fork server used by the worker pool to run the harness from a warm interpreter
+ZYGOTE = Path(__file__).parent / "harness" / "python_zygote.py"
+
 class PythonExecutor(AbstractExecutor):
     # PUBLIC METHODS
     def _build_test_files(self):
         """
         Builds the test files for the Python submission.
-        Creates a submission.py file and test files for each test case.
+        Creates a submission.py file and a test runner which runs one test case from the test suite file.
         """
         # Create the submission file
         with open(self.test_dir / "submission.py", "w") as submission_file:
             submission_file.write(self.submission_code)
 
-        # Create the test file
+        # Create the test file, which reads its test case from the test suite file
         test_code = f'''
 from submission import {self.function_name}
 from json import loads
 from sys import argv, stderr, exit
 
+def decode(value):
+    return loads(value) if isinstance(value, str) else value
+
 if __name__ == "__main__":
-    parameters = loads(argv[1])
-    expected = loads(argv[2])
+    with open(argv[1]) as tests_file:
+        suite = loads(tests_file.read())
+    parameters = decode(suite["inputs"][int(argv[2])])
+    expected = decode(suite["outputs"][int(argv[2])])
     output = {self.function_name}(*parameters)
     if output != expected:
         print("\\n", output, sep="", file=stderr)
@@ -33,6 +49,9 @@ if __name__ == "__main__":
         with open(self.test_dir / "test_runner.py", "w") as test_file:
             test_file.write(test_code)
 
+        # Create the test suite file read by the test runner and batch harness
+        self._write_test_suite()
+
     def _get_execution_command(self, test_number: int) -> str:
         """
         Returns the command to execute the Python test file.
@@ -43,7 +62,71 @@ if __name__ == "__main__":
         Returns:
             str: The command to run the test.
         """
-        return ["python",  f"{self.test_dir}/test_runner.py", f"{self.inputs[test_number]}",  f"{self.outputs[test_number]}"]
+        return ["python", f"{self.test_dir}/test_runner.py", str(self.tests_file), str(test_number)]
+
+    def _get_batch_command(self, test_numbers: List[int]) -> list:
+        """
+        Returns the command to run the given tests through the batch harness, which
+        imports the submission once and forks a process per test case (each in its own
+        cgroup, if tests run in cgroups).
+
+        Args:
+            test_numbers (List[int]): The test numbers to execute.
+
+        Returns:
+            list: The command to run the tests.
+        """
+        command = [
+            "python", str(HARNESS), str(self.test_dir), self.function_name,
+            "--tests", ",".join(str(i) for i in test_numbers),
+            "--tests-file", str(self.tests_file),
+            "--workers", str(BATCH_WORKERS),
+            "--timeout", str(self.timeout),
+            "--wall-timeout", str(self.wall_timeout),
+            "--memory-limit", str(self.memory_limit),
+            "--max-output", str(MAX_OUTPUT_BYTES),
+        ]
+        cgroups = self._get_test_cgroups()
+        if cgroups is not None:
+            command += ["--cgroup", dumps(cgroups)]
+        return command
+
+    @classmethod
+    def _batch_runs_tests_in_cgroups(cls) -> bool:
+        """
+        The batch harness and fork server create a leaf cgroup for each test they fork.
+        """
+        return True
+
+    @classmethod
+    def _get_worker_command(cls) -> list:
+        """
+        Returns the command to start a warm fork server for the worker pool.
+        """
+        return ["python", str(ZYGOTE)]
+
+    def _get_worker_job(self, test_numbers: List[int]) -> dict:
+        """
+        Returns the job for the fork server to run the given tests through the harness.
+
+        Args:
+            test_numbers (List[int]): The test numbers to execute.
+
+        Returns:
+            dict: The job description.
+        """
+        return {
+            "test_dir": str(self.test_dir),
+            "function_name": self.function_name,
+            "tests": ",".join(str(i) for i in test_numbers),
+            "tests_file": str(self.tests_file),
+            "workers": BATCH_WORKERS,
+            "timeout": self.timeout,
+            "wall_timeout": self.wall_timeout,
+            "memory_limit": self.memory_limit,
+            "max_output": MAX_OUTPUT_BYTES,
+            "cgroup": self._get_test_cgroups(),
+        }
     
     def _get_result(self, returncode: int, stdout: bytes, stderr: bytes) -> dict:
         """
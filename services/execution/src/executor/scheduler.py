@@ -0,0 +1,196 @@
+"""
+Container wide scheduler which bounds the number of test processes running at once.
+
+Celery runs several worker processes per container, each of which may be executing a
+submission. The scheduler's state lives in shared memory created when this module is
+first imported (in the Celery parent process, before the pool processes are forked),
+so every worker process in the container draws from the same set of slots.
+
+Slots are shared fairly: while several submissions are waiting, a process may only
+hold its share of the slots (in proportion to the number of submissions it is
+running), although a process holding no slots may always take a free one.
+
+A process waiting for slots blocks on a condition shared by every process (in a thread,
+so its event loop keeps running), which is notified whenever slots are released. Slots
+held by processes which exited without releasing them are only reclaimed once a wait
+times out.
+"""
+
+import os
+import time
+import asyncio
+import multiprocessing
+from contextlib import asynccontextmanager
+from typing import Tuple
+
+from src.config import MAX_CONCURRENT_TESTS
+
+# Maximum number of processes which can use the scheduler at once
+MAX_PROCESSES = 128
+
+# Seconds a process waits to be notified of released slots before reclaiming those held
+# by processes which have exited
+WAIT_TIMEOUT = 0.5
+
+
+class Scheduler:
+    def __init__(self, slots: int):
+        self.slots = max(1, slots)
+        self._lock = multiprocessing.Lock()
+        # Notified, and the version incremented, whenever slots may have become available
+        self._changed = multiprocessing.Condition(self._lock)
+        self._version = multiprocessing.Value("L", 0, lock=False)
+        # Per process entries - the pid, slots held and submissions active
+        self._pids = multiprocessing.Array("i", MAX_PROCESSES, lock=False)
+        self._held = multiprocessing.Array("i", MAX_PROCESSES, lock=False)
+        self._active = multiprocessing.Array("i", MAX_PROCESSES, lock=False)
+
+    @asynccontextmanager
+    async def submission(self):
+        """
+        Registers a submission as active in this process while the context is open.
+        """
+        with self._lock:
+            entry = self._entry()
+            self._active[entry] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                entry = self._entry()
+                self._active[entry] = max(0, self._active[entry] - 1)
+                # Processes still running submissions may now hold a larger share
+                self._notify()
+
+    async def acquire(self, count: int = 1):
+        """
+        Waits until `count` slots can be taken by this process, then takes them.
+        """
+        count = min(count, self.slots)
+        while True:
+            acquired, version = self._try_acquire(count)
+            if acquired:
+                return
+            await self._wait(version)
+
+    async def acquire_idle(self, count: int = 1, wait: float = 0):
+        """
+        Waits until at most half of the slots are in use, or for `wait` seconds, then
+        waits until `count` slots can be taken by this process and takes them.
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            with self._lock:
+                idle = sum(self._held) + count <= max(count, self.slots // 2)
+                version = self._version.value
+            remaining = deadline - time.monotonic()
+            if idle or remaining <= 0:
+                break
+            await self._wait(version, min(WAIT_TIMEOUT, remaining))
+        await self.acquire(count)
+
+    def release(self, count: int = 1):
+        """
+        Releases `count` slots held by this process.
+        """
+        count = min(count, self.slots)
+        with self._lock:
+            entry = self._entry()
+            self._held[entry] = max(0, self._held[entry] - count)
+            self._notify()
+
+    def stats(self) -> dict:
+        """
+        Returns the number of slots and how many are in use.
+        """
+        with self._lock:
+            self._clean()
+            return {
+                "slots": self.slots,
+                "running": sum(self._held),
+                "active_submissions": sum(self._active),
+            }
+
+    def _try_acquire(self, count: int) -> Tuple[bool, int]:
+        """
+        Takes `count` slots if this process may do so now.
+
+        Returns:
+            Tuple[bool, int]: Whether the slots were taken, and the version they were
+                              checked against.
+        """
+        with self._lock:
+            version = self._version.value
+            entry = self._entry()
+            running = sum(self._held)
+            if running + count > self.slots:
+                return False, version
+            held = self._held[entry]
+            if held > 0:
+                active = max(1, sum(self._active))
+                share = max(1, self.slots * max(1, self._active[entry]) // active)
+                if held + count > share:
+                    return False, version
+            self._held[entry] = held + count
+            return True, version
+
+    async def _wait(self, version: int, timeout: float = WAIT_TIMEOUT):
+        """
+        Waits until slots may have become available since `version`. If nothing is
+        released before the timeout, slots held by processes which exited are reclaimed.
+        """
+        if not await asyncio.to_thread(self._wait_for_change, version, timeout):
+            with self._lock:
+                self._clean()
+
+    def _wait_for_change(self, version: int, timeout: float) -> bool:
+        with self._changed:
+            return self._changed.wait_for(lambda: self._version.value != version, timeout)
+
+    def _notify(self):
+        """
+        Wakes the processes waiting for slots. Must be called with the lock held.
+        """
+        self._version.value += 1
+        self._changed.notify_all()
+
+    def _entry(self) -> int:
+        """
+        Returns the index of this process's entry, claiming a free one if needed.
+        Must be called with the lock held.
+        """
+        pid = os.getpid()
+        free = None
+        for i in range(MAX_PROCESSES):
+            if self._pids[i] == pid:
+                return i
+            if free is None and self._pids[i] == 0:
+                free = i
+        if free is None:
+            raise RuntimeError("Too many processes using the test scheduler")
+        self._pids[free] = pid
+        self._held[free] = 0
+        self._active[free] = 0
+        return free
+
+    def _clean(self):
+        """
+        Frees the entries of processes which have exited, releasing their slots.
+        Must be called with the lock held.
+        """
+        for i in range(MAX_PROCESSES):
+            pid = self._pids[i]
+            if pid == 0:
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                self._pids[i] = 0
+                self._held[i] = 0
+                self._active[i] = 0
+                self._notify()
+            except PermissionError:
+                pass
+
+
+scheduler = Scheduler(MAX_CONCURRENT_TESTS)
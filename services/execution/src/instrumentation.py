@@ -0,0 +1,112 @@
+"""
+Prometheus metrics and structured logging for the execution service.
+
+Celery runs submissions in several worker processes, so metrics are recorded in
+prometheus_client's multiprocess mode: each process writes its samples to
+PROMETHEUS_MULTIPROC_DIR, and the main worker process serves the combined metrics
+on METRICS_PORT.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sys
+
+from src.config import METRICS_DIR, METRICS_PORT
+
+# Must be set before prometheus_client is imported
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_DIR)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, multiprocess, start_http_server
+
+TEST_WALL_TIME = Histogram(
+    "execution_test_wall_seconds",
+    "Wall clock time of each test case",
+    ["language"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+TEST_CPU_TIME = Histogram(
+    "execution_test_cpu_seconds",
+    "CPU time (user and system) of each test case, where the harness reports it",
+    ["language"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+TEST_MAX_RSS = Histogram(
+    "execution_test_max_rss_bytes",
+    "Peak resident memory of each test case, where the harness reports it",
+    ["language"],
+    buckets=tuple(mb * 1024 * 1024 for mb in (8, 16, 32, 64, 128, 256, 512)),
+)
+TEST_RESULTS = Counter(
+    "execution_test_results_total",
+    "Test case results by outcome",
+    ["language", "outcome"],
+)
+SUBMISSION_DURATION = Histogram(
+    "execution_submission_duration_seconds",
+    "Time to build and run every test case of a submission",
+    ["language"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+QUEUE_PUBLISH_LATENCY = Histogram(
+    "execution_queue_publish_duration_seconds",
+    "Time taken to publish results to the output queue",
+    ["task"],
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as single line JSON objects, including any `fields` passed in extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str):
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+
+
+def record_test(language: str, outcome: str, usage: dict) -> None:
+    """
+    Records the outcome and resource usage of a test case. usage may contain wall_time
+    and cpu_time (seconds) and max_rss (bytes) - whichever the runner measured.
+    """
+    TEST_RESULTS.labels(language, outcome).inc()
+    if usage.get("wall_time") is not None:
+        TEST_WALL_TIME.labels(language).observe(usage["wall_time"])
+    if usage.get("cpu_time") is not None:
+        TEST_CPU_TIME.labels(language).observe(usage["cpu_time"])
+    if usage.get("max_rss") is not None:
+        TEST_MAX_RSS.labels(language).observe(usage["max_rss"])
+
+
+def start_metrics_server() -> None:
+    """Serve the metrics of every worker process, discarding files left by a previous run."""
+    if not METRICS_PORT:
+        return
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(METRICS_PORT, registry=registry)
+
+
+def mark_process_dead(pid: int) -> None:
+    """Discard the live gauge samples of an exited worker process."""
+    multiprocess.mark_process_dead(pid)
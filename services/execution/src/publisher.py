@@ -0,0 +1,67 @@
+"""
+Publishes test results for a submission to the output queue in micro-batches, so a
+submission generates a handful of messages rather than one per test case.
+"""
+
+import threading
+from typing import Callable, List
+
+
+class ResultPublisher:
+    """
+    Buffers the results of a submission and sends them as a single batch message once
+    `batch_size` results are waiting, `interval` seconds after the first buffered
+    result, or when the publisher is closed. The subscriber completes a submission once
+    it has stored a result for every test, so batches carry no completion marker.
+
+    Batch messages have the format:
+        {"submission_id": str, "results": [result, ...]}
+    """
+
+    def __init__(self, submission_id: str, send_batch: Callable[[dict], None], batch_size: int, interval: float):
+        self.submission_id = submission_id
+        self.send_batch = send_batch
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+
+        self._buffer: List[dict] = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def publish(self, result: dict):
+        """
+        Adds a test result to the current batch, sending the batch if it is full.
+        """
+        with self._lock:
+            self._buffer.append(result)
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+            elif self._timer is None and self.interval > 0:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Sends any buffered results.
+        """
+        with self._lock:
+            if self._buffer:
+                self._flush()
+
+    def close(self):
+        """
+        Sends any remaining results once the submission has stopped running, whether or
+        not it finished.
+        """
+        self.flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        results, self._buffer = self._buffer, []
+        self.send_batch({
+            "submission_id": self.submission_id,
+            "results": results,
+        })
@@ -4,15 +4,29 @@ executes the tests and returns the result according to specified formats describ
 """
 
 from celery import Celery
+from celery.signals import setup_logging, worker_init, worker_process_init, worker_process_shutdown
 from src.executor import executor_generator
+from src.publisher import ResultPublisher
+from src.suites import SuiteUnavailable, load_suite
+from src.sandbox import cgroup
+from src.instrumentation import configure_logging, start_metrics_server, mark_process_dead, QUEUE_PUBLISH_LATENCY
+from src.tracing import Span, context_from_task, record_child, task_headers
+import src.tracing as tracing
 from src.config import (
     INPUT_QUEUE,
     BROKER,
     LANGUAGE,
+    LOG_LEVEL,
     OUTPUT_QUEUE,
+    RESULT_BATCH_SIZE,
+    RESULT_BATCH_INTERVAL,
 )
 
+from functools import partial
 from json import loads
+import logging
+import os
+import time
 
 # Initialise the Celery application
 celery = Celery("receiver")
@@ -22,17 +36,57 @@ celery.conf.task_default_queue=INPUT_QUEUE
 # Select the executor based on the language
 executor = executor_generator(LANGUAGE)
 
-print("STARTED CONTAINER")
+logger = logging.getLogger("execution")
+
+@setup_logging.connect
+def setup_json_logging(**kwargs):
+    """Replace Celery's log format with the structured one used by the other services."""
+    configure_logging(LOG_LEVEL)
+
+@worker_init.connect
+def serve_metrics(**kwargs):
+    """Serve metrics from the main worker process, before the pool processes are started."""
+    logger.info("Execution worker started", extra={"fields": {"language": LANGUAGE, "queue": INPUT_QUEUE}})
+    start_metrics_server()
+
+@worker_init.connect
+def setup_cgroups(**kwargs):
+    """Delegate the container's cgroup to test processes, before the pool processes are started."""
+    cgroup.setup()
+
+@worker_process_init.connect
+def start_worker_pool(**kwargs):
+    """Start warm runtime workers in each Celery worker process, before the first task."""
+    try:
+        pool = executor.get_worker_pool()
+        if pool is not None:
+            pool.prewarm()
+    except Exception:
+        logger.exception("Failed to start worker pool")
+
+@worker_process_shutdown.connect
+def stop_worker_pool(pid=None, **kwargs):
+    """Destroy warm runtime workers when a Celery worker process exits."""
+    pool = executor.get_worker_pool()
+    if pool is not None:
+        logger.info("Worker pool stats", extra={"fields": pool.stats()})
+        pool.shutdown()
+    mark_process_dead(pid or os.getpid())
+    tracing.flush()
 
 ################################################################################
 
-@celery.task(name='execute_submission', queue=INPUT_QUEUE)
+@celery.task(name='execute_submission', queue=INPUT_QUEUE, bind=True)
 def execute_submission(
+    self,
     submission_id: str,
     submission_code: str,
     inputs: list,
     outputs: list, # list of ints/bools/arrays/strings
-    function_name: str):
+    function_name: str,
+    hidden: list = None,
+    fail_fast: bool = False,
+    suite: dict = None):
     """
     Executes the given submission code against the provided test cases.
     Args:
@@ -41,6 +95,9 @@ def execute_submission(
         inputs (list): List of lists of ints/bools/arrays/strings
         outputs (list): List of ints/bools/arrays/strings
         function_name (str): The name of the function to test
+        hidden (list): Whether each test case is hidden from the user (optional)
+        fail_fast (bool): Whether to stop at the first failed test, reporting the rest as skipped (optional)
+        suite (dict): Reference to the staged test suite, sent instead of inputs, outputs and hidden (optional)
     Returns:
         list: Results for each test case (pass/fail and error messages).
     """
@@ -62,17 +119,56 @@ def execute_submission(
     #         print(f"Error loading output: {output, type(output)}")
     
 
-    # Run tests in sandboxed environment
-    test_runner = executor(
-        function_name,
-        inputs,
-        outputs,
-        submission_code,
-        submission_id,
-        send_results,
-    )
-    with test_runner:
-        test_runner.run()
+    # Continue the submission service's trace, recording how long the task was queued for
+    parent, published_at = context_from_task(self.request.get("trace"))
+    if published_at is not None:
+        record_child("queue wait", parent, published_at, max(0.0, time.time() - published_at), {"queue": INPUT_QUEUE})
+    num_tests = suite["num_tests"] if suite is not None else len(inputs)
+    span = Span("execute submission", parent, {
+        "submission_id": submission_id, "language": LANGUAGE, "tests": num_tests, "fail_fast": fail_fast
+    })
+
+    # Publish results in batches, or one message per test if batching is disabled
+    publisher = None
+    if RESULT_BATCH_SIZE > 0:
+        publisher = ResultPublisher(
+            submission_id, partial(send_result_batch, trace=span.context), RESULT_BATCH_SIZE, RESULT_BATCH_INTERVAL
+        )
+    publish = publisher.publish if publisher else partial(send_results, trace=span.context)
+
+    try:
+        # Test cases of a staged suite are read from the container's cached copy
+        tests_file = None
+        if suite is not None:
+            try:
+                with Span("load test suite", span.context, {"version": suite.get("version")}):
+                    staged = load_suite(suite)
+            except SuiteUnavailable as e:
+                logger.error("Test suite unavailable", extra={"fields": {"submission_id": submission_id, "error": str(e)}})
+                for test_number in range(num_tests):
+                    publish(suite_unavailable_result(submission_id, test_number))
+                return
+            inputs, outputs, hidden, tests_file = staged.inputs, staged.outputs, staged.hidden, staged.path
+
+        # Run tests in sandboxed environment
+        test_runner = executor(
+            function_name,
+            inputs,
+            outputs,
+            submission_code,
+            submission_id,
+            publish,
+            hidden,
+            span.context,
+            fail_fast,
+            tests_file,
+        )
+        with test_runner:
+            test_runner.run()
+    finally:
+        if publisher:
+            publisher.close()
+        span.finish()
 
     """ New procedure:
     1. Receive inputs and outputs, submission code and the function name
@@ -84,11 +180,36 @@ def execute_submission(
         7. As results come in, it should send them to the output queue asynchronously (format in Google Doc)
     """
     
-def send_results(results):
+def suite_unavailable_result(submission_id: str, test_number: int) -> dict:
+    """Returns the failed result reported for a test whose test suite could not be loaded."""
+    return {
+        "submission_id": submission_id,
+        "test_number": test_number,
+        "passed": False,
+        "inputs": None,
+        "expected": None,
+        "output": "",
+        "stdout": "",
+        "error": "test_suite_unavailable"
+    }
+
+def send_results(results, trace=None):
     """Send results to the output queue."""
     # print("Sending results to output queue:", results)
-    celery.send_task(
-            'result',
-            args=[results],
-            queue=OUTPUT_QUEUE
-    )
\ No newline at end of file
+    with QUEUE_PUBLISH_LATENCY.labels("result").time(), Span("publish results", trace) as span:
+        celery.send_task(
+                'result',
+                args=[results],
+                queue=OUTPUT_QUEUE,
+                headers=task_headers(span.context)
+        )
+
+def send_result_batch(batch, trace=None):
+    """Send a batch of results for a submission to the output queue."""
+    with QUEUE_PUBLISH_LATENCY.labels("result_batch").time(), Span("publish results", trace, {"results": len(batch["results"])}) as span:
+        celery.send_task(
+                'result_batch',
+                args=[batch],
+                queue=OUTPUT_QUEUE,
+                headers=task_headers(span.context)
+        )
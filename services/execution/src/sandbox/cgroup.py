@@ -0,0 +1,150 @@
+"""
+cgroup v2 sandbox for test processes.
+
+When CGROUP_SANDBOX is enabled, every test process runs in its own leaf cgroup, limited by
+memory.max (with swap disabled), cpu.max and pids.max. Once the test has exited, its CPU
+time (cpu.stat), peak memory (memory.peak) and whether the kernel killed it for exceeding
+its memory limit (memory.events) are read from the leaf. Unlike the rusage of a process,
+these cover everything the test started, and unlike the wall clock time they are not
+inflated by other tests competing for the CPU. The leaves themselves are managed by
+src/sandbox/resources.py, which the batch harness shares.
+
+cgroup v2 only lets a cgroup enable controllers for its children while it has no processes
+of its own, so setup moves the container's processes to a `service` leaf and creates test
+leaves under `tests`:
+
+    CGROUP_ROOT/
+    ├── service/                 # the Celery worker, pooled workers and batch harnesses
+    └── tests/
+        └── {submission}-{test}/ # one leaf per running test
+
+Test processes run as the same user as the worker, so the limits contain runaway tests
+rather than isolating hostile ones.
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.config import CGROUP_SANDBOX, CGROUP_ROOT, CGROUP_CPU_LIMIT, CGROUP_PIDS_LIMIT
+from src.sandbox.resources import Leaf
+
+logger = logging.getLogger("execution")
+
+CONTROLLERS = ("memory", "cpu", "pids")
+SERVICE = "service"
+TESTS = "tests"
+
+# Period of the cpu.max quota, in microseconds
+CPU_PERIOD = 100000
+
+# Whether this process found the tests cgroup set up, once checked
+_available = None
+
+
+def _enable_controllers(path: Path) -> None:
+    enabled = (path / "cgroup.subtree_control").read_text().split()
+    missing = [controller for controller in CONTROLLERS if controller not in enabled]
+    if missing:
+        (path / "cgroup.subtree_control").write_text(" ".join(f"+{c}" for c in missing))
+
+
+def setup() -> bool:
+    """
+    Prepares CGROUP_ROOT for test leaves, if the cgroup sandbox is enabled. Called once
+    from the main worker process before the pool processes are started, which then inherit
+    the service cgroup.
+
+    Returns:
+        bool: Whether tests will run in their own cgroups.
+    """
+    if not CGROUP_SANDBOX:
+        return False
+    try:
+        available = (CGROUP_ROOT / "cgroup.controllers").read_text().split()
+        missing = [controller for controller in CONTROLLERS if controller not in available]
+        if missing:
+            logger.warning("cgroup sandbox disabled - controllers not delegated", extra={"fields": {
+                "root": str(CGROUP_ROOT), "missing": missing
+            }})
+            return False
+
+        service = CGROUP_ROOT / SERVICE
+        service.mkdir(exist_ok=True)
+        for pid in (CGROUP_ROOT / "cgroup.procs").read_text().split():
+            try:
+                (service / "cgroup.procs").write_text(pid)
+            except (ProcessLookupError, FileNotFoundError):
+                # The process has already exited
+                pass
+        _enable_controllers(CGROUP_ROOT)
+        tests = CGROUP_ROOT / TESTS
+        tests.mkdir(exist_ok=True)
+        _enable_controllers(tests)
+    except OSError as e:
+        logger.warning("cgroup sandbox disabled - failed to set up cgroups", extra={"fields": {
+            "root": str(CGROUP_ROOT), "error": str(e)
+        }})
+        return False
+
+    logger.info("cgroup sandbox enabled", extra={"fields": {"root": str(CGROUP_ROOT)}})
+    return True
+
+
+def tests_cgroup() -> Optional[Path]:
+    """
+    Returns the cgroup test leaves are created in, or None if tests do not run in cgroups.
+    """
+    global _available
+    if not CGROUP_SANDBOX:
+        return None
+    path = CGROUP_ROOT / TESTS
+    if _available is None:
+        try:
+            enabled = (path / "cgroup.subtree_control").read_text().split()
+            _available = all(controller in enabled for controller in CONTROLLERS)
+        except OSError:
+            _available = False
+    return path if _available else None
+
+
+def test_limits(memory_limit: int) -> Dict[str, str]:
+    """
+    Returns the values of the interface files which limit a test's leaf.
+
+    Args:
+        memory_limit (int): The memory the test may use, in bytes.
+    """
+    return {
+        "memory.max": str(memory_limit),
+        "memory.swap.max": "0",
+        "cpu.max": f"{max(1000, int(CGROUP_CPU_LIMIT * CPU_PERIOD))} {CPU_PERIOD}",
+        "pids.max": str(CGROUP_PIDS_LIMIT),
+    }
+
+
+def remove_leaves(prefix: str) -> None:
+    """
+    Removes any test leaves named with the given prefix, such as those left behind by a
+    batch harness which was killed while tests were running.
+    """
+    tests = tests_cgroup()
+    if tests is None:
+        return
+    for path in tests.glob(f"{prefix}*"):
+        if path.is_dir():
+            Leaf(path).remove()
+
+
+def create_leaf(name: str, limits: Dict[str, str]) -> Optional[Leaf]:
+    """
+    Creates a test leaf under the tests cgroup.
+
+    Returns:
+        Optional[Leaf]: The leaf, or None if tests do not run in cgroups or it could not
+                        be created (the test then runs without one).
+    """
+    tests = tests_cgroup()
+    if tests is None:
+        return None
+    return Leaf.create(tests, name, limits)
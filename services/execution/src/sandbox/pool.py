@@ -0,0 +1,234 @@
+"""
+Pool of pre-warmed runtime workers (e.g. a Python fork server or a warm JVM) which
+executors check out to run a submission, instead of cold starting a new runtime.
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from json import dumps
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from src.config import POOL_SIZE, POOL_MAX_USES, POOL_IDLE_TIMEOUT
+
+
+class PooledWorker:
+    """
+    A long running worker process which accepts jobs as JSON lines on stdin.
+    """
+
+    def __init__(self, command: List[str]):
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def submit(self, job: dict):
+        """
+        Sends a job to the worker.
+
+        Raises:
+            OSError: If the worker is no longer accepting jobs.
+        """
+        self.process.stdin.write((dumps(job) + "\n").encode())
+        self.process.stdin.flush()
+
+    @asynccontextmanager
+    async def output(self, limit: int) -> AsyncIterator[asyncio.StreamReader]:
+        """
+        Reads the worker's stdout through the running event loop while the context is open.
+
+        Workers outlive the event loop of the submission which uses them, so the loop is
+        given a duplicate of the pipe, which it closes on exit, leaving the worker's own.
+
+        Args:
+            limit (int): The longest line the reader accepts.
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=limit, loop=loop)
+        pipe = os.fdopen(os.dup(self.process.stdout.fileno()), "rb", buffering=0)
+        try:
+            transport, _ = await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe
+            )
+        except BaseException:
+            pipe.close()
+            raise
+        try:
+            yield reader
+        finally:
+            transport.close()
+
+    def destroy(self):
+        """
+        Kills the worker and anything it started.
+        """
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class WorkerPool:
+    """
+    Keeps up to `size` idle workers ready to be checked out. A worker is returned to
+    the pool after use until it has served `max_uses` jobs, and idle workers are
+    reaped after `idle_timeout` seconds. Unhealthy workers are destroyed.
+    """
+
+    def __init__(self, command: List[str], size: int, max_uses: int, idle_timeout: float):
+        self.command = command
+        self.size = size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.pid = os.getpid()
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.destroyed = 0
+        self.reaped = 0
+
+        reaper = threading.Thread(target=self._reap_forever, daemon=True)
+        reaper.start()
+
+    def prewarm(self):
+        """
+        Starts workers until the pool is full.
+        """
+        with self._lock:
+            while len(self._idle) < self.size:
+                self._idle.append(PooledWorker(self.command))
+
+    def checkout(self) -> PooledWorker:
+        """
+        Returns an idle worker, or starts a new one if none are available.
+        """
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive():
+                    self.hits += 1
+                    return worker
+                worker.destroy()
+                self.destroyed += 1
+            self.misses += 1
+        return PooledWorker(self.command)
+
+    def checkin(self, worker: PooledWorker, healthy: bool):
+        """
+        Returns a worker to the pool after use, destroying it if it is unhealthy or
+        has reached its maximum number of uses.
+        """
+        worker.uses += 1
+        worker.last_used = time.monotonic()
+        with self._lock:
+            if not healthy:
+                worker.destroy()
+                self.destroyed += 1
+            elif worker.uses >= self.max_uses or len(self._idle) >= self.size:
+                # Single use workers may already be exiting
+                worker.destroy()
+                self.recycled += 1
+            elif not worker.alive():
+                worker.destroy()
+                self.destroyed += 1
+            else:
+                self._idle.append(worker)
+        self.prewarm()
+
+    def reap(self):
+        """
+        Destroys workers which have been idle for longer than the idle timeout.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for worker in list(self._idle):
+                if now - worker.last_used > self.idle_timeout:
+                    self._idle.remove(worker)
+                    worker.destroy()
+                    self.reaped += 1
+
+    def shutdown(self):
+        """
+        Destroys all idle workers.
+        """
+        with self._lock:
+            while self._idle:
+                self._idle.pop().destroy()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the pool counters.
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "recycled": self.recycled,
+                "destroyed": self.destroyed,
+                "reaped": self.reaped,
+            }
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(max(1, self.idle_timeout / 2))
+            self.reap()
+
+
+# Pools for this process, by name
+_pools: Dict[str, WorkerPool] = {}
+
+
+def get_pool(
+    name: str,
+    command_factory: Callable[[], Optional[List[str]]],
+    max_uses: int = POOL_MAX_USES
+    ) -> Optional[WorkerPool]:
+    """
+    Returns the worker pool with the given name for this process, creating it if needed.
+    Pools are never shared with forked processes (e.g. Celery pool workers), since
+    their workers' pipes belong to the process which started them.
+
+    Args:
+        name (str): The name of the pool.
+        command_factory (callable): Returns the command used to start a worker, or None
+                                    if workers are not supported.
+        max_uses (int): The number of jobs a worker runs before it is replaced.
+
+    Returns:
+        Optional[WorkerPool]: The worker pool, or None if workers are not supported.
+    """
+    pool = _pools.get(name)
+    if pool is None or pool.pid != os.getpid():
+        command = command_factory()
+        if command is None:
+            return None
+        pool = WorkerPool(command, POOL_SIZE, max_uses, POOL_IDLE_TIMEOUT)
+        _pools[name] = pool
+    return pool
@@ -0,0 +1,186 @@
+"""
+Resource accounting and limits for a single test process, shared by the executor and the
+batch harnesses.
+
+This module only uses the standard library and does not read the service configuration,
+as the batch harness imports it from a separate interpreter (see
+src/executor/harness/python_harness.py). Setting up the cgroup hierarchy test leaves are
+created in is left to src/sandbox/cgroup.py.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("execution")
+
+# Seconds to wait for a killed leaf's processes to exit before giving up on removing it
+REMOVE_TIMEOUT = 1.0
+
+# Seconds between attempts to remove a killed leaf
+REMOVE_POLL_INTERVAL = 0.005
+
+# Moves the shell into the leaf given as $0, then replaces it with the test command
+ENTER_SCRIPT = 'echo $$ > "$0/cgroup.procs" && exec "$@"'
+
+
+def read_keyed(path: Path) -> Dict[str, int]:
+    """
+    Reads a flat keyed cgroup file (e.g. cpu.stat) of "key value" lines.
+    """
+    values = {}
+    for line in path.read_text().splitlines():
+        key, _, value = line.partition(" ")
+        try:
+            values[key] = int(value)
+        except ValueError:
+            pass
+    return values
+
+
+def process_cpu_time(pid: int) -> float:
+    """
+    Returns the CPU time used so far by a running process and the children it has waited for.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # utime, stime, cutime and cstime follow the command name, in clock ticks
+            fields = f.read().rsplit(")", 1)[1].split()
+        return sum(int(ticks) for ticks in fields[11:15]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class Leaf:
+    """
+    A leaf cgroup a single test process runs in.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @classmethod
+    def create(cls, parent: Path, name: str, limits: Dict[str, str]) -> Optional["Leaf"]:
+        """
+        Creates a test leaf with the given limits, replacing any left over with the same name.
+
+        Returns:
+            Optional[Leaf]: The leaf, or None if it could not be created (the test then
+                            runs without one).
+        """
+        leaf = cls(Path(parent) / name)
+        try:
+            if leaf.path.exists():
+                leaf.remove()
+            leaf.path.mkdir()
+            for file, value in limits.items():
+                # memory.swap.max is missing if the kernel does not account swap
+                if (leaf.path / file).exists():
+                    (leaf.path / file).write_text(value)
+        except OSError as e:
+            logger.warning("Failed to create cgroup", extra={"fields": {"cgroup": str(leaf.path), "error": str(e)}})
+            leaf.remove()
+            return None
+        return leaf
+
+    def wrap(self, command: List[str]) -> List[str]:
+        """
+        Returns a command which runs the given command inside the leaf.
+        """
+        return ["sh", "-c", ENTER_SCRIPT, str(self.path), *command]
+
+    def enter(self) -> None:
+        """
+        Moves the calling process into the leaf.
+        """
+        (self.path / "cgroup.procs").write_text("0")
+
+    def cpu_time(self) -> float:
+        """
+        Returns the CPU time used so far by the processes in the leaf, in seconds.
+        """
+        try:
+            return read_keyed(self.path / "cpu.stat")["usage_usec"] / 1e6
+        except (OSError, KeyError):
+            return 0.0
+
+    def usage(self) -> dict:
+        """
+        Reads the resources used by the processes which ran in the leaf.
+
+        Returns:
+            dict: cpu_time (seconds), max_rss (peak memory in bytes) and oom_killed (whether
+                  the kernel killed a process for exceeding memory.max), for those the
+                  kernel reports.
+        """
+        usage = {}
+        try:
+            usage["cpu_time"] = read_keyed(self.path / "cpu.stat")["usage_usec"] / 1e6
+        except (OSError, KeyError):
+            pass
+        try:
+            # memory.peak requires Linux 5.19
+            usage["max_rss"] = int((self.path / "memory.peak").read_text())
+        except (OSError, ValueError):
+            pass
+        try:
+            usage["oom_killed"] = read_keyed(self.path / "memory.events").get("oom_kill", 0) > 0
+        except OSError:
+            pass
+        return usage
+
+    def kill(self) -> None:
+        """
+        Kills every process in the leaf, including any which left the test's session.
+        """
+        try:
+            if (self.path / "cgroup.kill").exists():
+                # cgroup.kill requires Linux 5.14
+                (self.path / "cgroup.kill").write_text("1")
+                return
+            for pid in (self.path / "cgroup.procs").read_text().split():
+                try:
+                    os.kill(int(pid), signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        except FileNotFoundError:
+            pass
+
+    def remove(self) -> None:
+        """
+        Kills every process in the leaf and removes it.
+        """
+        self.kill()
+        deadline = time.monotonic() + REMOVE_TIMEOUT
+        while not self._try_remove(deadline):
+            time.sleep(REMOVE_POLL_INTERVAL)
+
+    async def remove_async(self) -> None:
+        """
+        Kills every process in the leaf and removes it, without blocking the event loop
+        while the killed processes exit.
+        """
+        self.kill()
+        deadline = time.monotonic() + REMOVE_TIMEOUT
+        while not self._try_remove(deadline):
+            await asyncio.sleep(REMOVE_POLL_INTERVAL)
+
+    def _try_remove(self, deadline: float) -> bool:
+        """
+        Attempts to remove the leaf, returning False if it should be retried as its killed
+        processes have not yet left it.
+        """
+        try:
+            self.path.rmdir()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Killed processes leave the cgroup asynchronously
+            if time.monotonic() <= deadline:
+                return False
+            logger.warning("Failed to remove cgroup", extra={"fields": {"cgroup": str(self.path), "error": str(e)}})
+        return True
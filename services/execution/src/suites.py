@@ -0,0 +1,152 @@
+"""
+Test suites staged by the submission service.
+
+Rather than sending every test case with each submission, the submission service stages a
+problem's test suite in Redis and sends a reference to it:
+
+    {"problem_id": str, "version": str, "digest": str, "num_tests": int}
+
+Suites are fetched once per container into SUITE_CACHE_DIR, named by the SHA-256 digest of
+their contents, and the test runners read test cases from that file rather than receiving
+them as arguments. Each Celery worker process also keeps recently used suites parsed in
+memory. As submissions run as the same user, a cached file is only used after its contents
+have been checked against the digest, and again whenever it has changed since.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from json import loads
+from pathlib import Path
+from typing import Optional, Tuple
+from uuid import uuid4
+
+import redis
+
+from src.config import SUITE_REDIS_URL, SUITE_CACHE_DIR, SUITE_MEMORY_CACHE_SIZE
+
+logger = logging.getLogger("execution")
+
+
+class SuiteUnavailable(Exception):
+    """Raised when a referenced test suite is not staged, or does not match its digest."""
+
+
+@dataclass
+class Suite:
+    inputs: list
+    outputs: list
+    hidden: Optional[list]
+    path: Path
+    # (inode, size, ctime) of the file when its contents were checked
+    state: Tuple[int, int, int]
+
+
+# Parsed suites for this worker process, by digest
+_suites: "OrderedDict[str, Suite]" = OrderedDict()
+
+# Redis client for this worker process, created on first use
+_client = None
+_pid = None
+
+
+def _get_client() -> redis.Redis:
+    global _client, _pid
+    if _client is None or _pid != os.getpid():
+        _client = redis.Redis.from_url(SUITE_REDIS_URL)
+        _pid = os.getpid()
+    return _client
+
+
+def _file_state(stat: os.stat_result) -> Tuple[int, int, int]:
+    # ctime changes whenever a file is modified and, unlike mtime, cannot be set back
+    return stat.st_ino, stat.st_size, stat.st_ctime_ns
+
+
+def _read_verified(path: Path, digest: str) -> Optional[Tuple[bytes, Tuple[int, int, int]]]:
+    """
+    Returns the contents of a cached suite and the state of the file they were read from,
+    or None if it is missing or its contents don't match the digest.
+    """
+    try:
+        with open(path, "rb") as f:
+            state = _file_state(os.fstat(f.fileno()))
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if hashlib.sha256(data).hexdigest() != digest:
+        return None
+    return data, state
+
+
+def _fetch(reference: dict) -> bytes:
+    """
+    Fetches a staged suite from Redis and writes it to the cache directory.
+
+    Raises:
+        SuiteUnavailable: If the suite is not staged or does not match its digest.
+    """
+    key = f"suite:{reference['problem_id']}:{reference['version']}"
+    try:
+        data = _get_client().get(key)
+    except redis.RedisError as e:
+        raise SuiteUnavailable(f"Failed to fetch test suite {key}: {e}") from e
+    if data is None:
+        raise SuiteUnavailable(f"Test suite {key} is not staged")
+    if hashlib.sha256(data).hexdigest() != reference["digest"]:
+        raise SuiteUnavailable(f"Test suite {key} does not match its digest")
+
+    # Written to a unique file and moved into place, as several processes may fetch it at once
+    os.makedirs(SUITE_CACHE_DIR, exist_ok=True)
+    temp_path = SUITE_CACHE_DIR / f".{uuid4()}"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.chmod(temp_path, 0o444)
+    os.replace(temp_path, SUITE_CACHE_DIR / f"{reference['digest']}.json")
+    logger.info("Cached test suite", extra={"fields": {
+        "problem_id": reference["problem_id"], "version": reference["version"], "bytes": len(data)
+    }})
+    return data
+
+
+def load_suite(reference: dict) -> Suite:
+    """
+    Returns the test suite a submission references, from memory if its cached file is
+    unchanged, otherwise from the cached file or Redis.
+
+    Raises:
+        SuiteUnavailable: If the suite is not staged or does not match its digest.
+    """
+    digest = reference["digest"]
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        raise SuiteUnavailable(f"Invalid test suite digest {digest!r}")
+    path = SUITE_CACHE_DIR / f"{digest}.json"
+
+    suite = _suites.get(digest)
+    if suite is not None:
+        try:
+            unchanged = _file_state(os.stat(path)) == suite.state
+        except FileNotFoundError:
+            unchanged = False
+        if unchanged:
+            _suites.move_to_end(digest)
+            return suite
+
+    cached = _read_verified(path, digest)
+    if cached is None:
+        _fetch(reference)
+        cached = _read_verified(path, digest)
+        if cached is None:
+            raise SuiteUnavailable(f"Test suite {digest} changed while being cached")
+    data, state = cached
+
+    parsed = loads(data)
+    suite = Suite(parsed["inputs"], parsed["outputs"], parsed.get("hidden"), path, state)
+    _suites[digest] = suite
+    _suites.move_to_end(digest)
+    while len(_suites) > SUITE_MEMORY_CACHE_SIZE:
+        _suites.popitem(last=False)
+    return suite
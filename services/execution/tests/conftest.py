@@ -0,0 +1,21 @@
+"""
+Shared setup for the execution service's unit tests, run from the service root with
+`python -m pytest tests`.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# src.config requires the worker's queue settings at import time
+os.environ.setdefault("TARGET_QUEUE", "pythonq")
+os.environ.setdefault("OUTPUT_QUEUE", "outputq")
+os.environ.setdefault("CELERY_BROKER_URL", "redis://localhost:6379")
+os.environ.setdefault("LANGUAGE", "python")
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="execution-metrics-"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# test_client.py sends submissions to running workers rather than testing in process
+collect_ignore = ["test_client.py"]
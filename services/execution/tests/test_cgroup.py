@@ -0,0 +1,131 @@
+"""
+Tests for the cgroup leaves tests run in, and which executors run tests in them. The leaf
+tests need a writable cgroup v2 hierarchy and are skipped without one.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+from json import loads
+from pathlib import Path
+
+import pytest
+
+from src.executor import abstract_executor
+from src.executor.java import JavaExecutor
+from src.executor.python import PythonExecutor
+from src.sandbox import cgroup
+from src.sandbox.resources import Leaf
+
+
+def cgroup2_mount():
+    with open("/proc/self/mountinfo") as f:
+        for line in f:
+            fields = line.split()
+            if fields[fields.index("-") + 1] == "cgroup2":
+                return Path(fields[4])
+    return None
+
+
+def exited(pid: str) -> bool:
+    try:
+        # The state follows the command name - Z once killed, until the process is reaped
+        return Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[0] in "ZX"
+    except FileNotFoundError:
+        return True
+
+
+@pytest.fixture
+def parent():
+    mount = cgroup2_mount()
+    if mount is None:
+        pytest.skip("requires a cgroup v2 hierarchy")
+    path = mount / f"execution-tests-{os.getpid()}"
+    try:
+        path.mkdir()
+    except OSError:
+        pytest.skip("requires a writable cgroup v2 hierarchy")
+    yield path
+    for leaf in path.iterdir():
+        if leaf.is_dir():
+            Leaf(leaf).remove()
+    path.rmdir()
+
+
+def test_runs_processes_in_the_leaf(parent):
+    leaf = Leaf.create(parent, "test-0", {})
+
+    process = subprocess.run(
+        leaf.wrap([sys.executable, "-c", "print(open('/proc/self/cgroup').read())"]),
+        capture_output=True, text=True, timeout=10
+    )
+
+    assert process.stdout.strip().endswith(f"/{parent.name}/test-0")
+    assert leaf.usage()["cpu_time"] > 0
+
+
+def test_remove_kills_what_the_test_left_running(parent):
+    leaf = Leaf.create(parent, "test-0", {})
+    subprocess.run(leaf.wrap(["sh", "-c", "sleep 60 > /dev/null 2>&1 &"]), timeout=10)
+    lingering = (leaf.path / "cgroup.procs").read_text().split()
+    assert lingering
+
+    asyncio.run(leaf.remove_async())
+
+    assert not leaf.path.exists()
+    assert all(exited(pid) for pid in lingering)
+
+
+def test_create_replaces_leftover_leaves(parent):
+    (parent / "test-0").mkdir()
+
+    leaf = Leaf.create(parent, "test-0", {})
+
+    assert leaf is not None and leaf.path.is_dir()
+
+
+@pytest.fixture
+def tests_in_cgroups(monkeypatch, tmp_path):
+    monkeypatch.setattr(cgroup, "tests_cgroup", lambda: tmp_path)
+    monkeypatch.setattr(abstract_executor, "BATCH_EXECUTION", True)
+    monkeypatch.setattr(abstract_executor, "POOL_ENABLED", True)
+
+
+def test_batches_which_give_each_test_a_leaf_are_kept(tests_in_cgroups):
+    assert PythonExecutor._batches_enabled()
+
+
+def test_batches_which_share_one_process_are_not_used(tests_in_cgroups):
+    # Java runs batched tests as threads of one JVM, so each test runs in its own instead
+    assert not JavaExecutor._batches_enabled()
+    assert JavaExecutor.get_worker_pool() is None
+
+
+def test_batches_are_used_without_cgroups(monkeypatch):
+    monkeypatch.setattr(cgroup, "tests_cgroup", lambda: None)
+    monkeypatch.setattr(abstract_executor, "BATCH_EXECUTION", True)
+
+    assert JavaExecutor._batches_enabled()
+    assert PythonExecutor._batches_enabled()
+
+
+def test_harness_limits_the_import_in_a_leaf(parent, tmp_path):
+    (tmp_path / "submission.py").write_text(
+        "import subprocess\nsubprocess.Popen(['sleep', '60'])\n"
+        "while True:\n    pass\ndef solve(x):\n    return x\n"
+    )
+    (tmp_path / "tests.json").write_text('{"inputs": ["[1]"], "outputs": ["1"]}')
+    harness = Path(__file__).resolve().parent.parent / "src" / "executor" / "harness" / "python_harness.py"
+    cgroups = f'{{"parent": "{parent}", "prefix": "test-", "limits": {{}}}}'
+
+    process = subprocess.run(
+        [sys.executable, str(harness), str(tmp_path), "solve", "--timeout", "0.5", "--wall-timeout", "5", "--cgroup", cgroups],
+        capture_output=True, text=True, timeout=30
+    )
+
+    result = loads(process.stdout)
+    assert result["returncode"] == 124
+    assert result["cpu_time"] >= 0.5
+    # The import's leaf is removed, with what the submission started
+    assert not any(path.is_dir() for path in parent.iterdir())
@@ -52,6 +52,12 @@ def setup_result_listener():
         # Add new result in csv format
         with open(OUTPUT_FILE, 'a') as f:
             f.write(str(results['submission_id']) + ',' + str(results['passed']) + '\n')
+
+    # Define a task to receive batches of results
+    @app.task(name="result_batch", queue=output_queue)
+    def receive_result_batch(batch):
+        for results in batch['results']:
+            receive_results(results)
             
     return app, receive_results
 
@@ -0,0 +1,215 @@
+"""
+Tests for running submissions through the executor, with a process per test, the batch
+harness and the worker pool.
+"""
+
+import sys
+
+import pytest
+
+from src.executor import abstract_executor
+from src.executor.python import PythonExecutor
+
+MODES = ["process", "batch", "pool"]
+
+
+@pytest.fixture(params=MODES)
+def mode(request, monkeypatch):
+    monkeypatch.setattr(abstract_executor, "BATCH_EXECUTION", request.param != "process")
+    monkeypatch.setattr(abstract_executor, "POOL_ENABLED", request.param == "pool")
+    return request.param
+
+
+def run_in_order(code: str, inputs: list, outputs: list, timeout: float = None, **kwargs) -> list:
+    results = []
+    executor = PythonExecutor("solve", inputs, outputs, code, "test", results.append, **kwargs)
+    if timeout is not None:
+        executor.timeout, executor.wall_timeout = timeout, timeout * 3
+    with executor:
+        executor.run()
+    return results
+
+
+def run(code: str, inputs: list, outputs: list, timeout: float = None, **kwargs) -> dict:
+    return {result["test_number"]: result for result in run_in_order(code, inputs, outputs, timeout, **kwargs)}
+
+
+def test_reports_every_test(mode):
+    results = run("def solve(x):\n    print('got', x)\n    return x * 2\n", ["[1]", "[2]"], ["2", "5"])
+
+    assert results[0]["passed"]
+    assert results[0]["stdout"].strip() == "got 1"
+    assert not results[1]["passed"] and results[1]["output"] == "4"
+    for result in results.values():
+        assert result["wall_time"] is not None
+
+
+def test_times_out_busy_tests(mode):
+    results = run("def solve(x):\n    while True:\n        pass\n", ["[1]"], ["1"], timeout=0.3)
+
+    assert results[0]["error"] == "timeout"
+    assert results[0]["wall_time"] < 5
+
+
+def test_times_out_sleeping_tests(mode):
+    # Sleeping uses no CPU time, so only the wall clock ceiling stops it
+    results = run("import time\ndef solve(x):\n    time.sleep(60)\n", ["[1]"], ["1"], timeout=0.3)
+
+    assert results[0]["error"] == "timeout"
+    assert results[0]["wall_time"] < 5
+
+
+def test_truncates_long_output(mode):
+    code = "def solve(x):\n    print('x' * 10 ** 6)\n    return x\n"
+    results = run(code, ["[1]"], ["1"])
+
+    assert results[0]["passed"]
+    assert len(results[0]["stdout"]) <= abstract_executor.MAX_OUTPUT_BYTES + 64
+    assert "output truncated" in results[0]["stdout"]
+
+
+def test_import_error_fails_every_test(mode):
+    results = run("import missing_module\n", ["[1]", "[2]"], ["1", "2"])
+
+    assert sorted(results) == [0, 1]
+    assert all(not result["passed"] and "missing_module" in result["error"] for result in results.values())
+
+
+def test_runs_visible_and_small_tests_first(monkeypatch):
+    monkeypatch.setattr(abstract_executor, "BATCH_EXECUTION", True)
+    monkeypatch.setattr(abstract_executor, "POOL_ENABLED", False)
+    monkeypatch.setattr("src.executor.python.BATCH_WORKERS", 1)
+    inputs = ["[[1, 2, 3]]", "[[1]]", "[[1, 2]]", "[[]]"]
+
+    results = run_in_order(
+        "def solve(x):\n    return len(x)\n", inputs, ["3", "1", "2", "0"],
+        hidden=[False, False, True, True]
+    )
+
+    # Each result is published as its test finishes, one at a time
+    assert [result["test_number"] for result in results] == [1, 0, 3, 2]
+    assert all(result["passed"] for result in results)
+
+
+def test_fail_fast_skips_tests_after_a_failure(mode):
+    code = "import time\ndef solve(x):\n    if x == 1:\n        return 0\n    time.sleep(30)\n    return x\n"
+
+    results = run(code, ["[1]", "[2]", "[3]"], ["1", "2", "3"], timeout=10, fail_fast=True)
+
+    # The failure stops the tests still running, and each is reported once
+    assert sorted(results) == [0, 1, 2]
+    assert not results[0]["passed"] and not results[0].get("skipped")
+    assert all(results[i]["skipped"] and results[i]["error"] == "skipped" for i in (1, 2))
+
+
+def test_waiting_does_not_count_towards_the_time_limit(mode):
+    # Only CPU time counts towards the limit, up to the wall clock ceiling
+    results = run("import time\ndef solve(x):\n    time.sleep(0.6)\n    return x\n", ["[1]"], ["1"], timeout=0.3)
+
+    assert results[0]["passed"]
+    assert results[0]["wall_time"] > 0.3
+
+
+@pytest.fixture
+def retry_tle(monkeypatch):
+    monkeypatch.setattr(abstract_executor, "RETRY_TLE", True)
+    monkeypatch.setattr(abstract_executor, "RETRY_TLE_IDLE_WAIT", 0.1)
+
+
+def test_retries_tests_which_time_out(mode, retry_tle, tmp_path):
+    # Times out the first time it is run, as if the container had been saturated
+    marker = tmp_path / "ran"
+    code = f"import os\ndef solve(x):\n    if not os.path.exists({str(marker)!r}):\n        open({str(marker)!r}, 'w').close()\n        while True:\n            pass\n    return x\n"
+
+    results = run_in_order(code, ["[1]"], ["1"], timeout=0.3)
+
+    assert len(results) == 1
+    assert results[0]["passed"] and results[0]["retried"]
+
+
+def test_reports_tests_which_time_out_again(mode, retry_tle):
+    results = run_in_order("def solve(x):\n    while True:\n        pass\n", ["[1]", "[2]"], ["1", "2"], timeout=0.3)
+
+    assert sorted(result["test_number"] for result in results) == [0, 1]
+    assert all(result["error"] == "timeout" and result["retried"] for result in results)
+
+
+@pytest.fixture(params=["batch", "pool"])
+def batched(request, monkeypatch):
+    monkeypatch.setattr(abstract_executor, "BATCH_EXECUTION", True)
+    monkeypatch.setattr(abstract_executor, "POOL_ENABLED", request.param == "pool")
+    return request.param
+
+
+def test_import_time_counts_towards_the_time_limit(batched):
+    # The submission is imported once for every test, so its import must be limited too
+    code = "import time\nend = time.process_time() + 4\nwhile time.process_time() < end:\n    pass\ndef solve(x):\n    return x\n"
+
+    results = run(code, ["[1]", "[2]"], ["1", "2"], timeout=1)
+
+    assert sorted(results) == [0, 1]
+    for result in results.values():
+        assert result["error"] == "timeout"
+        assert 1 <= result["cpu_time"] < 4
+
+
+def test_import_time_is_included_in_each_test(batched):
+    code = "import time\nend = time.process_time() + 0.3\nwhile time.process_time() < end:\n    pass\ndef solve(x):\n    return x\n"
+
+    results = run(code, ["[1]"], ["1"], timeout=2)
+
+    assert results[0]["passed"]
+    assert results[0]["cpu_time"] >= 0.3
+
+
+def test_import_memory_counts_towards_the_memory_limit(batched):
+    results = run("x = bytearray(4 * 1024 ** 3)\ndef solve(x):\n    return x\n", ["[1]", "[2]"], ["1", "2"])
+
+    assert all(result["error"] == "memory_limit_exceeded" for result in results.values())
+
+
+def test_pooled_workers_survive_imports_over_the_limits(monkeypatch):
+    monkeypatch.setattr(abstract_executor, "BATCH_EXECUTION", True)
+    monkeypatch.setattr(abstract_executor, "POOL_ENABLED", True)
+    pool = PythonExecutor.get_worker_pool()
+    destroyed = pool.stats()["destroyed"]
+    spin = "while True:\n    pass\ndef solve(x):\n    return x\n"
+
+    timed_out = run(spin, ["[1]"], ["1"], timeout=0.5)
+    passed = run("def solve(x):\n    return x\n", ["[1]"], ["1"])
+
+    # The zygote only forks the import, so the worker finishes the job and is reused
+    assert timed_out[0]["error"] == "timeout" and timed_out[0]["cpu_time"] < 2
+    assert passed[0]["passed"]
+    assert pool.stats()["destroyed"] == destroyed
+
+
+@pytest.fixture
+def failing_harness(monkeypatch):
+    monkeypatch.setattr(abstract_executor, "BATCH_EXECUTION", True)
+    monkeypatch.setattr(abstract_executor, "POOL_ENABLED", False)
+
+    def use(script: str):
+        monkeypatch.setattr(PythonExecutor, "_get_batch_command", lambda self, tests: [sys.executable, "-c", script])
+    return use
+
+
+def test_harness_exiting_without_results_is_never_a_pass(failing_harness):
+    failing_harness("import sys\nsys.stderr.write('harness broke')\n")
+
+    results = run("def solve(x):\n    return x\n", ["[1]", "[2]"], ["1", "2"])
+
+    assert sorted(results) == [0, 1]
+    for result in results.values():
+        assert not result["passed"] and result["runner_failed"]
+        assert "exited with code 0" in result["error"] and "harness broke" in result["error"]
+
+
+def test_harness_killed_for_hanging_is_reported(failing_harness, monkeypatch):
+    failing_harness("import time\ntime.sleep(60)\n")
+    monkeypatch.setattr(PythonExecutor, "_get_batch_line_timeout", lambda self: 0.2)
+
+    results = run("def solve(x):\n    return x\n", ["[1]"], ["1"])
+
+    assert not results[0]["passed"] and results[0]["runner_failed"]
+    assert "killed after sending no results for 0.2 seconds" in results[0]["error"]
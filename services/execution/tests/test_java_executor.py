@@ -0,0 +1,98 @@
+"""
+Tests for the Java batch runner and warm JVM worker. These need a JDK and the javax.json
+libraries, as installed in the Java worker image, and are skipped without them.
+"""
+
+import shutil
+import subprocess
+from json import dumps, loads
+from pathlib import Path
+
+import pytest
+
+from src.config import MAX_OUTPUT_BYTES
+from src.executor.java import JavaExecutor, CLASSPATH
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("javac") is None or not all(Path(jar).exists() for jar in CLASSPATH.split(":")),
+    reason="requires a JDK and javax.json"
+)
+
+NOISY = """
+public class Solution {
+    public int solve(int a, int b) {
+        for (int i = 0; i < 200000; i++) {
+            System.out.println("line " + i);
+        }
+        return a + b;
+    }
+}
+"""
+
+LINGERING = """
+public class Solution {
+    public int solve(int a, int b) {
+        Thread thread = new Thread(() -> {
+            while (true) {
+                try {
+                    Thread.sleep(1000);
+                } catch (InterruptedException e) {
+                }
+            }
+        });
+        thread.start();
+        return a + b;
+    }
+}
+"""
+
+
+@pytest.fixture
+def build():
+    executors = []
+
+    def build(code: str, tests: int = 1) -> JavaExecutor:
+        executor = JavaExecutor(
+            "solve", [dumps([i, 1]) for i in range(tests)], [dumps(i + 1) for i in range(tests)],
+            code, "test", lambda result: None
+        )
+        executor.__enter__()
+        executors.append(executor)
+        executor._build_test_files()
+        assert executor.build_error is None
+        return executor
+
+    yield build
+    for executor in executors:
+        executor.__exit__(None, None, None)
+
+
+def test_batch_bounds_captured_output(build):
+    executor = build(NOISY)
+
+    process = subprocess.run(executor._get_batch_command([0]), capture_output=True, timeout=60)
+    result = loads(process.stdout.splitlines()[0])
+
+    assert result["returncode"] == 0
+    assert len(result["stdout"]) <= MAX_OUTPUT_BYTES + 64
+    assert result["stdout"].startswith("line 0\n")
+    assert result["stdout"].rstrip().endswith("line 199999")
+    assert "output truncated" in result["stdout"]
+
+
+def test_worker_exits_after_a_single_job(build):
+    executor = build(LINGERING, tests=2)
+
+    worker = subprocess.Popen(
+        JavaExecutor._get_worker_command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        output, _ = worker.communicate(dumps(executor._get_worker_job([0, 1])) + "\n", timeout=60)
+    finally:
+        worker.kill()
+
+    lines = [loads(line) for line in output.splitlines()]
+    assert [line["test_number"] for line in lines if "test_number" in line] == [0, 1]
+    assert lines[-1] == {"done": True}
+    # The thread the submission left running did not keep the JVM alive
+    assert worker.returncode == 0
@@ -0,0 +1,120 @@
+"""
+Tests for the pool of warm runtime workers.
+"""
+
+import asyncio
+import sys
+from json import loads
+
+import pytest
+
+from src.sandbox.pool import WorkerPool
+
+# Echoes each job back followed by the done marker, as a warm worker does
+ECHO_WORKER = [sys.executable, "-c", """
+import sys
+for line in sys.stdin:
+    print(line.strip(), flush=True)
+    print('{"done": true}', flush=True)
+"""]
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(size=1, max_uses=10, idle_timeout=300):
+        pool = WorkerPool(ECHO_WORKER, size, max_uses, idle_timeout)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+def run_job(worker, job: dict) -> list:
+    worker.submit(job)
+    lines = []
+    while True:
+        line = loads(worker.process.stdout.readline())
+        if line.get("done"):
+            return lines
+        lines.append(line)
+
+
+def test_reuses_warm_workers(make_pool):
+    pool = make_pool()
+    pool.prewarm()
+
+    worker = pool.checkout()
+    assert run_job(worker, {"job": 1}) == [{"job": 1}]
+    pool.checkin(worker, True)
+    assert pool.checkout() is worker
+    assert pool.stats()["hits"] == 2
+
+
+def test_replaces_single_use_workers(make_pool):
+    pool = make_pool(max_uses=1)
+    pool.prewarm()
+
+    worker = pool.checkout()
+    run_job(worker, {"job": 1})
+    pool.checkin(worker, True)
+
+    assert not worker.alive()
+    replacement = pool.checkout()
+    assert replacement is not worker and replacement.alive()
+    assert pool.stats()["recycled"] == 1
+
+
+def test_destroys_unhealthy_workers(make_pool):
+    pool = make_pool()
+    worker = pool.checkout()
+    pool.checkin(worker, False)
+
+    assert not worker.alive()
+    assert pool.stats()["destroyed"] == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_skips_workers_which_exited(make_pool):
+    pool = make_pool()
+    pool.prewarm()
+    dead = pool._idle[0]
+    dead.process.kill()
+    dead.process.wait()
+
+    worker = pool.checkout()
+    assert worker is not dead and worker.alive()
+    assert pool.stats()["misses"] == 1
+
+
+def test_reaps_idle_workers(make_pool):
+    pool = make_pool(idle_timeout=0)
+    pool.prewarm()
+    worker = pool._idle[0]
+
+    pool.reap()
+    assert not worker.alive()
+    assert pool.stats()["reaped"] == 1
+
+
+def test_reads_output_from_successive_event_loops(make_pool):
+    pool = make_pool()
+    worker = pool.checkout()
+
+    async def run_job_async(job: dict) -> list:
+        async with worker.output(1024) as stdout:
+            worker.submit(job)
+            lines = []
+            while True:
+                line = loads(await asyncio.wait_for(stdout.readline(), 5))
+                if line.get("done"):
+                    return lines
+                lines.append(line)
+
+    # Each submission runs its own event loop, which the worker outlives
+    assert asyncio.run(run_job_async({"job": 1})) == [{"job": 1}]
+    assert asyncio.run(run_job_async({"job": 2})) == [{"job": 2}]
+    assert worker.alive()
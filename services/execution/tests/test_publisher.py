@@ -0,0 +1,68 @@
+"""
+Tests for publishing results to the output queue in micro-batches.
+"""
+
+import threading
+import time
+
+from src.publisher import ResultPublisher
+
+
+def result(test_number: int) -> dict:
+    return {"submission_id": "test", "test_number": test_number}
+
+
+def collect(batch_size: int, interval: float):
+    batches = []
+    sent = threading.Event()
+
+    def send_batch(batch: dict):
+        batches.append(batch)
+        sent.set()
+
+    return ResultPublisher("test", send_batch, batch_size, interval), batches, sent
+
+
+def test_sends_full_batches():
+    publisher, batches, _ = collect(batch_size=2, interval=0)
+    for i in range(5):
+        publisher.publish(result(i))
+
+    assert [[r["test_number"] for r in batch["results"]] for batch in batches] == [[0, 1], [2, 3]]
+    assert all(batch == {"submission_id": "test", "results": batch["results"]} for batch in batches)
+
+
+def test_sends_partial_batch_after_interval():
+    publisher, batches, sent = collect(batch_size=10, interval=0.05)
+    publisher.publish(result(0))
+    publisher.publish(result(1))
+    assert batches == []
+
+    assert sent.wait(2)
+    assert [r["test_number"] for r in batches[0]["results"]] == [0, 1]
+
+
+def test_close_sends_remaining_results():
+    publisher, batches, _ = collect(batch_size=10, interval=60)
+    publisher.publish(result(0))
+    publisher.close()
+
+    assert [[r["test_number"] for r in batch["results"]] for batch in batches] == [[0]]
+
+
+def test_close_without_results_sends_nothing():
+    publisher, batches, _ = collect(batch_size=2, interval=60)
+    publisher.publish(result(0))
+    publisher.publish(result(1))
+    publisher.close()
+
+    assert len(batches) == 1
+
+
+def test_full_batch_cancels_interval():
+    publisher, batches, _ = collect(batch_size=2, interval=0.05)
+    publisher.publish(result(0))
+    publisher.publish(result(1))
+    time.sleep(0.2)
+
+    assert len(batches) == 1
@@ -0,0 +1,81 @@
+"""
+Tests for the batched Python harness, run as the executor runs it.
+"""
+
+import subprocess
+import sys
+from json import dumps, loads
+from pathlib import Path
+
+import pytest
+
+HARNESS = Path(__file__).resolve().parent.parent / "src" / "executor" / "harness" / "python_harness.py"
+
+ADD = "def solve(a, b):\n    return a + b\n"
+
+
+def run_harness(test_dir: Path, code: str, cases: list, *args: str) -> dict:
+    (test_dir / "submission.py").write_text(code)
+    (test_dir / "tests.json").write_text(dumps({
+        "inputs": [dumps(inputs) for inputs, _ in cases],
+        "outputs": [dumps(output) for _, output in cases],
+    }))
+    process = subprocess.run(
+        [sys.executable, str(HARNESS), str(test_dir), "solve", *args],
+        capture_output=True, text=True, timeout=60, cwd=test_dir
+    )
+    results = [loads(line) for line in process.stdout.splitlines()]
+    return {result["test_number"]: result for result in results}
+
+
+def test_reports_each_test(tmp_path):
+    results = run_harness(tmp_path, ADD, [([1, 2], 3), ([2, 2], 5)], "--workers", "2")
+
+    assert results[0]["returncode"] == 0
+    assert results[1]["returncode"] == 232
+    assert results[1]["stderr"].strip().splitlines()[-1] == "4"
+    for result in results.values():
+        assert result["wall_time"] >= 0
+        assert result["cpu_time"] >= 0
+        assert result["max_rss"] > 0
+
+
+def test_runs_requested_tests_only(tmp_path):
+    results = run_harness(tmp_path, ADD, [([1, 2], 3), ([2, 2], 4), ([3, 2], 5)], "--tests", "2,0")
+
+    assert sorted(results) == [0, 2]
+
+
+def test_import_error_fails_every_test(tmp_path):
+    results = run_harness(tmp_path, "raise ValueError('broken')\n", [([1, 2], 3), ([2, 2], 4)])
+
+    assert sorted(results) == [0, 1]
+    assert all(result["returncode"] == 1 and "broken" in result["stderr"] for result in results.values())
+
+
+def test_import_output_does_not_corrupt_results(tmp_path):
+    results = run_harness(tmp_path, 'print("{\\"test_number\\": 5}")\n' + ADD, [([1, 2], 3)])
+
+    assert list(results) == [0]
+    assert results[0]["returncode"] == 0
+
+
+@pytest.mark.parametrize("code", [
+    "def solve(a, b):\n    while True:\n        pass\n",
+    "import time\ndef solve(a, b):\n    time.sleep(60)\n",
+])
+def test_time_limits(tmp_path, code):
+    # Busy loops exceed the CPU time limit, sleeps the wall clock ceiling
+    results = run_harness(tmp_path, code, [([1, 2], 3)], "--timeout", "0.3", "--wall-timeout", "1")
+
+    assert results[0]["returncode"] == 124
+    assert results[0]["wall_time"] < 5
+
+
+def test_truncates_long_output(tmp_path):
+    code = "def solve(a, b):\n    print('x' * 100000)\n    return a + b\n"
+    results = run_harness(tmp_path, code, [([1, 2], 3)], "--max-output", "1000")
+
+    assert results[0]["returncode"] == 0
+    assert len(results[0]["stdout"]) < 1100
+    assert "output truncated" in results[0]["stdout"]
@@ -0,0 +1,119 @@
+"""
+Tests for the container wide scheduler of test processes.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from src.executor import scheduler as scheduler_module
+from src.executor.scheduler import Scheduler
+
+
+def in_child(target, *args) -> multiprocessing.Process:
+    process = multiprocessing.get_context("fork").Process(target=target, args=args)
+    process.start()
+    return process
+
+
+def hold_slots(scheduler: Scheduler, count: int, seconds: float, started, release: bool):
+    async def hold():
+        await scheduler.acquire(count)
+        started.set()
+        await asyncio.sleep(seconds)
+        if release:
+            scheduler.release(count)
+    asyncio.run(hold())
+    if not release:
+        # Exit without releasing, as a killed worker would
+        os._exit(0)
+
+
+def test_limits_running_tests():
+    scheduler = Scheduler(2)
+
+    async def run():
+        await scheduler.acquire(2)
+        assert scheduler.stats()["running"] == 2
+        waiting = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        scheduler.release()
+        await asyncio.wait_for(waiting, 1)
+        assert scheduler.stats()["running"] == 2
+
+    asyncio.run(run())
+
+
+def test_wakes_when_another_process_releases():
+    scheduler = Scheduler(1)
+    started = multiprocessing.get_context("fork").Event()
+    child = in_child(hold_slots, scheduler, 1, 0.2, started, True)
+    assert started.wait(5)
+
+    async def run():
+        waited = time.monotonic()
+        await scheduler.acquire()
+        return time.monotonic() - waited
+
+    # Well before a waiter would time out and check for exited processes
+    assert asyncio.run(run()) < scheduler_module.WAIT_TIMEOUT
+    child.join()
+
+
+def test_reclaims_slots_of_exited_processes():
+    scheduler = Scheduler(1)
+    started = multiprocessing.get_context("fork").Event()
+    child = in_child(hold_slots, scheduler, 1, 0, started, False)
+    assert started.wait(5)
+    child.join()
+
+    asyncio.run(asyncio.wait_for(scheduler.acquire(), 5))
+    assert scheduler.stats()["running"] == 1
+
+
+def test_limits_a_busy_process_to_its_share():
+    scheduler = Scheduler(4)
+    started = multiprocessing.get_context("fork").Event()
+
+    async def submit():
+        async with scheduler.submission():
+            await scheduler.acquire()
+            started.set()
+            await asyncio.sleep(1)
+            scheduler.release()
+
+    child = in_child(lambda: asyncio.run(submit()))
+    assert started.wait(5)
+
+    async def run():
+        async with scheduler.submission():
+            await scheduler.acquire(2)
+            # Two submissions are active, so this process's share is two slots
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(scheduler.acquire(), 0.2)
+
+    asyncio.run(run())
+    child.join()
+
+
+def test_acquire_idle_waits_for_half_the_slots():
+    scheduler = Scheduler(4)
+
+    async def run():
+        await scheduler.acquire(3)
+        waiting = asyncio.create_task(scheduler.acquire_idle(wait=5))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        scheduler.release(2)
+        await asyncio.wait_for(waiting, 1)
+
+        # Gives up waiting for idle slots after the wait
+        started = time.monotonic()
+        await scheduler.acquire_idle(wait=0.1)
+        assert time.monotonic() - started < 1
+
+    asyncio.run(run())
@@ -0,0 +1,84 @@
+"""
+Tests for loading the test suites staged by the submission service, from Redis, the
+container's cache directory and each worker's memory.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+
+import pytest
+
+from src import suites
+from src.suites import SuiteUnavailable, load_suite
+
+SUITE = json.dumps({"inputs": [[1, 2]], "outputs": ["3"], "hidden": [False]}).encode()
+
+
+class Staged:
+    """Stand-in for the Redis the submission service stages suites in"""
+
+    def __init__(self, suites: dict):
+        self.suites = suites
+        self.fetches = 0
+
+    def get(self, key):
+        self.fetches += 1
+        return self.suites.get(key)
+
+
+def reference(data: bytes = SUITE) -> dict:
+    return {"problem_id": "p1", "version": "v1", "digest": hashlib.sha256(data).hexdigest(), "num_tests": 1}
+
+
+@pytest.fixture
+def staged(monkeypatch, tmp_path):
+    redis = Staged({"suite:p1:v1": SUITE})
+    monkeypatch.setattr(suites, "_get_client", lambda: redis)
+    monkeypatch.setattr(suites, "SUITE_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(suites, "_suites", OrderedDict())
+    return redis
+
+
+def test_fetches_a_suite_once(staged):
+    suite = load_suite(reference())
+
+    assert suite.inputs == [[1, 2]] and suite.outputs == ["3"] and suite.hidden == [False]
+    assert suite.path.read_bytes() == SUITE
+    assert load_suite(reference()) is suite
+    assert staged.fetches == 1
+
+
+def test_reads_suites_cached_by_other_workers(staged):
+    load_suite(reference())
+    # A new worker process has no suites in memory
+    suites._suites.clear()
+
+    assert load_suite(reference()).inputs == [[1, 2]]
+    assert staged.fetches == 1
+
+
+def test_refetches_a_suite_whose_file_changed(staged):
+    path = load_suite(reference()).path
+    path.chmod(0o644)
+    path.write_bytes(SUITE.replace(b"3", b"4"))
+
+    assert load_suite(reference()).outputs == ["3"]
+    assert staged.fetches == 2
+
+
+def test_rejects_suites_which_do_not_match_their_digest(staged):
+    with pytest.raises(SuiteUnavailable):
+        load_suite(reference(b"other suite"))
+
+
+def test_rejects_suites_which_are_not_staged(staged):
+    staged.suites.clear()
+
+    with pytest.raises(SuiteUnavailable):
+        load_suite(reference())
+
+
+def test_rejects_invalid_digests(staged):
+    with pytest.raises(SuiteUnavailable):
+        load_suite({**reference(), "digest": "../../etc/passwd"})
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger("gateway")
+
+# Redis keys for revoked token IDs - a sorted set of jti by expiry (for resyncing) and a
+# pub/sub channel for revocations as they happen
+REVOKED_SET = "revoked_jtis"
+REVOCATION_CHANNEL = "revocations"
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified token payloads, keyed by a hash of the token and
+    expiring when the token does, so repeat requests skip signature verification.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        payload = self._entries.get(key)
+        if payload is None or payload["exp"] < time.time():
+            if payload is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def put(self, token: str, payload: dict):
+        # Tokens without an expiry are rejected by the caller, so are never cached
+        if self.max_size <= 0 or not isinstance(payload.get("exp"), (int, float)):
+            return
+        self._entries[self._key(token)] = payload
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class RevocationList:
+    """
+    Local replica of revoked token IDs. Revocations are received from Redis pub/sub as
+    they happen, and the full set is resynced from Redis every `sync_interval` seconds.
+    The replica is only trusted while the last successful sync is within `staleness`
+    seconds - otherwise callers should check Redis directly.
+    """
+
+    def __init__(self, redis, staleness: float):
+        self.redis = redis
+        self.staleness = staleness
+        self.sync_interval = max(0.5, staleness / 2)
+        self._revoked: dict = {}
+        self._last_sync = None
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._sync_forever()),
+            asyncio.create_task(self._listen_forever()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def is_revoked(self, jti: str) -> Optional[bool]:
+        """Return whether the token ID is revoked, or None if the replica is too stale to say."""
+        if self._last_sync is None or time.monotonic() - self._last_sync > self.staleness:
+            return None
+        expiry = self._revoked.get(jti)
+        return expiry is not None and expiry >= time.time()
+
+    def add(self, jti: str, expiry: float):
+        self._revoked[jti] = expiry
+
+    async def revoke(self, jti: str, ttl: int):
+        """Revoke a token ID in Redis and notify every gateway instance."""
+        expiry = time.time() + ttl
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(f"revoked:{jti}", "true", ex=ttl)
+            pipe.zadd(REVOKED_SET, {jti: expiry})
+            pipe.publish(REVOCATION_CHANNEL, f"{jti} {expiry}")
+            await pipe.execute()
+        self.add(jti, expiry)
+
+    async def sync(self):
+        now = time.time()
+        await self.redis.zremrangebyscore(REVOKED_SET, "-inf", now)
+        revoked = await self.redis.zrangebyscore(REVOKED_SET, now, "+inf", withscores=True)
+        self._revoked = {jti: expiry for jti, expiry in revoked}
+        self._last_sync = time.monotonic()
+
+    async def _import_existing(self):
+        """Add revocations made with only a revoked:{jti} key to the sorted set, so they are replicated too."""
+        try:
+            now = time.time()
+            async for key in self.redis.scan_iter(match="revoked:*", count=1000):
+                ttl = await self.redis.ttl(key)
+                if ttl > 0:
+                    await self.redis.zadd(REVOKED_SET, {key.split(":", 1)[1]: now + ttl}, nx=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Failed to import revoked tokens", extra={"fields": {"error": str(e)}})
+
+    async def _sync_forever(self):
+        # Imported before the first sync, so the replica is never trusted without them
+        await self._import_existing()
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Failed to sync revoked tokens", extra={"fields": {"error": str(e)}})
+            await asyncio.sleep(self.sync_interval)
+
+    async def _listen_forever(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(REVOCATION_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        jti, expiry = message["data"].split(" ")
+                        self.add(jti, float(expiry))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Revocation subscription failed", extra={"fields": {"error": str(e)}})
+            await asyncio.sleep(1)
@@ -1,17 +1,19 @@
 from dotenv import load_dotenv
 import os, sys
 import base64
+import logging
 from cryptography.hazmat.primitives.asymmetric import ed25519
 
 load_dotenv()
 
-def get_env(key: str) -> str:
+# Logging is configured after the config is loaded, so these errors go to the default stderr handler
+logger = logging.getLogger("gateway")
+
+def get_env(key: str, default: str = None) -> str:
     """Retrieve the environment variable value for the given key."""
-    print(f"Attempting to retrieve environment variable: {key}")
-    value = os.environ.get(key)
-    print(f"The value was: {value}")
+    value = os.environ.get(key, default)
     if value is None:
-        print(f"Error: Environment variable '{key}' is not set.")
+        logger.error("Environment variable %s is not set", key)
         sys.exit(1)
     return value
 
@@ -21,12 +23,22 @@ def getPublicKey() -> str:
         raw_key_bytes = base64.urlsafe_b64decode(publicKey)
     except Exception as e:
         if isinstance(e, base64.binascii.Error):
-            print(f"Error: Failed to Base64 decode JWT_PUBLIC_KEY due to padding or invalid characters: {e}")
+            logger.error("Failed to Base64 decode JWT_PUBLIC_KEY due to padding or invalid characters: %s", e)
         else:
-            print(f"Error: Failed to decode JWT_PUBLIC_KEY: {e}")
+            logger.error("Failed to decode JWT_PUBLIC_KEY: %s", e)
         sys.exit(1) # Exit if decoding fails
     return ed25519.Ed25519PublicKey.from_public_bytes(raw_key_bytes)
 
+def getPoolConfig(name: str) -> dict:
+    """Connection pool settings for an upstream, falling back to the UPSTREAM_* defaults."""
+    def setting(key: str, default: str) -> str:
+        return get_env(f"{name}_{key}", get_env(f"UPSTREAM_{key}", default))
+    return {
+        "max_connections": int(setting("MAX_CONNECTIONS", "100")),
+        "max_keepalive": int(setting("MAX_KEEPALIVE", "20")),
+        "keepalive_expiry": float(setting("KEEPALIVE_EXPIRY", "30")),
+    }
+
 class Config:
     def __init__(self):
         self.JWT_PUBLIC_KEY = getPublicKey()
@@ -36,5 +48,31 @@ class Config:
         self.AUTH_SERVICE_URL = get_env("AUTH_SERVICE_URL")
         self.SUBMISSION_SERVICE_URL = get_env("SUBMISSION_SERVICE_URL")
         self.REDIS_URL = get_env("REDIS_URL")
+        self.LOG_LEVEL = get_env("LOG_LEVEL", "INFO")
+        # Where to export trace spans - a Zipkin collector URL or file:///path (disabled if empty)
+        self.TRACE_EXPORT_URL = get_env("TRACE_EXPORT_URL", "")
+        self.TOKEN_CACHE_SIZE = int(get_env("TOKEN_CACHE_SIZE", "10000"))
+        self.REVOCATION_STALENESS_SECONDS = float(get_env("REVOCATION_STALENESS_SECONDS", "5"))
+        # Per route upstream timeouts (seconds)
+        self.AUTH_TIMEOUT = float(get_env("AUTH_TIMEOUT", "10"))
+        self.PROBLEMS_TIMEOUT = float(get_env("PROBLEMS_TIMEOUT", "10"))
+        self.SUBMISSION_TIMEOUT = float(get_env("SUBMISSION_TIMEOUT", "30"))
+        self.SUBMISSION_HISTORY_TIMEOUT = float(get_env("SUBMISSION_HISTORY_TIMEOUT", "60"))
+        self.AI_TIMEOUT = float(get_env("AI_TIMEOUT", "120"))
+        # Connection pools for each upstream service
+        self.AUTH_POOL = getPoolConfig("AUTH")
+        self.PROBLEMS_POOL = getPoolConfig("PROBLEMS")
+        self.SUBMISSION_POOL = getPoolConfig("SUBMISSION")
+        self.WARMUP_CONNECTIONS = int(get_env("WARMUP_CONNECTIONS", "2"))
+        # Health checks of upstream services for /status
+        self.STATUS_TIMEOUT = float(get_env("STATUS_TIMEOUT", "2"))
+        self.STATUS_CACHE_SECONDS = float(get_env("STATUS_CACHE_SECONDS", "5"))
+        # Response cache for GET routes which return the same response to every user
+        self.RESPONSE_CACHE_SIZE = int(get_env("RESPONSE_CACHE_SIZE", "1000"))
+        self.RESPONSE_CACHE_TTL = float(get_env("RESPONSE_CACHE_TTL", "60"))
+        self.RESPONSE_CACHE_REDIS = get_env("RESPONSE_CACHE_REDIS", "false").lower() == "true"
+        self.RESPONSE_CACHE_ROUTES = [
+            route.strip() for route in get_env("RESPONSE_CACHE_ROUTES", "/problems,/problems/{id}").split(",") if route.strip()
+        ]
 
 config = Config()
\ No newline at end of file
@@ -1,60 +1,169 @@
 import httpx
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from config import config
+from instrumentation import UPSTREAM_LATENCY
+from http_pool import request_stats
+from tracing import TRACE_HEADER, PARENT_SPAN_HEADER, context_headers
+import logging
+import time
 
-async def forward_request(request: Request, target_url: str, client: httpx.AsyncClient):
+logger = logging.getLogger("gateway")
+
+# Headers which only apply to a single connection, so are never forwarded
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'transfer-encoding', 'upgrade',
+}
+
+# Replaced with the gateway's own trace context
+TRACE_HEADERS = {TRACE_HEADER.lower(), PARENT_SPAN_HEADER.lower()}
+
+async def forward_request(request: Request, target_url: str, client: httpx.AsyncClient, timeout: float = 30.0):
     """
-    Function to forward an HTTP request to a target URL
+    Function to forward an HTTP request to a target URL, streaming the request and
+    response bodies rather than buffering them in the gateway
     """
     headers_to_forward = {
         k: v for k, v in request.headers.items()
-        if k.lower() not in ['host', 'connection', 'transfer-encoding', 'content-length', 'user-agent']
+        if k.lower() not in HOP_BY_HOP_HEADERS | TRACE_HEADERS | {'host', 'user-agent'}
     }
     headers_to_forward['user-agent'] = 'OpenJudgeAPIGateway'
+    headers_to_forward.update(_trace_headers(request))
 
-    if 'content-type' in request.headers:
-        headers_to_forward['content-type'] = request.headers['content-type']
-
-    body = await request.body()
+    # Only stream a body if the client sent one, so bodyless requests aren't sent chunked
+    has_body = 'content-length' in request.headers or 'transfer-encoding' in request.headers
+    if not has_body or request.headers.get('content-length') == '0':
+        headers_to_forward.pop('content-length', None)
+        content = None
+    else:
+        content = request.stream()
 
+    # In flight until the response is closed, after its body has been streamed to the client
+    stats = request_stats(client)
+    stats.started()
     try:
-        rp = await client.request(
+        upstream_request = client.build_request(
             method=request.method,
             url=target_url,
             headers=headers_to_forward,
             params=request.query_params,
-            content=body,
-            timeout=30.0
+            content=content,
+            timeout=timeout
         )
-        print(f"Forwarded request to {target_url}. Returned {rp.status_code}")
+        start = time.perf_counter()
+        rp = await client.send(upstream_request, stream=True)
+        _log_upstream(upstream_request, rp.status_code, start)
+    except httpx.TimeoutException:
+        stats.finished()
+        raise HTTPException(status_code=504, detail=f"Request timed out.")
+    except httpx.ConnectError:
+        stats.finished()
+        raise HTTPException(status_code=503, detail=f"Could not connect to {target_url}.")
+    except Exception as e:
+        stats.finished()
+        raise HTTPException(status_code=502, detail=f"An unexpected error occurred while contacting service at {target_url}.")
+
+    # The body is passed through undecoded, so content-encoding and content-length still apply
+    response_headers = {
+        k: v for k, v in rp.headers.items()
+        if k.lower() not in HOP_BY_HOP_HEADERS | {'set-cookie'}
+    }
 
-        response_headers = dict(rp.headers)
-        response_headers.pop("transfer-encoding", None)
-        response_headers.pop("content-encoding", None)
-        response_headers.pop("set-cookie", None)
+    closed = False
 
-        response = Response(
-            content=rp.content,
-            status_code=rp.status_code,
-            headers=response_headers
-        )
-        
-        set_cookie_list = None
+    async def close():
+        # Called when the body has been streamed and again by the background task, which
+        # still runs if the client disconnects first
+        nonlocal closed
+        if not closed:
+            closed = True
+            stats.finished()
+        await rp.aclose()
+
+    async def stream_body():
+        try:
+            async for chunk in rp.aiter_raw():
+                yield chunk
+        except httpx.HTTPError as e:
+            # Headers have already been sent, so the response can only be cut short
+            logger.warning("Upstream stream failed", extra={"fields": {"url": target_url, "error": str(e)}})
+        finally:
+            await close()
+
+    response = StreamingResponse(
+        content=stream_body(),
+        status_code=rp.status_code,
+        headers=response_headers,
+        background=BackgroundTask(close)
+    )
+
+    for cookie_value in rp.headers.get_list("set-cookie"):
+        response.headers.append("set-cookie", cookie_value)
+
+    return response
+
+
+async def forward_cached(request: Request, target_url: str, client: httpx.AsyncClient, timeout: float = 30.0):
+    """
+    Function to serve a GET request from the response cache, forwarding it to the
+    target URL if it isn't cached. Requests to routes which aren't configured for
+    caching are forwarded as normal.
+    """
+    cache = request.app.state.response_cache
+    route = request.scope.get("route")
+    if cache is None or request.method != "GET" or route is None or route.path not in config.RESPONSE_CACHE_ROUTES:
+        return await forward_request(request, target_url, client, timeout)
+
+    async def fetch(headers: dict) -> httpx.Response:
+        stats = request_stats(client)
+        stats.started()
+        start = time.perf_counter()
         try:
-            set_cookie_list = rp.headers.get_list("set-cookie")
-        except AttributeError:
-            sc = rp.headers.get("set-cookie")
-            if sc:
-                set_cookie_list = [sc]
-
-        if set_cookie_list:
-            for cookie_value in set_cookie_list:
-                response.headers.append("set-cookie", cookie_value)
-        
-        return response
-    except httpx.ReadTimeout:
+            rp = await client.get(
+                target_url,
+                headers={'user-agent': 'OpenJudgeAPIGateway', **_trace_headers(request), **headers},
+                params=request.query_params,
+                timeout=timeout
+            )
+        finally:
+            stats.finished()
+        _log_upstream(rp.request, rp.status_code, start)
+        return rp
+
+    key = target_url + (f"?{request.url.query}" if request.url.query else "")
+    try:
+        cached = await cache.get(key, fetch)
+    except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail=f"Request timed out.")
     except httpx.ConnectError:
         raise HTTPException(status_code=503, detail=f"Could not connect to {target_url}.")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"An unexpected error occurred while contacting service at {target_url}.")
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if cached.etag and cached.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        headers = {k: v for k, v in cached.headers if k.lower() in ("etag", "cache-control")}
+        return Response(status_code=304, headers=headers)
+
+    response = Response(content=cached.body, status_code=cached.status_code)
+    for k, v in cached.headers:
+        response.headers.append(k, v)
+    return response
+
+
+def _log_upstream(upstream_request: httpx.Request, status_code: int, start: float):
+    duration = time.perf_counter() - start
+    UPSTREAM_LATENCY.labels(upstream_request.url.host, str(status_code)).observe(duration)
+    logger.debug("Forwarded request", extra={"fields": {
+        "method": upstream_request.method,
+        "url": str(upstream_request.url),
+        "status": status_code,
+        "duration": round(duration, 4),
+    }})
+
+
+def _trace_headers(request: Request) -> dict:
+    # Upstream spans are children of the gateway's span for this request
+    return context_headers(getattr(request.state, "trace", None))
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import weakref
+
+import httpx
+
+logger = logging.getLogger("gateway")
+
+
+class PoolStats:
+    """
+    Counts the requests forwarded through a client's connection pool, from sending them until
+    their responses are closed. Requests beyond `max_connections` wait in the pool for a
+    connection, so those are reported as queued.
+    """
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+
+    def started(self):
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "requests": self.requests,
+            "in_flight_requests": self.in_flight,
+            "peak_in_flight_requests": self.peak_in_flight,
+            "queued_requests": max(0, self.in_flight - self.max_connections),
+        }
+
+
+# The stats of each client created by create_client
+_pool_stats: "weakref.WeakKeyDictionary[httpx.AsyncClient, PoolStats]" = weakref.WeakKeyDictionary()
+
+
+def create_client(max_connections: int, max_keepalive: int, keepalive_expiry: float) -> httpx.AsyncClient:
+    """
+    Create a client with its own connection pool for a single upstream service.
+    """
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    client = httpx.AsyncClient(limits=limits)
+    _pool_stats[client] = PoolStats(max_connections)
+    return client
+
+
+def request_stats(client: httpx.AsyncClient) -> PoolStats:
+    """Return the stats which requests forwarded through `client` are counted in."""
+    return _pool_stats[client]
+
+
+async def warm_up(client: httpx.AsyncClient, url: str, connections: int, timeout: float = 2.0):
+    """
+    Open `connections` keep-alive connections to an upstream by requesting `url` concurrently.
+    Failures are ignored, as the upstream may not be up yet.
+    """
+    if connections <= 0:
+        return
+    results = await asyncio.gather(
+        *(client.get(url, timeout=timeout) for _ in range(connections)),
+        return_exceptions=True,
+    )
+    failed = sum(isinstance(result, Exception) for result in results)
+    if failed:
+        logger.warning("Warm-up requests failed", extra={"fields": {"url": url, "failed": failed, "connections": connections}})
+
+
+def pool_stats(client: httpx.AsyncClient) -> dict:
+    """
+    Return the utilisation of a client's connection pool, from the requests forwarded through it.
+    """
+    return request_stats(client).stats()
@@ -0,0 +1,83 @@
+"""
+Prometheus metrics and structured logging for the gateway.
+"""
+
+import json
+import logging
+import sys
+import time
+from typing import Callable, Dict
+
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    "gateway_request_duration_seconds",
+    "Time to handle a request, until the response headers are sent",
+    ["method", "route", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "gateway_upstream_duration_seconds",
+    "Time until an upstream service returns its response headers",
+    ["upstream", "status"],
+)
+RATE_LIMITED = Counter(
+    "gateway_rate_limited_total",
+    "Requests rejected by the rate limiter",
+    ["limit"],
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as single line JSON objects, including any `fields` passed in extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str):
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, root.level))
+
+
+class StatsCollector:
+    """
+    Exposes the stats dictionaries of caches and connection pools as gauges, read when
+    metrics are scraped. `sources` returns {metric name: {label value: stats}}.
+    """
+
+    def __init__(self, label: str, sources: Callable[[], Dict[str, dict]]):
+        self.label = label
+        self.sources = sources
+
+    def collect(self):
+        for name, groups in self.sources().items():
+            family = GaugeMetricFamily(name, f"Gateway {name.replace('_', ' ')}", labels=[self.label, "stat"])
+            for label, stats in groups.items():
+                for stat, value in (stats or {}).items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        family.add_metric([label, stat], value)
+            yield family
+
+
+def observe_request(method: str, route: str, status: int, started: float):
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - started)
+
+
+def metrics_response() -> Response:
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
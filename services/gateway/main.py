@@ -4,34 +4,91 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from config import config
 import httpx
-from middleware import authorise_request, process_time, rate_limit_middleware
+from middleware import authorise_request, process_time, rate_limit_middleware, trace_request, RATE_LIMIT_SCRIPT
 from contextlib import asynccontextmanager
-from forward import forward_request
+from forward import forward_request, forward_cached
+from response_cache import ResponseCache
+from status import StatusMonitor
+from instrumentation import configure_logging, metrics_response, StatsCollector
+from prometheus_client import REGISTRY
+from auth_cache import TokenCache, RevocationList
+from http_pool import create_client, warm_up, pool_stats
+import tracing
 import redis.asyncio as redis
 import jwt
+import asyncio
 
+configure_logging(config.LOG_LEVEL)
 
-# Lifespan event to manage HTTP client
+
+# Lifespan event to manage HTTP clients
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.http_client = httpx.AsyncClient()
+    # A dedicated connection pool for each upstream service
+    app.state.clients = {
+        "auth": create_client(**config.AUTH_POOL),
+        "problems": create_client(**config.PROBLEMS_POOL),
+        "submission": create_client(**config.SUBMISSION_POOL),
+    }
+    await asyncio.gather(
+        warm_up(app.state.clients["auth"], f"{config.AUTH_SERVICE_URL}/health", config.WARMUP_CONNECTIONS),
+        warm_up(app.state.clients["problems"], f"{config.PROBLEMS_SERVICE_URL}/health", config.WARMUP_CONNECTIONS),
+        warm_up(app.state.clients["submission"], f"{config.SUBMISSION_SERVICE_URL}/health", config.WARMUP_CONNECTIONS),
+    )
     pool = redis.ConnectionPool.from_url(
         config.REDIS_URL,
         max_connections=10,
         decode_responses=True,
     )
     app.state.redis_client = redis.Redis.from_pool(pool)
+    app.state.rate_limiter = app.state.redis_client.register_script(RATE_LIMIT_SCRIPT)
+    app.state.token_cache = TokenCache(config.TOKEN_CACHE_SIZE)
+    app.state.response_cache = ResponseCache(
+        config.RESPONSE_CACHE_SIZE,
+        config.RESPONSE_CACHE_TTL,
+        app.state.redis_client if config.RESPONSE_CACHE_REDIS else None
+    ) if config.RESPONSE_CACHE_SIZE > 0 else None
+    app.state.status_monitor = StatusMonitor(
+        {
+            "auth_service": (app.state.clients["auth"], f"{config.AUTH_SERVICE_URL}/health"),
+            "problems_service": (app.state.clients["problems"], f"{config.PROBLEMS_SERVICE_URL}/health"),
+            "submission_service": (app.state.clients["submission"], f"{config.SUBMISSION_SERVICE_URL}/health"),
+        },
+        config.STATUS_TIMEOUT,
+        config.STATUS_CACHE_SECONDS
+    )
+    app.state.status_monitor.start()
+    app.state.revocations = RevocationList(app.state.redis_client, config.REVOCATION_STALENESS_SECONDS)
+    app.state.revocations.start()
+    stats_collectors = [
+        StatsCollector("cache", lambda: {"gateway_cache": {
+            "responses": app.state.response_cache.stats() if app.state.response_cache is not None else {},
+            "tokens": app.state.token_cache.stats(),
+        }}),
+        StatsCollector("upstream", lambda: {"gateway_connection_pool": {
+            name: pool_stats(client) for name, client in app.state.clients.items()
+        }}),
+    ]
+    for collector in stats_collectors:
+        REGISTRY.register(collector)
     yield
-    await app.state.http_client.aclose()
+    for collector in stats_collectors:
+        REGISTRY.unregister(collector)
+    await app.state.status_monitor.stop()
+    await app.state.revocations.stop()
+    for client in app.state.clients.values():
+        await client.aclose()
     await app.state.redis_client.aclose()
+    tracing.flush()
 
 
 app = FastAPI(title="OpenJudge API Gateway", lifespan=lifespan)
 
-# Process time, rate limiting, and authorization middleware
-# app.middleware("http")(process_time)
+# Rate limiting, authorization, process time and tracing middleware (added last so they time the others)
 app.middleware("http")(rate_limit_middleware)
 app.middleware("http")(authorise_request)
+app.middleware("http")(process_time)
+app.middleware("http")(trace_request)
 
 # # Security middleware
 app.add_middleware(
@@ -48,131 +105,111 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Trace-Id"],
 )
 
 # Health check endpoints
 @app.get("/health")
 async def health_check():
-    print("Received health check get request")
     return Response(status_code=200, content="API Gateway operational")
 
 
 @app.get("/status")
 async def status_check(request: Request):
-    client = request.app.state.http_client
-    
-    response = {
-        "auth_service": "unknown",
-        "problems_service": "unknown",
-        "submission_service": "unknown",
-    }
-    
-    try:
-        r = await client.get(f"{config.AUTH_SERVICE_URL}/health")
-        if r.status_code != 200:
-            response["auth_service"] = "unavailable"
-        else:
-            response["auth_service"] = "operational"
-    except Exception as e:
-        response["auth_service"] = "unavailable"
-    try:
-        r = await client.get(
-            f"{config.PROBLEMS_SERVICE_URL}/health"
-        )
-        if r.status_code != 200:
-            response["problems_service"] = "unavailable"
-        else:
-            response["problems_service"] = "operational"
-    except:
-        response["problems_service"] = "unavailable"
-    try:
-        r = await client.get(
-            f"{config.SUBMISSION_SERVICE_URL}/health"
-        )
-        if r.status_code != 200:
-            response["submission_service"] = "unavailable"
-        else:
-            response["submission_service"] = "operational"
-    except:
-        response["submission_service"] = "unavailable"
-
-    if (
-        response["auth_service"] == "operational"
-        and response["problems_service"] == "operational"
-        and response["submission_service"] == "operational"
-    ):
+    response = await request.app.state.status_monitor.get()
+    services = [status for name, status in response.items() if name != "latency_ms"]
+    if all(status == "operational" for status in services):
         return JSONResponse(content=response, status_code=200)
     else:
         return JSONResponse(content=response, status_code=503)
 
 
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+
+@app.get("/cache/stats")
+async def cache_stats(request: Request):
+    response_cache = request.app.state.response_cache
+    return {
+        "responses": response_cache.stats() if response_cache is not None else None,
+        "tokens": request.app.state.token_cache.stats(),
+    }
+
+
+@app.get("/pool/stats")
+async def connection_pool_stats(request: Request):
+    return {name: pool_stats(client) for name, client in request.app.state.clients.items()}
+
+
 # Authentication endpoints
 @app.post("/register")
 async def register_user(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["auth"]
     target_url = f"{config.AUTH_SERVICE_URL}/register"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.AUTH_TIMEOUT)
 
 
 @app.post("/login")
 async def login_user(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["auth"]
     target_url = f"{config.AUTH_SERVICE_URL}/login"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.AUTH_TIMEOUT)
 
 
 @app.post("/verify")
 async def verify_email(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["auth"]
     target_url = f"{config.AUTH_SERVICE_URL}/verify"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.AUTH_TIMEOUT)
 
 
 @app.post("/refresh")
 async def refresh_token(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["auth"]
     target_url = f"{config.AUTH_SERVICE_URL}/refresh"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.AUTH_TIMEOUT)
 
 
 @app.post("/forgot")
 async def forgot_password(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["auth"]
     target_url = f"{config.AUTH_SERVICE_URL}/forgot"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.AUTH_TIMEOUT)
 
 
 @app.post("/reset")
 async def reset_password(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["auth"]
     target_url = f"{config.AUTH_SERVICE_URL}/reset"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.AUTH_TIMEOUT)
 
 
 @app.get("/user")
 async def get_user_info(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["auth"]
     target_url = f"{config.AUTH_SERVICE_URL}/user"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.AUTH_TIMEOUT)
 
 
 @app.put("/user")
 async def update_user_info(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["auth"]
     target_url = f"{config.AUTH_SERVICE_URL}/user"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.AUTH_TIMEOUT)
 
 
 @app.delete("/user")
 async def delete_user_account(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["auth"]
     target_url = f"{config.AUTH_SERVICE_URL}/user"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.AUTH_TIMEOUT)
 
 
 @app.get("/logout")
 async def logout_user(request: Request):
-    redis = request.app.state.redis_client
+    revocations = request.app.state.revocations
     accessToken = request.headers.get("Authorization")
     if accessToken and accessToken.startswith("Bearer "):
         accessToken = accessToken.split(" ")[1]
@@ -182,7 +219,7 @@ async def logout_user(request: Request):
             )
             jti = payload.get("jti")
             if jti:
-                await redis.set(f"revoked:{jti}", "true", ex=3600)
+                await revocations.revoke(jti, 3600)
         except Exception as e:
             pass
     refreshToken = request.cookies.get("refreshToken")
@@ -193,7 +230,7 @@ async def logout_user(request: Request):
             )
             jti = payload.get("jti")
             if jti:
-                await redis.set(f"revoked:{jti}", "true", ex=2592000)
+                await revocations.revoke(jti, 2592000)
         except Exception as e:
             pass
     return Response(
@@ -208,41 +245,48 @@ async def logout_user(request: Request):
 # Problem endpoints
 @app.get("/problems/{id}")
 async def get_problem_details(request: Request, id: str):
-    client = request.app.state.http_client
+    client = request.app.state.clients["problems"]
     target_url = f"{config.PROBLEMS_SERVICE_URL}/problems/{id}"
-    return await forward_request(request, target_url, client)
+    return await forward_cached(request, target_url, client, config.PROBLEMS_TIMEOUT)
 
 
 @app.get("/problems")
 async def list_problems(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["problems"]
     target_url = f"{config.PROBLEMS_SERVICE_URL}/problems"
-    return await forward_request(request, target_url, client)
+    return await forward_cached(request, target_url, client, config.PROBLEMS_TIMEOUT)
 
 
 # Submission endpoints
 @app.post("/submission")
 async def submit_code_for_problem(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["submission"]
     target_url = f"{config.SUBMISSION_SERVICE_URL}/submission"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.SUBMISSION_TIMEOUT)
 
 
 @app.get("/submission/{id}")
 async def get_submission_details(request: Request, id: str):
-    client = request.app.state.http_client
+    client = request.app.state.clients["submission"]
     target_url = f"{config.SUBMISSION_SERVICE_URL}/submission/{id}"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.SUBMISSION_TIMEOUT)
+
+
+@app.get("/submission/{id}/stream")
+async def stream_submission_results(request: Request, id: str):
+    client = request.app.state.clients["submission"]
+    target_url = f"{config.SUBMISSION_SERVICE_URL}/submission/{id}/stream"
+    return await forward_request(request, target_url, client, config.SUBMISSION_TIMEOUT)
 
 
 @app.get("/submission")
 async def list_user_submissions(request: Request):
-    client = request.app.state.http_client
+    client = request.app.state.clients["submission"]
     target_url = f"{config.SUBMISSION_SERVICE_URL}/submission/history/{request.state.user}"
-    return await forward_request(request, target_url, client)
+    return await forward_request(request, target_url, client, config.SUBMISSION_HISTORY_TIMEOUT)
 
 @app.get("/submission/ai/{id}")
 async def get_ai_submission_details(request: Request, id: str):
-    client = request.app.state.http_client
+    client = request.app.state.clients["submission"]
     target_url = f"{config.SUBMISSION_SERVICE_URL}/submission/ai/{id}"
-    return await forward_request(request, target_url, client)
\ No newline at end of file
+    return await forward_request(request, target_url, client, config.AI_TIMEOUT)
\ No newline at end of file
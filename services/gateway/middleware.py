@@ -5,6 +5,38 @@ from fastapi.responses import PlainTextResponse
 from config import config
 import time
 from slowapi.util import get_remote_address
+from instrumentation import RATE_LIMITED, observe_request
+from tracing import Span, TRACE_HEADER, context_from_headers
+import logging
+
+logger = logging.getLogger("gateway")
+
+# Sliding window counter rate limiter. Each limit keeps one counter per window, and the
+# request rate is estimated from the current window's count plus the previous window's
+# count weighted by how much of it still overlaps the sliding window. Every limit is
+# checked in a single round trip and counters are only incremented if all limits allow
+# the request. Returns the (1-based) index of the first exceeded limit, or 0.
+#
+# KEYS: current and previous window counter for each limit
+# ARGV: limit, window (ms) and position in the current window (0-1) for each limit
+RATE_LIMIT_SCRIPT = """
+local limits = #KEYS / 2
+for i = 1, limits do
+    local limit = tonumber(ARGV[i * 3 - 2])
+    local elapsed = tonumber(ARGV[i * 3])
+    local current = tonumber(redis.call('GET', KEYS[i * 2 - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[i * 2]) or '0')
+    if previous * (1 - elapsed) + current + 1 > limit then
+        return i
+    end
+end
+for i = 1, limits do
+    redis.call('INCR', KEYS[i * 2 - 1])
+    redis.call('PEXPIRE', KEYS[i * 2 - 1], tonumber(ARGV[i * 3 - 1]) * 2)
+end
+return 0
+"""
+
 
 async def rate_limit_middleware(request: Request, call_next):
     """
@@ -13,66 +45,73 @@ async def rate_limit_middleware(request: Request, call_next):
     try:
         client_ip = get_remote_address(request)
         path = request.url.path
+        # (key, limit, window in seconds, message) for every limit applying to the request
+        limits = []
         if path.startswith("/submission") and request.method == "POST":
-            limit_key = f"submissions:{client_ip}"
-            if not await _check_rate_limit(request, limit_key, 5, 60):
-                return PlainTextResponse(
-                    status_code=429,
-                    content="Rate limit exceeded: Maximum 5 submissions per minute",
-                )
+            limits.append((f"submissions:{client_ip}", 5, 60, "Rate limit exceeded: Maximum 5 submissions per minute"))
         elif path.startswith("/login"):
-            limit_key = f"login:{client_ip}"
-            if not await _check_rate_limit(request, limit_key, 5, 60):
-                return PlainTextResponse(
-                    status_code=429,
-                    content="Rate limit exceeded: Maximum 5 login attempts per minute",
-                )
+            limits.append((f"login:{client_ip}", 5, 60, "Rate limit exceeded: Maximum 5 login attempts per minute"))
         elif path.startswith("/submission/ai"):
-            limit_key = f"ai_submissions:{client_ip}"
-            if not await _check_rate_limit(request, limit_key, 5, 60):
-                return PlainTextResponse(
-                    status_code=429,
-                    content="Rate limit exceeded: Maximum 5 AI requests per minute",
-                )
-        overall_limit_key = f"overall:{client_ip}"
-        if not await _check_rate_limit(request, overall_limit_key, 100, 60):
-            return PlainTextResponse(
-                status_code=429,
-                content="Rate limit exceeded: Maximum 100 requests per minute",
-            )
+            limits.append((f"ai_submissions:{client_ip}", 5, 60, "Rate limit exceeded: Maximum 5 AI requests per minute"))
+        limits.append((f"overall:{client_ip}", 100, 60, "Rate limit exceeded: Maximum 100 requests per minute"))
+
+        exceeded = await _check_rate_limits(request, limits)
+        if exceeded is not None:
+            RATE_LIMITED.labels(exceeded[0].split(":")[0]).inc()
+            return PlainTextResponse(status_code=429, content=exceeded[3])
         return await call_next(request)
     except Exception as e:
         # If rate limiting fails, log and continue (fail open)
-        print(f"Error: Failed to check rate limit: {e}")
+        logger.error("Failed to check rate limit", extra={"fields": {"error": str(e)}})
         return await call_next(request)
 
 
-async def _check_rate_limit(
-    request: Request, key: str, limit: int, window_seconds: int
-) -> bool:
+async def _check_rate_limits(request: Request, limits: list):
     """
-    Redis-based sliding window rate limiter using ZSET and async pipeline
+    Check and count a request against every limit in a single Redis script call,
+    returning the first exceeded limit or None if the request is allowed
     """
+    # The window is identified by the gateway clock so that all keys are known up front
     now = int(time.time() * 1000)
-    window_start = now - window_seconds * 1000
-    redis = request.app.state.redis_client
-    async with redis.pipeline(transaction=True) as pipe:
-        pipe.zremrangebyscore(key, 0, window_start)
-        pipe.zadd(key, {str(now): now})
-        pipe.zcard(key)
-        pipe.expire(key, window_seconds)
+    keys = []
+    args = []
+    for key, limit, window_seconds, _ in limits:
+        window = window_seconds * 1000
+        index = now // window
+        keys += [f"ratelimit:{key}:{index}", f"ratelimit:{key}:{index - 1}"]
+        args += [limit, window, (now % window) / window]
 
-        results = await pipe.execute()
+    exceeded = await request.app.state.rate_limiter(keys=keys, args=args)
+    return limits[exceeded - 1] if exceeded else None
 
-    count = results[2]
-    return count <= limit
+
+def _verify_token(request: Request, token: str) -> dict:
+    """
+    Verify a token's signature, reusing the payload of a previously verified token
+    """
+    cache = request.app.state.token_cache
+    payload = cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, config.JWT_PUBLIC_KEY, algorithms=["EdDSA"])
+        cache.put(token, payload)
+    return payload
+
+
+async def _is_revoked(request: Request, jti: str) -> bool:
+    """
+    Check the local revocation list, falling back to Redis if it is too stale
+    """
+    revoked = request.app.state.revocations.is_revoked(jti)
+    if revoked is None:
+        revoked = bool(await request.app.state.redis_client.get(f"revoked:{jti}"))
+    return revoked
 
 
 async def authorise_request(request: Request, call_next):
     """
     Middleware to authorize requests
     """
-    print("Received a request")
+    logger.debug("Received a request", extra={"fields": {"method": request.method, "path": request.url.path}})
     if request.url.path.startswith(("/health")):
         response = await call_next(request)
         return response
@@ -88,7 +127,7 @@ async def authorise_request(request: Request, call_next):
         token = auth_header.split(" ")[1]
         
         try:
-            payload = jwt.decode(token, config.JWT_PUBLIC_KEY, algorithms=["EdDSA"])
+            payload = _verify_token(request, token)
             jti = payload.get("jti")
             if not jti:
                 return PlainTextResponse(
@@ -96,9 +135,7 @@ async def authorise_request(request: Request, call_next):
                     content="Access token missing claims"
                 )
             
-            redis = request.app.state.redis_client
-            is_revoked = await redis.get(f"revoked:{jti}")
-            if is_revoked:
+            if await _is_revoked(request, jti):
                 return PlainTextResponse(
                     status_code=401,
                     content="Access token has been revoked"
@@ -145,7 +182,7 @@ async def authorise_request(request: Request, call_next):
             )
         
         try:
-            payload = jwt.decode(token, config.JWT_PUBLIC_KEY, algorithms=["EdDSA"])
+            payload = _verify_token(request, token)
             jti = payload.get("jti")
             if not jti:
                 return PlainTextResponse(
@@ -153,9 +190,7 @@ async def authorise_request(request: Request, call_next):
                     content="Refresh token missing claims"
                 )
             
-            redis = request.app.state.redis_client
-            is_revoked = await redis.get(f"revoked:{jti}")
-            if is_revoked:
+            if await _is_revoked(request, jti):
                 return PlainTextResponse(
                     status_code=401,
                     content="Refresh token has been revoked"
@@ -191,9 +226,30 @@ async def authorise_request(request: Request, call_next):
 
 
 async def process_time(request: Request, call_next):
-    """Middleware to measure and add process time to response headers"""
+    """Middleware to measure and add process time to response headers, and record it by route"""
     start_time = time.perf_counter()
     response = await call_next(request)
     process_time = time.perf_counter() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+    # Labelled by route template rather than path, so IDs don't create new series
+    route = request.scope.get("route")
+    observe_request(request.method, route.path if route else "unmatched", response.status_code, start_time)
+    return response
+
+
+async def trace_request(request: Request, call_next):
+    """
+    Middleware to record a span for each request, continuing the caller's trace if it sent
+    one. The trace context is kept in request.state.trace for forwarded requests, and the
+    trace ID is returned in the X-Trace-Id response header.
+    """
+    with Span(request.method, context_from_headers(request.headers)) as span:
+        request.state.trace = span.context
+        response = await call_next(request)
+        # Named by route template, like the latency metrics
+        route = request.scope.get("route")
+        span.name = f"{request.method} {route.path if route else 'unmatched'}"
+        span.tag("http.path", request.url.path)
+        span.tag("http.status_code", response.status_code)
+    response.headers[TRACE_HEADER] = span.trace_id
     return response
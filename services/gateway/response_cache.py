@@ -0,0 +1,198 @@
+import asyncio
+import base64
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+logger = logging.getLogger("gateway")
+
+# Headers which are not stored with a cached response
+UNCACHED_HEADERS = {
+    'connection', 'keep-alive', 'te', 'trailer', 'transfer-encoding', 'upgrade',
+    'content-encoding', 'content-length', 'set-cookie', 'date',
+}
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: list
+    body: bytes
+    etag: Optional[str]
+    expires_at: float
+
+
+def cache_ttl(response: httpx.Response, default_ttl: float) -> Optional[float]:
+    """
+    Return how long a response may be cached for, or None if it may not be cached.
+    """
+    if response.status_code != 200 or "set-cookie" in response.headers:
+        return None
+    vary = {value.strip().lower() for value in response.headers.get("vary", "").split(",") if value.strip()}
+    if vary - {"accept-encoding"}:
+        return None
+    cache_control = response.headers.get("cache-control", "").lower()
+    if any(directive in cache_control for directive in ("no-store", "no-cache", "private")):
+        return None
+    max_age = re.search(r"max-age=(\d+)", cache_control)
+    ttl = float(max_age.group(1)) if max_age else default_ttl
+    return ttl if ttl > 0 else None
+
+
+class ResponseCache:
+    """
+    LRU cache of upstream responses to GET requests, keyed by URL.
+
+    Responses are cached for their Cache-Control max-age (or `default_ttl` if they
+    don't have one), after which they are revalidated with If-None-Match when the
+    upstream provided an ETag. Responses marked no-store, no-cache or private are not
+    cached. Concurrent misses for the same URL share a single upstream request. If a
+    Redis client is given, responses are also shared between gateway instances.
+    """
+
+    def __init__(self, max_size: int, default_ttl: float, redis=None):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.redis = redis
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._inflight: dict = {}
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.redis_hits = 0
+        self.coalesced = 0
+        self.uncacheable = 0
+        self.evictions = 0
+
+    async def get(self, key: str, fetch: Callable[[dict], Awaitable[httpx.Response]]) -> CachedResponse:
+        """
+        Return the response for `key`, calling `fetch` with any extra request headers
+        if it isn't cached or needs revalidating.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._load(key, fetch, entry))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        # Lookups served without a request upstream count as hits
+        served = self.hits + self.coalesced + self.redis_hits
+        lookups = served + self.misses + self.revalidated
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "redis_hits": self.redis_hits,
+            "coalesced": self.coalesced,
+            "uncacheable": self.uncacheable,
+            "evictions": self.evictions,
+            "hit_rate": served / lookups if lookups else 0.0,
+        }
+
+    async def _load(self, key: str, fetch, stale: Optional[CachedResponse]) -> CachedResponse:
+        if stale is None:
+            shared = await self._get_shared(key)
+            if shared is not None:
+                self.redis_hits += 1
+                self._store(key, shared)
+                return shared
+
+        headers = {"If-None-Match": stale.etag} if stale is not None and stale.etag else {}
+        response = await fetch(headers)
+
+        if response.status_code == 304 and stale is not None:
+            self.revalidated += 1
+            ttl = cache_ttl(httpx.Response(200, headers=response.headers), self.default_ttl)
+            if ttl is None:
+                self._entries.pop(key, None)
+                return stale
+            stale.expires_at = time.monotonic() + ttl
+            self._store(key, stale)
+            await self._set_shared(key, stale, ttl)
+            return stale
+
+        self.misses += 1
+        ttl = cache_ttl(response, self.default_ttl)
+        entry = CachedResponse(
+            status_code=response.status_code,
+            headers=[(k, v) for k, v in response.headers.items() if k.lower() not in UNCACHED_HEADERS],
+            body=response.content,
+            etag=response.headers.get("etag"),
+            expires_at=time.monotonic() + (ttl or 0),
+        )
+        if ttl is None:
+            # Still returned to any coalesced requests, but not stored
+            self.uncacheable += 1
+            self._entries.pop(key, None)
+            return entry
+        self._store(key, entry)
+        await self._set_shared(key, entry, ttl)
+        return entry
+
+    def _store(self, key: str, entry: CachedResponse):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _get_shared(self, key: str) -> Optional[CachedResponse]:
+        if self.redis is None:
+            return None
+        try:
+            cached = await self.redis.get(f"response:{key}")
+            ttl = await self.redis.ttl(f"response:{key}") if cached is not None else 0
+        except Exception as e:
+            logger.warning("Response cache Redis read failed", extra={"fields": {"error": str(e)}})
+            return None
+        if cached is None or ttl <= 0:
+            return None
+        cached = json.loads(cached)
+        return CachedResponse(
+            status_code=cached["status_code"],
+            headers=[tuple(header) for header in cached["headers"]],
+            body=base64.b64decode(cached["body"]),
+            etag=cached["etag"],
+            expires_at=time.monotonic() + ttl,
+        )
+
+    async def _set_shared(self, key: str, entry: CachedResponse, ttl: float):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                f"response:{key}",
+                json.dumps({
+                    "status_code": entry.status_code,
+                    "headers": entry.headers,
+                    "body": base64.b64encode(entry.body).decode(),
+                    "etag": entry.etag,
+                }),
+                ex=max(1, int(ttl)),
+            )
+        except Exception as e:
+            logger.warning("Response cache Redis write failed", extra={"fields": {"error": str(e)}})
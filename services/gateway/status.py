@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger("gateway")
+
+
+class StatusMonitor:
+    """
+    Checks the health endpoints of the upstream services concurrently, each with its
+    own timeout. The combined result is cached for `ttl` seconds and refreshed in the
+    background, so frequent status probes don't each call every service.
+    """
+
+    def __init__(self, services: dict, timeout: float, ttl: float):
+        # Name -> (client, health URL) for each service
+        self.services = services
+        self.timeout = timeout
+        self.ttl = ttl
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def get(self) -> dict:
+        """Return the latest status, checking the services if it is older than the TTL."""
+        if self._result is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self._result
+        return await self.refresh()
+
+    async def refresh(self) -> dict:
+        # Concurrent callers share a single round of checks
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._check())
+            self._inflight.add_done_callback(lambda _: setattr(self, "_inflight", None))
+        return await asyncio.shield(self._inflight)
+
+    async def _check(self) -> dict:
+        names = list(self.services)
+        results = await asyncio.gather(*(self._probe(*self.services[name]) for name in names))
+        response = {name: status for name, (status, _) in zip(names, results)}
+        response["latency_ms"] = {name: latency for name, (_, latency) in zip(names, results)}
+        self._result = response
+        self._checked_at = time.monotonic()
+        return response
+
+    async def _probe(self, client: httpx.AsyncClient, url: str):
+        start = time.perf_counter()
+        try:
+            r = await asyncio.wait_for(client.get(url, timeout=self.timeout), self.timeout)
+            status = "operational" if r.status_code == 200 else "unavailable"
+        except Exception:
+            status = "unavailable"
+        return status, round((time.perf_counter() - start) * 1000, 1)
+
+    async def _refresh_forever(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Failed to refresh service status", extra={"fields": {"error": str(e)}})
+            await asyncio.sleep(self.ttl)
@@ -1,9 +1,24 @@
 import pytest
 import os
+import asyncio
+import base64
+import json
+import time
+import fakeredis
+import httpx
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from fastapi import FastAPI, Request
 from fastapi.testclient import TestClient
 
+# Tokens in these tests are signed with this key
+PRIVATE_KEY = ed25519.Ed25519PrivateKey.generate()
+
 os.environ.update({
-    "JWT_PUBLIC_KEY": "test_public_key",
+    "JWT_PUBLIC_KEY": base64.urlsafe_b64encode(
+        PRIVATE_KEY.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    ).decode(),
     "ENV": "local",
     "AUTH_SERVICE_URL": "http://localhost:8001",
     "PROBLEMS_SERVICE_URL": "http://localhost:8002", 
@@ -13,6 +28,15 @@ os.environ.update({
 })
 
 from main import app
+from auth_cache import RevocationList, TokenCache
+from forward import forward_cached, forward_request
+from http_pool import create_client, pool_stats
+from response_cache import ResponseCache, cache_ttl
+from status import StatusMonitor
+from instrumentation import REGISTRY, StatsCollector
+from middleware import RATE_LIMIT_SCRIPT, authorise_request, process_time, rate_limit_middleware, trace_request
+from config import config
+import tracing
 
 @pytest.fixture
 def client():
@@ -40,5 +64,501 @@ def test_health_endpoint(client):
     assert response.json() == "API Gateway operational"
 
 
+def upstream_app(client: httpx.AsyncClient) -> FastAPI:
+    """An app forwarding every request to an upstream through client"""
+    proxy = FastAPI()
+
+    @proxy.api_route("/proxied", methods=["GET", "POST"])
+    async def proxied(request: Request):
+        return await forward_request(request, "http://upstream/proxied", client)
+
+    return proxy
+
+def test_pool_stats_count_requests_until_streamed(monkeypatch):
+    """Test that forwarded requests are in flight until their response is streamed"""
+    client = create_client(max_connections=1, max_keepalive=1, keepalive_expiry=5)
+    seen = []
+
+    class Body(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            seen.append(pool_stats(client)["in_flight_requests"])
+            yield b"ok"
+
+    async def send(request, stream=False):
+        return httpx.Response(200, stream=Body(), request=request)
+
+    monkeypatch.setattr(client, "send", send)
+    with TestClient(upstream_app(client)) as test_client:
+        response = test_client.get("/proxied")
+
+    assert response.content == b"ok"
+    assert seen == [1]
+    stats = pool_stats(client)
+    assert stats["requests"] == 1
+    assert stats["in_flight_requests"] == 0
+    assert stats["peak_in_flight_requests"] == 1
+    assert stats["queued_requests"] == 0
+
+def test_pool_stats_release_failed_requests(monkeypatch):
+    """Test that requests which fail to connect are no longer counted as in flight"""
+    client = create_client(max_connections=1, max_keepalive=1, keepalive_expiry=5)
+
+    async def send(request, stream=False):
+        raise httpx.ConnectError("refused", request=request)
+
+    monkeypatch.setattr(client, "send", send)
+    with TestClient(upstream_app(client)) as test_client:
+        response = test_client.get("/proxied")
+
+    assert response.status_code == 503
+    assert pool_stats(client)["in_flight_requests"] == 0
+
+
+def token(jti: str, expires_in: int = 60) -> str:
+    """An access token signed with the gateway's key"""
+    payload = {"sub": "user", "jti": jti, "exp": int(time.time()) + expires_in}
+    return jwt.encode(payload, PRIVATE_KEY, algorithm="EdDSA")
+
+def test_token_cache_reuses_payloads_until_expiry():
+    """Test that cached payloads are returned until the token expires"""
+    cache = TokenCache(max_size=10)
+    cache.put("valid", {"exp": time.time() + 60})
+    cache.put("expired", {"exp": time.time() - 1})
+    cache.put("no-expiry", {"sub": "user"})
+
+    assert cache.get("valid") is not None
+    assert cache.get("expired") is None
+    assert cache.get("no-expiry") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 2}
+
+def test_token_cache_evicts_least_recently_used():
+    """Test that the cache holds at most max_size payloads"""
+    cache = TokenCache(max_size=2)
+    for name in ("a", "b"):
+        cache.put(name, {"exp": time.time() + 60})
+    cache.get("a")
+    cache.put("c", {"exp": time.time() + 60})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+def test_revocation_list_is_trusted_only_while_synced():
+    """Test that revocations are replicated by sync, and a stale replica defers to Redis"""
+    async def run():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        revoking = RevocationList(redis, staleness=5)
+        replica = RevocationList(redis, staleness=5)
+        unsynced = replica.is_revoked("jti-1")
+
+        await revoking.revoke("jti-1", ttl=60)
+        await replica.sync()
+        synced = replica.is_revoked("jti-1"), replica.is_revoked("jti-2")
+
+        replica._last_sync -= 10
+        return unsynced, synced, replica.is_revoked("jti-1"), await redis.get("revoked:jti-1")
+
+    unsynced, synced, stale, stored = asyncio.run(run())
+    assert unsynced is None
+    assert synced == (True, False)
+    assert stale is None
+    assert stored == "true"
+
+def test_authorise_request_caches_tokens_and_rejects_revoked_ones():
+    """Test that a verified token is reused from the cache until its ID is revoked"""
+    server = fakeredis.FakeServer()
+    protected = FastAPI()
+    protected.middleware("http")(authorise_request)
+
+    @protected.get("/user/me")
+    async def me(request: Request):
+        return request.state.user
+
+    @protected.post("/revoke/{jti}")
+    async def revoke(request: Request, jti: str):
+        await request.app.state.revocations.revoke(jti, 60)
+
+    access_token = token("jti-1")
+    with TestClient(protected) as test_client:
+        protected.state.redis_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        protected.state.token_cache = TokenCache(max_size=10)
+        protected.state.revocations = RevocationList(protected.state.redis_client, staleness=5)
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        assert test_client.get("/user/me", headers=headers).json() == "user"
+        assert test_client.get("/user/me", headers=headers).json() == "user"
+        assert protected.state.token_cache.stats()["hits"] == 1
+
+        # The replica has never synced, so the revocation is read from Redis
+        test_client.post("/revoke/jti-1")
+        response = test_client.get("/user/me", headers=headers)
+        assert response.status_code == 401
+        assert response.text == "Access token has been revoked"
+
+        response = test_client.get("/user/me", headers={"Authorization": "Bearer invalid"})
+        assert response.text == "Invalid access token"
+
+
+def rate_limited_app(redis) -> FastAPI:
+    """An app limiting requests with the rate limit script on redis"""
+    limited = FastAPI()
+    limited.middleware("http")(rate_limit_middleware)
+    limited.state.rate_limiter = redis.register_script(RATE_LIMIT_SCRIPT)
+
+    @limited.post("/submission")
+    async def submit():
+        return "submitted"
+
+    @limited.get("/problems")
+    async def problems():
+        return "problems"
+
+    return limited
+
+def test_rate_limit_rejects_requests_over_the_limit():
+    """Test that the sixth submission in a minute is rejected, while other requests are allowed"""
+    server = fakeredis.FakeServer()
+    limited = rate_limited_app(fakeredis.FakeAsyncRedis(server=server))
+
+    with TestClient(limited) as test_client:
+        statuses = [test_client.post("/submission").status_code for _ in range(6)]
+        assert statuses == [200] * 5 + [429]
+        assert test_client.get("/problems").status_code == 200
+
+def test_rate_limit_counts_requests_only_when_every_limit_allows_them():
+    """Test that rejected requests are not counted against the other limits"""
+    server = fakeredis.FakeServer()
+    limited = rate_limited_app(fakeredis.FakeAsyncRedis(server=server))
+
+    with TestClient(limited) as test_client:
+        for _ in range(10):
+            test_client.post("/submission")
+
+    async def overall_count():
+        redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        keys = await redis.keys("ratelimit:overall:*")
+        return sum([int(await redis.get(key)) for key in keys])
+
+    assert asyncio.run(overall_count()) == 5
+
+def test_rate_limit_fails_open():
+    """Test that requests are allowed when Redis can't be reached"""
+    limited = rate_limited_app(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer()))
+
+    async def unavailable(keys, args):
+        raise ConnectionError("Redis is down")
+
+    limited.state.rate_limiter = unavailable
+    with TestClient(limited) as test_client:
+        assert all(test_client.post("/submission").status_code == 200 for _ in range(6))
+
+
+def test_forward_request_streams_bodies_and_filters_headers(monkeypatch):
+    """Test that bodies are passed through and connection headers are dropped, keeping every cookie"""
+    client = create_client(max_connections=1, max_keepalive=1, keepalive_expiry=5)
+    sent = []
+
+    async def send(request, stream=False):
+        sent.append((request, await request.aread()))
+        headers = [
+            ("content-type", "text/plain"), ("connection", "keep-alive"), ("x-upstream", "1"),
+            ("set-cookie", "a=1"), ("set-cookie", "b=2"),
+        ]
+        return httpx.Response(200, headers=headers, stream=httpx.ByteStream(b"upstream body"), request=request)
+
+    monkeypatch.setattr(client, "send", send)
+    with TestClient(upstream_app(client)) as test_client:
+        response = test_client.post("/proxied?page=2", content=b"request body", headers={"Keep-Alive": "timeout=5"})
+
+    upstream_request, body = sent[0]
+    assert body == b"request body"
+    assert upstream_request.url.params["page"] == "2"
+    assert upstream_request.headers["user-agent"] == "OpenJudgeAPIGateway"
+    assert "keep-alive" not in upstream_request.headers
+    assert response.content == b"upstream body"
+    assert response.headers["x-upstream"] == "1"
+    assert "keep-alive" not in response.headers.get("connection", "")
+    assert response.headers.get_list("set-cookie") == ["a=1", "b=2"]
+
+def test_forward_request_sends_bodyless_requests_without_a_body(monkeypatch):
+    """Test that requests without a body aren't forwarded as chunked"""
+    client = create_client(max_connections=1, max_keepalive=1, keepalive_expiry=5)
+    sent = []
+
+    async def send(request, stream=False):
+        sent.append(request)
+        return httpx.Response(204, stream=httpx.ByteStream(b""), request=request)
+
+    monkeypatch.setattr(client, "send", send)
+    with TestClient(upstream_app(client)) as test_client:
+        assert test_client.get("/proxied").status_code == 204
+
+    assert "transfer-encoding" not in sent[0].headers
+
+@pytest.mark.parametrize("error, status_code", [
+    (httpx.ReadTimeout, 504),
+    (httpx.ConnectError, 503),
+    (httpx.RemoteProtocolError, 502),
+])
+def test_forward_request_upstream_errors(monkeypatch, error, status_code):
+    """Test that upstream failures are returned as gateway errors"""
+    client = create_client(max_connections=1, max_keepalive=1, keepalive_expiry=5)
+
+    async def send(request, stream=False):
+        raise error("failed", request=request)
+
+    monkeypatch.setattr(client, "send", send)
+    with TestClient(upstream_app(client)) as test_client:
+        assert test_client.get("/proxied").status_code == status_code
+
+
+class Upstream:
+    """Upstream stand-in for the response cache, counting the requests it is sent"""
+
+    def __init__(self, cache_control: str = "max-age=60"):
+        self.cache_control = cache_control
+        self.requests = []
+
+    async def fetch(self, headers: dict) -> httpx.Response:
+        self.requests.append(headers)
+        await asyncio.sleep(0)
+        if headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"cache-control": self.cache_control})
+        return httpx.Response(200, content=b"problems", headers={"etag": '"v1"', "cache-control": self.cache_control})
+
+@pytest.mark.parametrize("status_code, headers, ttl", [
+    (200, {}, 30),
+    (200, {"cache-control": "public, max-age=5"}, 5),
+    (200, {"cache-control": "no-store"}, None),
+    (200, {"cache-control": "private, max-age=5"}, None),
+    (200, {"set-cookie": "session=1"}, None),
+    (200, {"vary": "Authorization"}, None),
+    (200, {"vary": "Accept-Encoding"}, 30),
+    (404, {}, None),
+])
+def test_cache_ttl(status_code, headers, ttl):
+    """Test which responses are cached, and for how long"""
+    assert cache_ttl(httpx.Response(status_code, headers=headers), default_ttl=30) == ttl
+
+def test_response_cache_serves_cached_responses():
+    """Test that a cached response is served without another request"""
+    upstream = Upstream()
+    cache = ResponseCache(max_size=10, default_ttl=30)
+
+    async def run():
+        return await cache.get("/problems", upstream.fetch), await cache.get("/problems", upstream.fetch)
+
+    first, second = asyncio.run(run())
+    assert second is first
+    assert first.body == b"problems"
+    assert len(upstream.requests) == 1
+    assert cache.stats()["hits"] == 1
+
+def test_response_cache_shares_concurrent_misses():
+    """Test that concurrent lookups of an uncached URL share one request"""
+    upstream = Upstream()
+    cache = ResponseCache(max_size=10, default_ttl=30)
+
+    async def run():
+        return await asyncio.gather(*(cache.get("/problems", upstream.fetch) for _ in range(5)))
+
+    entries = asyncio.run(run())
+    assert all(entry is entries[0] for entry in entries)
+    assert len(upstream.requests) == 1
+    assert cache.stats()["coalesced"] == 4
+
+def test_response_cache_revalidates_expired_responses():
+    """Test that an expired response is revalidated with its ETag"""
+    upstream = Upstream()
+    cache = ResponseCache(max_size=10, default_ttl=30)
+
+    async def run():
+        first = await cache.get("/problems", upstream.fetch)
+        first.expires_at = 0
+        return first, await cache.get("/problems", upstream.fetch)
+
+    first, second = asyncio.run(run())
+    assert second is first
+    assert upstream.requests[1] == {"If-None-Match": '"v1"'}
+    assert cache.stats()["revalidated"] == 1
+
+def test_response_cache_does_not_store_uncacheable_responses():
+    """Test that responses marked no-store are fetched every time"""
+    upstream = Upstream("no-store")
+    cache = ResponseCache(max_size=10, default_ttl=30)
+
+    async def run():
+        for _ in range(2):
+            await cache.get("/problems", upstream.fetch)
+
+    asyncio.run(run())
+    assert len(upstream.requests) == 2
+    assert cache.stats()["size"] == 0
+
+def test_response_cache_shares_responses_through_redis():
+    """Test that a response fetched by one gateway instance is read by another from Redis"""
+    upstream = Upstream()
+
+    async def run():
+        redis = fakeredis.FakeAsyncRedis()
+        caches = [ResponseCache(max_size=10, default_ttl=30, redis=redis) for _ in range(2)]
+        return [await cache.get("/problems", upstream.fetch) for cache in caches], caches
+
+    (first, second), caches = asyncio.run(run())
+    assert second.body == first.body and second.etag == first.etag
+    assert len(upstream.requests) == 1
+    assert caches[1].stats()["redis_hits"] == 1
+
+def test_response_cache_evicts_least_recently_used():
+    """Test that the cache holds at most max_size responses"""
+    upstream = Upstream()
+    cache = ResponseCache(max_size=1, default_ttl=30)
+
+    async def run():
+        for key in ("/problems", "/problems/1", "/problems"):
+            await cache.get(key, upstream.fetch)
+
+    asyncio.run(run())
+    assert len(upstream.requests) == 3
+    assert cache.stats()["evictions"] == 2
+
+def test_forward_cached_answers_conditional_requests(monkeypatch):
+    """Test that a client holding the cached response's ETag is sent a 304"""
+    client = create_client(max_connections=1, max_keepalive=1, keepalive_expiry=5)
+    upstream = Upstream()
+
+    async def get(url, headers=None, **kwargs):
+        response = await upstream.fetch({})
+        response.request = httpx.Request("GET", url)
+        return response
+
+    monkeypatch.setattr(client, "get", get)
+    cached = FastAPI()
+    cached.state.response_cache = ResponseCache(max_size=10, default_ttl=30)
+
+    @cached.get("/problems")
+    async def problems(request: Request):
+        return await forward_cached(request, "http://upstream/problems", client)
+
+    with TestClient(cached) as test_client:
+        response = test_client.get("/problems")
+        assert response.content == b"problems"
+        response = test_client.get("/problems", headers={"If-None-Match": response.headers["etag"]})
+        assert response.status_code == 304
+
+    assert len(upstream.requests) == 1
+
+
+def service(status_code: int = 200, delay: float = 0, requests: list = None) -> httpx.AsyncClient:
+    """A client for a service whose health endpoint responds after delay seconds"""
+    async def handle(request: httpx.Request) -> httpx.Response:
+        if requests is not None:
+            requests.append(request)
+        await asyncio.sleep(delay)
+        return httpx.Response(status_code)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+def test_status_checks_services_concurrently():
+    """Test that services are checked at once, each reported unavailable on errors or timeouts"""
+    monitor = StatusMonitor({
+        "auth": (service(delay=0.2), "http://auth/health"),
+        "problems": (service(500), "http://problems/health"),
+        "submission": (service(delay=5), "http://submission/health"),
+    }, timeout=0.3, ttl=10)
+
+    start = time.perf_counter()
+    status = asyncio.run(monitor.get())
+
+    assert time.perf_counter() - start < 1
+    assert status["auth"] == "operational"
+    assert status["problems"] == "unavailable"
+    assert status["submission"] == "unavailable"
+    assert status["latency_ms"]["auth"] >= 200
+
+def test_status_is_cached_for_its_ttl():
+    """Test that status probes within the TTL, or made concurrently, share one round of checks"""
+    requests = []
+    monitor = StatusMonitor({"auth": (service(delay=0.05, requests=requests), "http://auth/health")}, timeout=1, ttl=10)
+
+    async def run():
+        concurrent = await asyncio.gather(*(monitor.get() for _ in range(5)))
+        return concurrent, await monitor.get()
+
+    concurrent, cached = asyncio.run(run())
+    assert all(status is cached for status in concurrent)
+    assert len(requests) == 1
+
+
+def test_request_latency_is_recorded_by_route():
+    """Test that requests are timed under their route template rather than their path"""
+    timed = FastAPI()
+    timed.middleware("http")(process_time)
+
+    @timed.get("/problems/{id}")
+    async def problem(id: str):
+        return id
+
+    labels = {"method": "GET", "route": "/problems/{id}", "status": "200"}
+    before = REGISTRY.get_sample_value("gateway_request_duration_seconds_count", labels) or 0
+    with TestClient(timed) as test_client:
+        for id in ("1", "2"):
+            assert "x-process-time" in test_client.get(f"/problems/{id}").headers
+
+    assert REGISTRY.get_sample_value("gateway_request_duration_seconds_count", labels) == before + 2
+
+def test_stats_are_exported_as_gauges():
+    """Test that numeric cache and pool stats are read when metrics are collected"""
+    cache = TokenCache(max_size=10)
+    cache.get("missing")
+    collector = StatsCollector("cache", lambda: {"gateway_cache": {"tokens": cache.stats()}})
+
+    family, = collector.collect()
+
+    samples = {sample.labels["stat"]: sample.value for sample in family.samples}
+    assert samples == {"size": 0, "hits": 0, "misses": 1}
+
+
+def test_traces_are_continued_upstream(monkeypatch, tmp_path):
+    """Test that the caller's trace is passed on to upstreams, as the parent of the gateway's span"""
+    spans = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(config, "TRACE_EXPORT_URL", f"file://{spans}")
+    client = create_client(max_connections=1, max_keepalive=1, keepalive_expiry=5)
+    sent = []
+
+    async def send(request, stream=False):
+        sent.append(request)
+        return httpx.Response(200, stream=httpx.ByteStream(b"ok"), request=request)
+
+    monkeypatch.setattr(client, "send", send)
+    traced = upstream_app(client)
+    traced.middleware("http")(trace_request)
+    trace_id, caller_span = "a" * 32, "b" * 16
+    with TestClient(traced) as test_client:
+        response = test_client.get("/proxied", headers={"X-Trace-Id": trace_id, "X-Parent-Span-Id": caller_span})
+    tracing.flush()
+
+    span = json.loads(spans.read_text())
+    assert response.headers["x-trace-id"] == trace_id
+    assert span["traceId"] == trace_id and span["parentId"] == caller_span
+    assert span["name"] == "GET /proxied"
+    assert sent[0].headers["x-trace-id"] == trace_id
+    assert sent[0].headers["x-parent-span-id"] == span["id"]
+
+def test_requests_without_a_trace_start_one():
+    """Test that a request without a valid trace ID is given a new one"""
+    traced = FastAPI()
+    traced.middleware("http")(trace_request)
+
+    @traced.get("/health")
+    async def health():
+        return "ok"
+
+    with TestClient(traced) as test_client:
+        response = test_client.get("/health", headers={"X-Trace-Id": "not-a-trace-id"})
+
+    assert len(response.headers["x-trace-id"]) == 32
+    assert response.headers["x-trace-id"] != "not-a-trace-id"
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,162 @@
+"""
+Request tracing for the gateway.
+
+Every request is given a trace ID (or keeps the one it arrived with), which is passed to the
+upstream services in the X-Trace-Id header along with the ID of the gateway's span, so the
+spans each service records for a submission can be joined up. Spans are exported as Zipkin
+JSON to TRACE_EXPORT_URL - a Zipkin compatible collector (http://.../api/v2/spans) or a file
+(file:///path, one span per line).
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+from typing import NamedTuple, Optional
+
+from config import config
+
+SERVICE_NAME = "gateway"
+TRACE_HEADER = "X-Trace-Id"
+PARENT_SPAN_HEADER = "X-Parent-Span-Id"
+
+# Seconds between exports of finished spans
+FLUSH_INTERVAL = 1.0
+
+logger = logging.getLogger("gateway")
+
+_HEX_ID = re.compile(r"^[0-9a-f]{16}([0-9a-f]{16})?$")
+
+
+class TraceContext(NamedTuple):
+    trace_id: str
+    span_id: Optional[str] = None
+
+
+def _new_id(length: int) -> str:
+    return os.urandom(length // 2).hex()
+
+
+def context_from_headers(headers) -> Optional[TraceContext]:
+    """Return the trace context sent by the caller, or None if there isn't a valid one."""
+    trace_id = (headers.get(TRACE_HEADER) or "").lower()
+    if not _HEX_ID.match(trace_id):
+        return None
+    parent = (headers.get(PARENT_SPAN_HEADER) or "").lower()
+    return TraceContext(trace_id, parent if _HEX_ID.match(parent) else None)
+
+
+def context_headers(context: Optional[TraceContext]) -> dict:
+    """Return the headers which pass a trace context on to another service."""
+    if context is None:
+        return {}
+    headers = {TRACE_HEADER: context.trace_id}
+    if context.span_id:
+        headers[PARENT_SPAN_HEADER] = context.span_id
+    return headers
+
+
+class Span:
+    """
+    A timed operation within a trace, exported when it finishes. Used as a context manager,
+    or finished explicitly with `finish`.
+    """
+
+    def __init__(self, name: str, parent: Optional[TraceContext] = None, tags: Optional[dict] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else _new_id(32)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.id = _new_id(16)
+        self.tags = dict(tags or {})
+        self.timestamp = time.time()
+        self._started = time.perf_counter()
+
+    @property
+    def context(self) -> TraceContext:
+        """The context for spans (and services) called within this span."""
+        return TraceContext(self.trace_id, self.id)
+
+    def tag(self, key: str, value):
+        self.tags[key] = value
+
+    def finish(self):
+        record(self.name, self.context, self.parent_id, self.timestamp, time.perf_counter() - self._started, self.tags)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.tag("error", exc_type.__name__)
+        self.finish()
+
+
+def record(name: str, context: TraceContext, parent_id: Optional[str], timestamp: float, duration: float, tags: Optional[dict] = None):
+    """Export a span which has already finished, given its start time and duration in seconds."""
+    if not config.TRACE_EXPORT_URL:
+        return
+    span = {
+        "traceId": context.trace_id,
+        "id": context.span_id,
+        "name": name,
+        "timestamp": int(timestamp * 1_000_000),
+        "duration": max(1, int(duration * 1_000_000)),
+        "localEndpoint": {"serviceName": SERVICE_NAME},
+        "tags": {k: str(v) for k, v in (tags or {}).items()},
+    }
+    if parent_id:
+        span["parentId"] = parent_id
+    _exporter.add(span)
+
+
+class _Exporter:
+    """Buffers finished spans and exports them from a background thread."""
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def add(self, span: dict):
+        with self._lock:
+            self._spans.append(span)
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if not spans:
+            return
+        url = config.TRACE_EXPORT_URL
+        try:
+            if url.startswith("file://"):
+                with open(url[len("file://"):], "a") as f:
+                    f.writelines(json.dumps(span) + "\n" for span in spans)
+            else:
+                request = urllib.request.Request(
+                    url, data=json.dumps(spans).encode(), headers={"Content-Type": "application/json"}
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            logger.warning("Failed to export spans", extra={"fields": {"spans": len(spans), "error": str(e)}})
+
+
+_exporter = _Exporter()
+
+
+def flush():
+    """Export any buffered spans now, e.g. before the process exits."""
+    _exporter.flush()
+
@@ -1,2 +1,3 @@
 from ..routes.healthroute import healthrouter
-from ..routes.problemroute import problemrouter
\ No newline at end of file
+from ..routes.problemroute import problemrouter
+from ..routes.metricsroute import metricsrouter
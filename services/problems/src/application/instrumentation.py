@@ -0,0 +1,48 @@
+# Prometheus metrics and structured logging for the problems service
+
+import json, logging, os, sys, time
+from fastapi import Request
+from prometheus_client import Histogram
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+REQUEST_LATENCY = Histogram(
+    "problems_request_duration_seconds",
+    "Time to handle a request, until the response headers are sent",
+    ["method", "route", "status"],
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as single line JSON objects, including any `fields` passed in extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+
+
+async def record_request_latency(request: Request, call_next):
+    # Recorded by route template, so that each problem doesn't get its own series
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
@@ -1,9 +1,30 @@
+import asyncio, logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from problems.src.application import healthrouter, problemrouter
+from problems.src.application import healthrouter, metricsrouter, problemrouter
+from problems.src.application.instrumentation import configure_logging, record_request_latency
+from problems.src.models import AsyncSessionLocal
+from problems.src.models.catalogue import catalogue
 
+configure_logging()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the problem catalogue into memory and keep it up to date
+    try:
+        async with AsyncSessionLocal() as db:
+            await catalogue.load(db)
+    except Exception as e:
+        # Loaded on the first request instead
+        logging.getLogger("Problem catalogue").warning(f"Failed to load the problem catalogue: {e}")
+    refresher = asyncio.create_task(catalogue.refresh_forever())
+    yield
+    refresher.cancel()
+
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(record_request_latency)
 
 app.include_router(healthrouter)
 app.include_router(problemrouter)
-
+app.include_router(metricsrouter)
@@ -1,3 +1,3 @@
-from .database import get_db, Base
+from .database import get_db, Base, AsyncSessionLocal
 from .dbmodels import Problems
 from . import crud, dbmodels, schemas
\ No newline at end of file
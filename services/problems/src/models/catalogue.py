@@ -0,0 +1,109 @@
+# In-memory problem catalogue with precomputed responses
+
+import asyncio, hashlib, json, logging, os
+from typing import Dict, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud, schemas
+from .database import AsyncSessionLocal
+
+CATALOGUE_REFRESH_SECONDS = int(os.getenv("CATALOGUE_REFRESH_SECONDS", "60"))
+
+logger = logging.getLogger("Problem catalogue")
+
+
+def _serialise(content) -> bytes:
+    # Same encoding as FastAPI's JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _visible_test_cases(problem_id: str, test_cases: str) -> str:
+    # Hidden test cases are only needed by the submission service, not by clients browsing problems
+    try:
+        tests = json.loads(test_cases)
+    except ValueError:
+        return test_cases
+    if not isinstance(tests, list):
+        logger.warning(f"Test cases of problem {problem_id} are not a list, so none are listed")
+        return "[]"
+    visible = []
+    for number, test in enumerate(tests):
+        if not isinstance(test, dict):
+            # Without a hidden flag it can't be shown safely
+            logger.warning(f"Skipping test case {number} of problem {problem_id}, which is not an object")
+            continue
+        if str(test.get("hidden", False)).lower() != "true":
+            visible.append(test)
+    return json.dumps(visible)
+
+
+class Catalogue:
+    """
+    Holds every problem in memory, with the JSON body and ETag of the list response and
+    each detail response computed once per change rather than on every request.
+    """
+
+    def __init__(self):
+        self.list_response: Optional[Tuple[bytes, str]] = None
+        self.detail_responses: Dict[str, Tuple[bytes, str]] = {}
+        self.version: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    async def load(self, db: AsyncSession) -> bool:
+        """Reload the catalogue from the database, returning whether it changed."""
+        async with self._lock:
+            problems = await crud.get_problems(db)
+            details = {}
+            listing = []
+            for prob in problems:
+                detail = schemas.Problem_Response(
+                    problem_id=prob.problem_id,
+                    problem_title=prob.problem_title,
+                    difficulty=prob.difficulty,
+                    topics=prob.topics,
+                    description=prob.description,
+                    examples=prob.examples,
+                    constraints= prob.constraints,
+                    function_name=prob.function_name,
+                    return_type=prob.return_type,
+                    test_cases=prob.test_cases,
+                    hint=prob.hint,
+                    created_at=prob.created_at.isoformat(timespec='seconds')).dict()
+                body = _serialise(detail)
+                details[prob.problem_id] = (body, _etag(body))
+                listing.append({**detail, "test_cases": _visible_test_cases(prob.problem_id, prob.test_cases)})
+
+            list_body = _serialise(listing)
+            version = _etag(list_body + b"".join(etag.encode() for _, etag in details.values()))
+            if version == self.version:
+                return False
+
+            self.detail_responses = details
+            self.list_response = (list_body, _etag(list_body)) if listing else None
+            self.version = version
+            logger.info(f"Loaded {len(details)} problems into the catalogue")
+            return True
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if not self.loaded:
+            await self.load(db)
+
+    async def refresh_forever(self, interval: int = CATALOGUE_REFRESH_SECONDS):
+        """Periodically reload the catalogue so that changes to problems are picked up."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.load(db)
+            except Exception as e:
+                logger.warning(f"Failed to refresh the problem catalogue: {e}")
+
+
+catalogue = Catalogue()
@@ -8,7 +8,10 @@ SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI")
 if not SQLALCHEMY_DATABASE_URI:
     raise RuntimeError("SQLALCHEMY_DATABASE_URI is not set in environment...")
 
-engine = create_async_engine(SQLALCHEMY_DATABASE_URI, echo=True, pool_size=15, max_overflow=15)
+# Log every query only when SQL_ECHO is set
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+engine = create_async_engine(SQLALCHEMY_DATABASE_URI, echo=SQL_ECHO, pool_size=15, max_overflow=15)
 AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
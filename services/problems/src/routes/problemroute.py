@@ -1,48 +1,35 @@
+import os
 from fastapi import APIRouter, Request, Depends
-from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi.responses import PlainTextResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from problems.src.models import crud, get_db, schemas
+from problems.src.models import get_db
+from problems.src.models.catalogue import catalogue
 
 problemrouter = APIRouter()
 
+CACHE_CONTROL = f"public, max-age={int(os.getenv('PROBLEMS_CACHE_MAX_AGE', '60'))}"
+
+
+def cached_response(request: Request, body: bytes, etag: str) -> Response:
+    # Serve a precomputed body, or 304 if the client already has this version
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(status_code=200, content=body, media_type="application/json", headers=headers)
+
 
 @problemrouter.get("/problems/{id}") 
-async def get_problem(id: str, db: AsyncSession = Depends(get_db)):
-    prob = await crud.get_problem(db, id)
-    if prob is None:
+async def get_problem(id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    await catalogue.ensure_loaded(db)
+    detail = catalogue.detail_responses.get(id)
+    if detail is None:
         return PlainTextResponse(status_code=404, content="Problem not found.")
-    
-    result = schemas.Problem_Response(
-        problem_id=prob.problem_id,
-        problem_title=prob.problem_title,
-        difficulty=prob.difficulty,
-        topics=prob.topics,
-        description=prob.description,
-        examples=prob.examples,
-        constraints= prob.constraints,
-        function_name=prob.function_name,
-        return_type=prob.return_type,
-        test_cases=prob.test_cases,
-        hint=prob.hint,
-        created_at=prob.created_at.isoformat(timespec='seconds'))
-    return JSONResponse(status_code=200, content=result.dict()) 
+    return cached_response(request, *detail)
 
 @problemrouter.get("/problems")
-async def get_problems(db: AsyncSession = Depends(get_db)):
-    problems = await crud.get_problems(db)
-    if not problems:
+async def get_problems(request: Request, db: AsyncSession = Depends(get_db)):
+    await catalogue.ensure_loaded(db)
+    if catalogue.list_response is None:
         return PlainTextResponse(status_code=404, content="No problems found.")
-    result = [schemas.Problem_Response(
-        problem_id=prob.problem_id,
-        problem_title=prob.problem_title,
-        difficulty=prob.difficulty,
-        topics=prob.topics,
-        description=prob.description,
-        examples=prob.examples,
-        constraints= prob.constraints,
-        function_name=prob.function_name,
-        return_type=prob.return_type,
-        test_cases=prob.test_cases,
-        hint=prob.hint,
-        created_at=prob.created_at.isoformat(timespec='seconds')) for prob in problems]
-    return JSONResponse(content=[r.dict() for r in result], status_code=200)
\ No newline at end of file
+    return cached_response(request, *catalogue.list_response)
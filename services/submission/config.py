@@ -3,9 +3,9 @@ import os, sys
 
 load_dotenv()
 
-def get_env(key: str) -> str:
+def get_env(key: str, default: str = None) -> str:
     """Retrieve the environment variable value for the given key."""
-    value = os.environ.get(key)
+    value = os.environ.get(key, default)
     if value is None:
         print(f"Error: Environment variable '{key}' is not set.")
         sys.exit(1)
@@ -19,5 +19,28 @@ class Config:
         self.PYTHON_QUEUE_NAME = get_env("PYTHON_QUEUE_NAME")
         self.GROQ_API_KEY = get_env("GROQ_API_KEY")
         self.CELERY_BROKER_URL = get_env("CELERY_BROKER_URL")
+        self.LOG_LEVEL = get_env("LOG_LEVEL", "INFO")
+        # Where to export trace spans - a Zipkin collector URL or file:///path (disabled if empty)
+        self.TRACE_EXPORT_URL = get_env("TRACE_EXPORT_URL", "")
+        self.PROBLEM_CACHE_SIZE = int(get_env("PROBLEM_CACHE_SIZE", "256"))
+        self.PROBLEM_CACHE_TTL = float(get_env("PROBLEM_CACHE_TTL", "300"))
+        self.PROBLEM_CACHE_REDIS_URL = get_env("PROBLEM_CACHE_REDIS_URL", "")
+        # Streaming submission results - Redis the subscriber publishes result events to
+        self.RESULTS_REDIS_URL = get_env("RESULTS_REDIS_URL", "")
+        self.STREAM_TIMEOUT = float(get_env("STREAM_TIMEOUT", "300"))
+        self.STREAM_RESYNC_SECONDS = float(get_env("STREAM_RESYNC_SECONDS", "5"))
+        # Connection pool for the problems service
+        self.PROBLEMS_MAX_CONNECTIONS = int(get_env("PROBLEMS_MAX_CONNECTIONS", "100"))
+        self.PROBLEMS_MAX_KEEPALIVE = int(get_env("PROBLEMS_MAX_KEEPALIVE", "20"))
+        self.PROBLEMS_KEEPALIVE_EXPIRY = float(get_env("PROBLEMS_KEEPALIVE_EXPIRY", "30"))
+        # Staging test suites in the execution service's Redis, so submissions reference them
+        # instead of carrying every test case (disabled if empty)
+        self.SUITE_REDIS_URL = get_env("SUITE_REDIS_URL", "")
+        self.SUITE_TTL = float(get_env("SUITE_TTL", "604800"))
+        # Whether execution stops at the first failed test when a submission doesn't say
+        self.FAIL_FAST_DEFAULT = get_env("FAIL_FAST_DEFAULT", "false").lower() == "true"
+        # Reusing the results of identical submissions to the same tests instead of executing them
+        self.RESULT_CACHE_ENABLED = get_env("RESULT_CACHE_ENABLED", "true").lower() == "true"
+        self.RESULT_CACHE_ATTACH_WINDOW = float(get_env("RESULT_CACHE_ATTACH_WINDOW", "300"))
 
 config = Config()
\ No newline at end of file
@@ -1,6 +1,7 @@
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from config import config
-from models import Base
+from models import Base, Submission
 
 engine = create_async_engine(config.SUBMISSION_DATABASE_URL)
 AsyncSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
@@ -12,3 +13,12 @@ async def get_session() -> AsyncSession:
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all doesn't alter existing tables, so add columns added since they were created
+        for column in (Submission.code_hash, Submission.duplicate_of):
+            await conn.execute(text(
+                f"ALTER TABLE {Submission.__tablename__} ADD COLUMN IF NOT EXISTS "
+                f"{column.name} {column.type.compile(dialect=conn.dialect)}"
+            ))
+        # create_all only creates indexes with new tables, so add any missing from existing ones
+        for index in Submission.__table__.indexes:
+            await conn.run_sync(index.create, checkfirst=True)
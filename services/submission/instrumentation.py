@@ -0,0 +1,96 @@
+"""
+Prometheus metrics and structured logging for the submission service.
+"""
+
+import json
+import logging
+import sys
+import time
+from typing import Callable, Dict
+
+from fastapi import Request
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    "submission_request_duration_seconds",
+    "Time to handle a request, until the response headers are sent",
+    ["method", "route", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "submission_upstream_duration_seconds",
+    "Time taken by calls to other services",
+    ["upstream", "status"],
+)
+QUEUE_PUBLISH_LATENCY = Histogram(
+    "submission_queue_publish_duration_seconds",
+    "Time taken to publish a submission to an execution queue",
+    ["queue"],
+)
+RESULT_CACHE = Counter(
+    "submission_result_cache_total",
+    "Submissions by result cache outcome - miss, hit (results copied) or attached (execution shared)",
+    ["outcome"],
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as single line JSON objects, including any `fields` passed in extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str):
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, root.level))
+
+
+class StatsCollector:
+    """
+    Exposes the stats dictionaries of caches and connection pools as gauges, read when
+    metrics are scraped. `sources` returns {metric name: {label value: stats}}.
+    """
+
+    def __init__(self, label: str, sources: Callable[[], Dict[str, dict]]):
+        self.label = label
+        self.sources = sources
+
+    def collect(self):
+        for name, groups in self.sources().items():
+            family = GaugeMetricFamily(name, f"Submission service {name.replace('_', ' ')}", labels=[self.label, "stat"])
+            for label, stats in groups.items():
+                for stat, value in (stats or {}).items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        family.add_metric([label, stat], value)
+            yield family
+
+
+async def record_request_latency(request: Request, call_next):
+    """Middleware recording the time taken to handle each request, by route template."""
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
+
+
+def metrics_response() -> Response:
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
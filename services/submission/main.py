@@ -1,11 +1,16 @@
 from fastapi import FastAPI, Request, Depends
-from fastapi.responses import JSONResponse
-from fastapi import Depends, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import tuple_
+from sqlalchemy.orm import load_only
+from datetime import datetime
+from typing import Optional
+import base64, json, uuid
 from config import config
 import httpx
-import json
 from contextlib import asynccontextmanager
 from database import create_tables, get_session
 from q import celery_client, send
@@ -13,22 +18,83 @@ from validation import clean_code
 from models import Submission
 from groq import AsyncGroq
 from feedback import get_ai_feedback
+from problem_cache import ProblemCache, ProblemFetchError, CachedProblem
+from redis.asyncio import Redis
+from results_stream import load_results, submission_events
+from instrumentation import configure_logging, metrics_response, record_request_latency, StatsCollector, UPSTREAM_LATENCY, RESULT_CACHE
+from result_cache import code_hash, find_previous, complete_if_finished
+from suite_staging import SuiteStager
+from tracing import Span, trace_request
+import tracing
+from prometheus_client import REGISTRY
+import logging
+import time
+
+configure_logging(config.LOG_LEVEL)
+logger = logging.getLogger("submission")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_tables()
-    app.state.http_client = httpx.AsyncClient()
+    # Problems are fetched behind the problem cache, so this pool only needs tuned limits
+    app.state.http_client = httpx.AsyncClient(limits=httpx.Limits(
+        max_connections=config.PROBLEMS_MAX_CONNECTIONS,
+        max_keepalive_connections=config.PROBLEMS_MAX_KEEPALIVE,
+        keepalive_expiry=config.PROBLEMS_KEEPALIVE_EXPIRY,
+    ))
     app.state.celery = celery_client
     app.state.groq = AsyncGroq(api_key=config.GROQ_API_KEY)
+    redis_client = Redis.from_url(config.PROBLEM_CACHE_REDIS_URL) if config.PROBLEM_CACHE_REDIS_URL else None
+    app.state.problem_cache = ProblemCache(
+        config.PROBLEMS_SERVICE_URL,
+        config.PROBLEM_CACHE_SIZE,
+        config.PROBLEM_CACHE_TTL,
+        redis_client
+    )
+    app.state.results_redis = Redis.from_url(config.RESULTS_REDIS_URL) if config.RESULTS_REDIS_URL else None
+    suite_redis = Redis.from_url(config.SUITE_REDIS_URL) if config.SUITE_REDIS_URL else None
+    app.state.suite_stager = SuiteStager(suite_redis, config.SUITE_TTL) if suite_redis is not None else None
+    stats_collector = StatsCollector("source", lambda: {
+        "submission_problem_cache": {"problems": app.state.problem_cache.stats()},
+    })
+    REGISTRY.register(stats_collector)
     yield
+    REGISTRY.unregister(stats_collector)
     await app.state.http_client.aclose()
+    if redis_client is not None:
+        await redis_client.aclose()
+    if app.state.results_redis is not None:
+        await app.state.results_redis.aclose()
+    if suite_redis is not None:
+        await suite_redis.aclose()
+    tracing.flush()
 
 app = FastAPI(title="OpenJudge API Gateway", lifespan=lifespan)
+app.middleware("http")(record_request_latency)
+app.middleware("http")(trace_request)
 
 @app.get("/health")
 async def health_check():
     return "Submissions service operational"
 
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+@app.get("/cache/stats")
+async def cache_stats(request: Request):
+    return request.app.state.problem_cache.stats()
+
+async def get_problem(request: Request, problem_id: str) -> CachedProblem:
+    """Return the problem from the problem cache, raising an HTTPException if it cannot be found."""
+    try:
+        cached = await request.app.state.problem_cache.get(request.app.state.http_client, problem_id)
+    except (ProblemFetchError, httpx.HTTPError):
+        raise HTTPException(status_code=502, detail="Problems service error")
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    return cached
+
 @app.post("/submission")
 async def submit_code(request: Request, session: AsyncSession = Depends(get_session)):
     try:
@@ -37,6 +103,7 @@ async def submit_code(request: Request, session: AsyncSession = Depends(get_sess
         problem_id = data.get("problem_id")
         language = data.get("language", "").lower()
         code = data.get("code", "")
+        fail_fast = data.get("fail_fast", config.FAIL_FAST_DEFAULT)
         if not code or code == "":
             raise HTTPException(status_code=400, detail="Please provide or edit the stub before submitting")
         
@@ -45,54 +112,86 @@ async def submit_code(request: Request, session: AsyncSession = Depends(get_sess
         
         if language not in ["python", "java"]:
             raise HTTPException(status_code=400, detail="Unsupported language")
+
+        if not isinstance(fail_fast, bool):
+            raise HTTPException(status_code=400, detail="fail_fast must be a boolean")
     
         try:
             clean_code(code, language)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=f"Code validation failed: {str(e)}")
         
-        client = request.app.state.http_client
-        response = await client.get(f"{config.PROBLEMS_SERVICE_URL}/problems/{problem_id}")
-        if response.status_code != 200:
-            raise HTTPException(status_code=502, detail="Problems service error")
-        problem = response.json()
-        
-        if not problem:
-            raise HTTPException(status_code=404, detail="Problem not found")
-
-        tests = json.loads(problem["test_cases"])
-        inputs = [test["input"] for test in tests]
-        outputs = [json.dumps(test["output"]) for test in tests]
+        with Span("fetch problem", request.state.trace, {"problem_id": problem_id}):
+            cached = await get_problem(request, problem_id)
+        problem = cached.problem
+        inputs, outputs = cached.inputs, cached.outputs
 
         submission = Submission(
             user_id=user_id,
             problem_id=problem_id,
             function_name=problem["function_name"],
             language=language,
-            num_tests=len(tests),
+            num_tests=len(inputs),
             code=code,
+            code_hash=code_hash(language, code, problem_id, cached.suite_version, problem["function_name"], fail_fast),
             results=[],
             status="pending"
         )
-        session.add(submission)
-        await session.commit()
-
-        send(
-            submission_id=str(submission.submission_id),
-            submission_code=code,
-            inputs=inputs,
-            outputs=outputs,
-            function_name=problem["function_name"],
-            queue=language,
-            client=request.app.state.celery
-        )
+
+        previous = None
+        if config.RESULT_CACHE_ENABLED:
+            with Span("result cache lookup", request.state.trace) as span:
+                previous = await find_previous(session, submission.code_hash)
+                span.tag("hit", previous is not None)
+        if previous is not None:
+            # Finished results are copied, while a pending execution is shared with the
+            # subscriber completing this submission along with the previous one
+            submission.duplicate_of = previous.submission_id
+            submission.status = previous.status
+            submission.results = list(previous.results or [])
+            outcome = "attached" if previous.status == "pending" else "hit"
+            RESULT_CACHE.labels(outcome).inc()
+        elif config.RESULT_CACHE_ENABLED:
+            RESULT_CACHE.labels("miss").inc()
+
+        with Span("store submission", request.state.trace):
+            session.add(submission)
+            await session.commit()
+
+        if previous is not None:
+            if outcome == "attached":
+                await complete_if_finished(session, submission, previous)
+            logger.info("Reused results of identical submission", extra={"fields": {
+                "submission_id": submission.submission_id, "duplicate_of": previous.submission_id, "outcome": outcome
+            }})
+            return JSONResponse(status_code=201, content={"submission_id": str(submission.submission_id), "status": submission.status})
+
+        suite = None
+        if request.app.state.suite_stager is not None:
+            with Span("stage test suite", request.state.trace, {"version": cached.suite_version}):
+                suite = await request.app.state.suite_stager.stage(problem_id, cached)
+
+        with Span("queue publish", request.state.trace, {"submission_id": submission.submission_id, "queue": language}) as span:
+            send(
+                submission_id=str(submission.submission_id),
+                submission_code=code,
+                inputs=inputs,
+                outputs=outputs,
+                function_name=problem["function_name"],
+                queue=language,
+                client=request.app.state.celery,
+                hidden=cached.hidden,
+                trace=span.context,
+                fail_fast=fail_fast,
+                suite=suite
+            )
 
         return JSONResponse(status_code=201, content={"submission_id": str(submission.submission_id), "status": "pending"})
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[Error] Submission failed: {e}")
+        logger.exception("Submission failed")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/submission/{submission_id}")
@@ -107,29 +206,86 @@ async def get_submission(submission_id: str, session: AsyncSession = Depends(get
         if not submission:
             raise HTTPException(status_code=404, detail="Submission not found")
         
-        return submission.to_dict()
+        response = submission.to_dict()
+        response["results"] = await load_results(session, submission)
+        return response
+
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid submission ID format")
 
+@app.get("/submission/{submission_id}/stream")
+async def stream_submission(request: Request, submission_id: str, session: AsyncSession = Depends(get_session)):
+    try:
+        stmt = select(Submission.submission_id, Submission.duplicate_of).filter_by(submission_id=submission_id)
+        found = (await session.execute(stmt)).one_or_none()
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid submission ID format")
+    if not found:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    await session.close()
+
+    # Results of a submission sharing another's execution are published for that one
+    executed_id = str(found.duplicate_of) if found.duplicate_of else None
+    return StreamingResponse(
+        submission_events(submission_id, request.app.state.results_redis, executed_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def encode_cursor(submission: Submission) -> str:
+    """Encode the keyset position after a submission in the history as an opaque cursor."""
+    position = json.dumps([submission.created_at.isoformat(), str(submission.submission_id)])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, submission_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), uuid.UUID(submission_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.get("/submission/history/{user_id}")
-async def get_submission_history(user_id: str, session: AsyncSession = Depends(get_session)):
+async def get_submission_history(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: str = Query("summary", pattern="^(summary|full)$"),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Returns a page of a user's submissions, newest first. Summaries without the code and
+    results are returned unless fields=full. If there are more submissions, the
+    X-Next-Cursor header holds the cursor for the next page.
+    """
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID is required")
-    
+
+    stmt = select(Submission).filter_by(user_id=user_id)
+    if fields == "summary":
+        stmt = stmt.options(load_only(*Submission.summary_columns()))
+    if cursor:
+        stmt = stmt.where(tuple_(Submission.created_at, Submission.submission_id) < decode_cursor(cursor))
+    # One extra submission is fetched to tell whether there is another page
+    stmt = stmt.order_by(Submission.created_at.desc(), Submission.submission_id.desc()).limit(limit + 1)
+
     try:
-        stmt = select(Submission).filter_by(user_id=user_id).order_by(Submission.created_at.desc())
         result = await session.execute(stmt)
         submissions = result.scalars().all()
         
     except Exception as e:
-        print(f"[Error] Failed to retrieve submissions: {e}")
+        logger.exception("Failed to retrieve submissions")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-    if not submissions:
+    if not submissions and not cursor:
         raise HTTPException(status_code=404, detail="No submissions found for this user")
 
-    return [submission.to_dict() for submission in submissions]
+    page = submissions[:limit]
+    headers = {"X-Next-Cursor": encode_cursor(page[-1])} if len(submissions) > limit else {}
+    content = [
+        submission.to_dict() if fields == "full" else submission.to_summary()
+        for submission in page
+    ]
+    return JSONResponse(content=jsonable_encoder(content), headers=headers)
 
 @app.get("/submission/ai/{submission_id}")
 async def get_submission_ai(request: Request, submission_id: str, session: AsyncSession = Depends(get_session)):
@@ -141,7 +297,7 @@ async def get_submission_ai(request: Request, submission_id: str, session: Async
         result = await session.execute(stmt)
         submission = result.scalar_one_or_none()
     except Exception as e:
-        print(f"[Error] Failed to retrieve submission: {e}")
+        logger.exception("Failed to retrieve submission")
         raise HTTPException(status_code=500, detail="Internal server error")
 
     if not submission:
@@ -153,20 +309,11 @@ async def get_submission_ai(request: Request, submission_id: str, session: Async
     if submission.status == "passed":
         raise HTTPException(status_code=400, detail="Submission correct")
     
-    client = request.app.state.http_client
-    response = await client.get(f"{config.PROBLEMS_SERVICE_URL}/problems/{submission.problem_id}")
-    if response.status_code != 200:
-        raise HTTPException(status_code=502, detail="Problems service error")
-    problem = response.json()
-    
-    if not problem:
-        raise HTTPException(status_code=404, detail="Problem not found")
+    problem = (await get_problem(request, submission.problem_id)).problem
     
-    print(f"[Info] Fetching AI feedback for submission {submission_id}")
-    print(f"[Info] Submission code: {submission.code}")
-    print(f"[Info] Problem description: {problem['description']}")
-    print(f"[Info] Examples: {problem['examples']}")
+    logger.info("Fetching AI feedback", extra={"fields": {"submission_id": submission_id}})
 
+    start = time.perf_counter()
     try:
         response = await get_ai_feedback(
             submission.code,
@@ -174,7 +321,9 @@ async def get_submission_ai(request: Request, submission_id: str, session: Async
             problem["examples"],
             app.state.groq
         )
+        UPSTREAM_LATENCY.labels("groq", "200").observe(time.perf_counter() - start)
         return response
     except Exception as e:
-        print(f"[Error] AI feedback failed: {e}")
+        UPSTREAM_LATENCY.labels("groq", "error").observe(time.perf_counter() - start)
+        logger.exception("AI feedback failed")
         raise HTTPException(status_code=502, detail="AI feedback service error")
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+from instrumentation import UPSTREAM_LATENCY
+
+logger = logging.getLogger("submission")
+
+
+class ProblemFetchError(Exception):
+    """Raised when the problems service returns an unexpected response."""
+    def __init__(self, status_code: int):
+        super().__init__(f"Problems service returned {status_code}")
+        self.status_code = status_code
+
+
+@dataclass
+class CachedProblem:
+    problem: dict
+    inputs: list
+    outputs: list
+    hidden: list
+    suite_version: str
+    etag: Optional[str]
+    expires_at: float
+
+
+def _build_entry(problem: dict, etag: Optional[str], ttl: float) -> CachedProblem:
+    """Parse a problem's test cases once, for reuse by every submission to it."""
+    tests = json.loads(problem["test_cases"])
+    return CachedProblem(
+        problem=problem,
+        inputs=[test["input"] for test in tests],
+        outputs=[json.dumps(test["output"]) for test in tests],
+        hidden=[str(test.get("hidden", False)).lower() == "true" for test in tests],
+        suite_version=hashlib.sha256(problem["test_cases"].encode()).hexdigest()[:16],
+        etag=etag,
+        expires_at=time.monotonic() + ttl,
+    )
+
+
+class ProblemCache:
+    """
+    LRU cache of parsed problems from the problems service, keyed by problem_id.
+
+    Entries are fresh for `ttl` seconds, after which they are revalidated with
+    If-None-Match when the problems service provided an ETag. Concurrent misses for
+    the same problem share a single request. If a Redis client is given, problems are
+    also shared between instances through Redis.
+    """
+
+    def __init__(self, base_url: str, max_size: int, ttl: float, redis=None):
+        self.base_url = base_url
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis = redis
+
+        self._entries: "OrderedDict[str, CachedProblem]" = OrderedDict()
+        self._inflight: dict = {}
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.redis_hits = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def get(self, client: httpx.AsyncClient, problem_id: str) -> Optional[CachedProblem]:
+        """
+        Return the problem with the given ID, or None if it does not exist.
+
+        Raises:
+            ProblemFetchError: If the problems service returns an unexpected response.
+        """
+        entry = self._entries.get(problem_id)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(problem_id)
+            return entry
+
+        task = self._inflight.get(problem_id)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._load(client, problem_id, entry))
+        self._inflight[problem_id] = task
+        task.add_done_callback(lambda _: self._inflight.pop(problem_id, None))
+        return await asyncio.shield(task)
+
+    def invalidate(self, problem_id: str):
+        self._entries.pop(problem_id, None)
+
+    def stats(self) -> dict:
+        # Lookups served without a request to the problems service count as hits
+        served = self.hits + self.coalesced + self.redis_hits
+        lookups = served + self.misses + self.revalidated
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "redis_hits": self.redis_hits,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": served / lookups if lookups else 0.0,
+        }
+
+    async def _load(self, client: httpx.AsyncClient, problem_id: str, stale: Optional[CachedProblem]) -> Optional[CachedProblem]:
+        if stale is None:
+            shared = await self._get_shared(problem_id)
+            if shared is not None:
+                self.redis_hits += 1
+                self._store(problem_id, shared)
+                return shared
+
+        headers = {"If-None-Match": stale.etag} if stale is not None and stale.etag else {}
+        start = time.perf_counter()
+        response = await client.get(f"{self.base_url}/problems/{problem_id}", headers=headers)
+        UPSTREAM_LATENCY.labels("problems", str(response.status_code)).observe(time.perf_counter() - start)
+
+        if response.status_code == 304 and stale is not None:
+            self.revalidated += 1
+            stale.expires_at = time.monotonic() + self.ttl
+            self._store(problem_id, stale)
+            return stale
+
+        self.misses += 1
+        if response.status_code == 404:
+            self.invalidate(problem_id)
+            return None
+        if response.status_code != 200:
+            raise ProblemFetchError(response.status_code)
+
+        problem = response.json()
+        if not problem:
+            return None
+        etag = response.headers.get("etag")
+        entry = _build_entry(problem, etag, self.ttl)
+        self._store(problem_id, entry)
+        await self._set_shared(problem_id, problem, etag)
+        return entry
+
+    def _store(self, problem_id: str, entry: CachedProblem):
+        self._entries[problem_id] = entry
+        self._entries.move_to_end(problem_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _get_shared(self, problem_id: str) -> Optional[CachedProblem]:
+        if self.redis is None:
+            return None
+        try:
+            cached = await self.redis.get(f"problem:{problem_id}")
+        except Exception as e:
+            logger.warning("Problem cache Redis read failed", extra={"fields": {"error": str(e)}})
+            return None
+        if cached is None:
+            return None
+        cached = json.loads(cached)
+        return _build_entry(cached["problem"], cached.get("etag"), self.ttl)
+
+    async def _set_shared(self, problem_id: str, problem: dict, etag: Optional[str]):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                f"problem:{problem_id}",
+                json.dumps({"problem": problem, "etag": etag}),
+                ex=max(1, int(self.ttl)),
+            )
+        except Exception as e:
+            logger.warning("Problem cache Redis write failed", extra={"fields": {"error": str(e)}})
@@ -1,5 +1,7 @@
 from celery import Celery
 from config import config
+from instrumentation import QUEUE_PUBLISH_LATENCY
+from tracing import task_headers
 
 celery_client = Celery("Publisher")
 
@@ -10,12 +12,19 @@ celery_client.conf.update(
     broker_url=config.CELERY_BROKER_URL,
 )
 
-def send(submission_id, submission_code, inputs, outputs, function_name, queue, client):
-    """Send a task to the specified queue."""
+def send(submission_id, submission_code, inputs, outputs, function_name, queue, client, hidden=None, trace=None, fail_fast=False, suite=None):
+    """
+    Send a task to the specified queue, continuing the given trace context in the execution service.
+    With fail_fast, execution stops at the first failed test. If a reference to the staged test
+    suite is given, it is sent instead of the inputs, outputs and hidden flags.
+    """
     queue = config.PYTHON_QUEUE_NAME if queue == "python" else config.JAVA_QUEUE_NAME
-    client.send_task("execute_submission", args=[
-        submission_id,
-        submission_code,
-        inputs,
-        outputs,
-        function_name], queue=queue)
+    if suite is not None:
+        inputs, outputs, hidden = None, None, None
+    with QUEUE_PUBLISH_LATENCY.labels(queue).time():
+        client.send_task("execute_submission", args=[
+            submission_id,
+            submission_code,
+            inputs,
+            outputs,
+            function_name], kwargs={"hidden": hidden, "fail_fast": fail_fast, "suite": suite}, queue=queue, headers=task_headers(trace))
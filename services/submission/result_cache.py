@@ -0,0 +1,88 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.future import select
+
+from config import config
+from models import Submission
+
+
+def normalize_code(code: str) -> str:
+    """
+    Normalize code so that resubmissions differing only in line endings, trailing
+    whitespace or surrounding blank lines are treated as identical. Indentation and
+    comments are kept, as removing them can change what the code does.
+    """
+    lines = [line.rstrip() for line in code.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def code_hash(language: str, code: str, problem_id: str, suite_version: str, function_name: str, fail_fast: bool = False) -> str:
+    """
+    Return the key identifying a submission's results: identical code in the same language,
+    run against the same version of a problem's tests, produces the same results. The
+    function name is included as the tests call it, and it can change when a problem is edited.
+    Fail fast submissions skip tests after a failure, so they are keyed separately.
+    """
+    parts = (language, problem_id, suite_version, function_name, normalize_code(code))
+    if fail_fast:
+        parts += ("fail_fast",)
+    key = "\0".join(parts)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+# Errors which depend on the load on the execution service or on the service itself rather
+# than on the code, so a rerun could produce different results
+NONDETERMINISTIC_ERRORS = {"timeout", "memory_limit_exceeded", "test_suite_unavailable"}
+
+
+def is_deterministic(results: list) -> bool:
+    """
+    Return whether a submission's results can be reused for identical code: none of its
+    tests hit a resource limit or failed because of the execution service itself.
+    """
+    return not any(
+        result.get("error") in NONDETERMINISTIC_ERRORS or result.get("runner_failed")
+        for result in results or [] if isinstance(result, dict)
+    )
+
+
+async def find_previous(session, key: str) -> Optional[Submission]:
+    """
+    Return the latest executed submission with the given code hash if it can be reused: a
+    finished one with deterministic results, which can be copied, or a pending one started
+    within RESULT_CACHE_ATTACH_WINDOW seconds, whose execution can be shared. Pending
+    submissions older than that are ignored in case their execution was lost. Otherwise the
+    submission is executed again, and its results are the latest for the code hash.
+    """
+    stmt = (
+        select(Submission)
+        .where(Submission.code_hash == key, Submission.duplicate_of.is_(None))
+        .order_by(Submission.created_at.desc())
+        .limit(1)
+    )
+    previous = (await session.execute(stmt)).scalar_one_or_none()
+    if previous is None:
+        return None
+    if previous.status != "pending":
+        return previous if is_deterministic(previous.results) else None
+    window = timedelta(seconds=config.RESULT_CACHE_ATTACH_WINDOW)
+    if previous.created_at is None or datetime.utcnow() - previous.created_at > window:
+        return None
+    return previous
+
+
+async def complete_if_finished(session, submission: Submission, previous: Submission):
+    """
+    Copy the results of the previous submission a new one is attached to if it finished
+    before the new one was stored, as the subscriber only completes the attached
+    submissions it sees when the previous one finishes.
+    """
+    await session.refresh(previous, ["status", "results"])
+    if previous.status == "pending":
+        return
+    # The subscriber may also have completed it, with the same results
+    submission.status = previous.status
+    submission.results = list(previous.results or [])
+    await session.commit()
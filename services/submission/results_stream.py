@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional, Tuple
+
+from sqlalchemy.future import select
+
+from config import config
+from database import AsyncSessionLocal
+from models import Submission, SubmissionResult
+
+# Seconds between keep-alive comments, so idle streams aren't closed by proxies
+HEARTBEAT_INTERVAL = 15
+
+
+def channel(submission_id: str) -> str:
+    """Return the pub/sub channel the subscriber publishes a submission's result events to."""
+    return f"submission:{submission_id}"
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def load_results(session, submission: Submission) -> list:
+    """Return a submission's results, including those stored so far for a pending submission."""
+    if submission.status != "pending":
+        return list(submission.results or [])
+    # Results are only aggregated onto the submission once every test has finished, and
+    # are stored under the submission being executed for one attached to its execution
+    stmt = (
+        select(SubmissionResult.result)
+        .filter_by(submission_id=submission.duplicate_of or submission.submission_id)
+        .order_by(SubmissionResult.test_number)
+    )
+    return list((await session.execute(stmt)).scalars().all())
+
+
+async def load_progress(submission_id: str) -> Tuple[Optional[str], list]:
+    """Return the status and results of a submission, using a short-lived session."""
+    async with AsyncSessionLocal() as session:
+        submission = (await session.execute(
+            select(Submission).filter_by(submission_id=submission_id)
+        )).scalar_one_or_none()
+        if submission is None:
+            return None, []
+        return submission.status, await load_results(session, submission)
+
+
+async def submission_events(submission_id: str, redis=None, executed_id: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Yield server-sent events for a submission: `results` events with test results as
+    they are stored, then a `complete` event with the final status. `executed_id` is the
+    submission whose execution produces the results, if it isn't this one.
+
+    The channel is subscribed to before the stored results are read, so no results
+    are missed, and results are deduplicated by test number. Stored results are
+    reread every STREAM_RESYNC_SECONDS (every second without Redis) in case an event
+    was lost.
+    """
+    pubsub = redis.pubsub() if redis is not None else None
+    resync_interval = config.STREAM_RESYNC_SECONDS if pubsub is not None else 1.0
+    sent = set()
+
+    def unsent(results: list) -> list:
+        new = [result for result in results if result.get("test_number") not in sent]
+        sent.update(result.get("test_number") for result in new)
+        return new
+
+    try:
+        if pubsub is not None:
+            await pubsub.subscribe(channel(executed_id or submission_id))
+
+        deadline = time.monotonic() + config.STREAM_TIMEOUT
+        last_sent = time.monotonic()
+        next_resync = 0.0
+        while time.monotonic() < deadline:
+            if time.monotonic() >= next_resync:
+                status, results = await load_progress(submission_id)
+                new = unsent(results)
+                if new:
+                    yield sse("results", new)
+                    last_sent = time.monotonic()
+                if status != "pending":
+                    yield sse("complete", {"status": status})
+                    return
+                next_resync = time.monotonic() + resync_interval
+
+            wait = max(0.0, min(next_resync, last_sent + HEARTBEAT_INTERVAL, deadline) - time.monotonic())
+            message = None
+            if pubsub is not None:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=wait)
+            else:
+                await asyncio.sleep(wait)
+
+            if message is not None:
+                event = json.loads(message["data"])
+                if event.get("type") == "results":
+                    new = unsent(event.get("results", []))
+                    if new:
+                        yield sse("results", new)
+                        last_sent = time.monotonic()
+                elif event.get("type") == "complete":
+                    # Resync to pick up any missed results before the final status
+                    next_resync = 0.0
+            elif time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+        yield sse("timeout", {"detail": "Submission is still being processed"})
+    finally:
+        if pubsub is not None:
+            await pubsub.aclose()
@@ -0,0 +1,56 @@
+import hashlib
+import json
+import logging
+from typing import Optional
+
+from problem_cache import CachedProblem
+
+logger = logging.getLogger("submission")
+
+
+def suite_key(problem_id: str, version: str) -> str:
+    """Return the Redis key a version of a problem's test suite is staged under."""
+    return f"suite:{problem_id}:{version}"
+
+
+class SuiteStager:
+    """
+    Stages problems' test suites in Redis for the execution service, so that submissions
+    are sent with a reference to their problem's suite rather than every test case.
+
+    Staged suites expire after `ttl` seconds without submissions. Each submission extends
+    its suite's TTL, restaging the suite if it has expired (or Redis lost it).
+    """
+
+    def __init__(self, redis, ttl: float):
+        self.redis = redis
+        self.ttl = max(1, int(ttl))
+        # Digests of the suites serialized by this instance, by key
+        self._digests = {}
+
+    async def stage(self, problem_id: str, cached: CachedProblem) -> Optional[dict]:
+        """
+        Return the reference to a problem's test suite, staging it first if needed, or None
+        if it could not be staged (and the tests should be sent with the submission).
+        """
+        key = suite_key(problem_id, cached.suite_version)
+        try:
+            staged = key in self._digests and await self.redis.expire(key, self.ttl)
+            if not staged:
+                payload = json.dumps({
+                    "inputs": cached.inputs,
+                    "outputs": cached.outputs,
+                    "hidden": cached.hidden,
+                }).encode()
+                await self.redis.set(key, payload, ex=self.ttl)
+                self._digests[key] = hashlib.sha256(payload).hexdigest()
+        except Exception as e:
+            logger.warning("Test suite staging failed", extra={"fields": {"problem_id": problem_id, "error": str(e)}})
+            return None
+        return {
+            "problem_id": problem_id,
+            "version": cached.suite_version,
+            # Lets the execution service check the suite it has cached
+            "digest": self._digests[key],
+            "num_tests": len(cached.inputs),
+        }
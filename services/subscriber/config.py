@@ -3,9 +3,9 @@ import os, sys
 
 load_dotenv()
 
-def get_env(key: str) -> str:
+def get_env(key: str, default: str = None) -> str:
     """Retrieve the environment variable value for the given key."""
-    value = os.environ.get(key)
+    value = os.environ.get(key, default)
     if value is None:
         print(f"Error: Environment variable '{key}' is not set.")
         sys.exit(1)
@@ -16,5 +16,17 @@ class Config:
         self.SUBMISSION_DATABASE_URL = get_env("SUBMISSION_DATABASE_URL")
         self.CELERY_BROKER_URL = get_env("CELERY_BROKER_URL")
         self.OUTPUT_QUEUE_NAME = get_env("OUTPUT_QUEUE_NAME")
+        self.DB_POOL_SIZE = int(get_env("DB_POOL_SIZE", "5"))
+        self.DB_MAX_OVERFLOW = int(get_env("DB_MAX_OVERFLOW", "5"))
+        self.DB_POOL_RECYCLE = int(get_env("DB_POOL_RECYCLE", "1800"))
+        self.DB_STATS_INTERVAL = int(get_env("DB_STATS_INTERVAL", "500"))
+        # Redis for publishing result events to clients streaming a submission (disabled if empty)
+        self.RESULTS_REDIS_URL = get_env("RESULTS_REDIS_URL", "")
+        self.LOG_LEVEL = get_env("LOG_LEVEL", "INFO")
+        # Where to export trace spans - a Zipkin collector URL or file:///path (disabled if empty)
+        self.TRACE_EXPORT_URL = get_env("TRACE_EXPORT_URL", "")
+        # Port to serve Prometheus metrics on (disabled if 0), and where worker processes record them
+        self.METRICS_PORT = int(get_env("METRICS_PORT", "9100"))
+        self.METRICS_DIR = get_env("METRICS_DIR", "/tmp/subscriber-metrics")
 
 config = Config()
\ No newline at end of file
@@ -1,7 +1,66 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from config import config
+from instrumentation import DB_CONNECTIONS, DB_CHECKOUTS
+import logging
+import os
+
+logger = logging.getLogger("subscriber")
+
+# Engine for this worker process, created on first use so that each forked Celery
+# worker process has its own connection pool
+_engine = None
+_session_factory = None
+_pid = None
+
+# Connection pool counters for this worker process
+_stats = {"connects": 0, "checkouts": 0}
+
+def _on_connect(dbapi_connection, connection_record):
+    _stats["connects"] += 1
+    DB_CONNECTIONS.inc()
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _stats["checkouts"] += 1
+    DB_CHECKOUTS.inc()
+    if config.DB_STATS_INTERVAL and _stats["checkouts"] % config.DB_STATS_INTERVAL == 0:
+        logger.info("Database pool stats", extra={"fields": pool_stats()})
+
+def get_engine():
+    """Return the engine for this worker process, creating it if needed."""
+    global _engine, _session_factory, _pid
+    if _engine is None or _pid != os.getpid():
+        _engine = create_async_engine(
+            config.SUBMISSION_DATABASE_URL,
+            echo=False,
+            future=True,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+        event.listen(_engine.sync_engine.pool, "connect", _on_connect)
+        event.listen(_engine.sync_engine.pool, "checkout", _on_checkout)
+        _session_factory = async_sessionmaker(bind=_engine, expire_on_commit=False, class_=AsyncSession)
+        _pid = os.getpid()
+    return _engine
 
 async def connect_db() -> AsyncSession:
-    engine = create_async_engine(config.SUBMISSION_DATABASE_URL, echo=False, future=True, pool_size=2, max_overflow=0)
-    async_session = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
-    return async_session()
\ No newline at end of file
+    get_engine()
+    return _session_factory()
+
+def pool_stats() -> dict:
+    """Return connection counters for this worker process - checkouts which did not need a new connection reused one."""
+    return {
+        "connects": _stats["connects"],
+        "checkouts": _stats["checkouts"],
+        "reused": _stats["checkouts"] - _stats["connects"],
+        "pool": _engine.sync_engine.pool.status() if _engine is not None else None,
+    }
+
+async def dispose_engine():
+    """Close every pooled connection for this worker process."""
+    global _engine
+    if _engine is not None and _pid == os.getpid():
+        await _engine.dispose()
+        _engine = None
@@ -0,0 +1,45 @@
+import redis.asyncio as redis
+from config import config
+import json
+import logging
+import os
+
+logger = logging.getLogger("subscriber")
+
+# Redis client for this worker process, created on first use like the database engine
+_client = None
+_pid = None
+
+def channel(submission_id: str) -> str:
+    """Return the pub/sub channel for a submission's result events."""
+    return f"submission:{submission_id}"
+
+def get_client():
+    """Return the Redis client for this worker process, or None if events are disabled."""
+    global _client, _pid
+    if not config.RESULTS_REDIS_URL:
+        return None
+    if _client is None or _pid != os.getpid():
+        _client = redis.Redis.from_url(config.RESULTS_REDIS_URL)
+        _pid = os.getpid()
+    return _client
+
+async def publish(submission_id: str, event: dict):
+    """
+    Publish an event for a submission to clients streaming its results. Events are
+    best effort - clients resync from the database, so failures are only logged.
+    """
+    client = get_client()
+    if client is None:
+        return
+    try:
+        await client.publish(channel(submission_id), json.dumps(event))
+    except Exception as e:
+        logger.warning("Failed to publish event", extra={"fields": {"submission_id": submission_id, "error": str(e)}})
+
+async def close_client():
+    """Close the Redis client for this worker process."""
+    global _client
+    if _client is not None and _pid == os.getpid():
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,84 @@
+"""
+Prometheus metrics and structured logging for the subscriber.
+
+Celery runs tasks in several worker processes, so metrics are recorded in prometheus_client's
+multiprocess mode: each process writes its samples to PROMETHEUS_MULTIPROC_DIR, and the main
+worker process serves the combined metrics on METRICS_PORT.
+"""
+
+from config import config
+import json
+import logging
+import os
+import shutil
+import sys
+
+# Must be set before prometheus_client is imported
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", config.METRICS_DIR)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, multiprocess, start_http_server
+
+TASKS = Counter(
+    "subscriber_tasks_total",
+    "Result tasks processed",
+    ["task", "outcome"],
+)
+RESULTS_STORED = Counter(
+    "subscriber_results_stored_total",
+    "Test results inserted, excluding redelivered duplicates",
+)
+DB_WRITE_LATENCY = Histogram(
+    "subscriber_db_write_duration_seconds",
+    "Time taken by database writes, including the commit",
+    ["operation"],
+)
+DB_CONNECTIONS = Counter(
+    "subscriber_db_connections_total",
+    "Database connections opened by the pool",
+)
+DB_CHECKOUTS = Counter(
+    "subscriber_db_checkouts_total",
+    "Database connections checked out of the pool",
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as single line JSON objects, including any `fields` passed in extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str):
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+
+
+def start_metrics_server():
+    """Serve the metrics of every worker process, discarding files left by a previous run."""
+    if not config.METRICS_PORT:
+        return
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(config.METRICS_PORT, registry=registry)
+
+
+def mark_process_dead(pid: int):
+    """Discard the live gauge samples of an exited worker process."""
+    multiprocess.mark_process_dead(pid)
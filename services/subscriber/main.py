@@ -1,10 +1,22 @@
 from celery import Celery
+from celery.signals import setup_logging, worker_init, worker_process_shutdown
 from config import config
-from database import connect_db
+from instrumentation import configure_logging, start_metrics_server, mark_process_dead, TASKS, RESULTS_STORED, DB_WRITE_LATENCY
+from database import connect_db, dispose_engine, pool_stats
+from events import publish, close_client
+from tracing import Span, TraceContext, context_from_task, record_child
+import tracing
 from datetime import datetime, timezone
-from models import Submission
-from sqlalchemy import select
+from models import Submission, SubmissionResult
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
+from typing import Optional
 import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger("subscriber")
 
 celery = Celery("Subscriber")
 
@@ -16,74 +28,201 @@ celery.conf.update(
     task_default_queue=config.OUTPUT_QUEUE_NAME,
     task_routes={
         'result': {'queue': config.OUTPUT_QUEUE_NAME},
+        'result_batch': {'queue': config.OUTPUT_QUEUE_NAME},
     }
 )
 
-@celery.task(name="result", queue=config.OUTPUT_QUEUE_NAME)
-def process_result(result: dict):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try: 
-        return loop.run_until_complete(_process_result(result))
-    finally:
-        loop.close()
+# Event loop for this worker process, kept for its lifetime since the pooled database
+# connections belong to the loop they were opened on
+_loop = None
+_loop_pid = None
+
+def run_async(coro):
+    """Run a coroutine on this worker process's event loop."""
+    global _loop, _loop_pid
+    if _loop is None or _loop.is_closed() or _loop_pid != os.getpid():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+        _loop_pid = os.getpid()
+    return _loop.run_until_complete(coro)
+
+@setup_logging.connect
+def setup_json_logging(**kwargs):
+    """Replace Celery's log format with the structured one used by the other services."""
+    configure_logging(config.LOG_LEVEL)
+
+@worker_init.connect
+def serve_metrics(**kwargs):
+    """Serve metrics from the main worker process, before the pool processes are started."""
+    start_metrics_server()
 
-async def _process_result(result: dict):
+@worker_process_shutdown.connect
+def close_database(pid=None, **kwargs):
+    """Close pooled database connections when a Celery worker process exits."""
+    if _loop is not None and not _loop.is_closed() and _loop_pid == os.getpid():
+        logger.info("Database pool stats", extra={"fields": pool_stats()})
+        _loop.run_until_complete(dispose_engine())
+        _loop.run_until_complete(close_client())
+        _loop.close()
+    mark_process_dead(pid or os.getpid())
+    tracing.flush()
+
+def count_task(task: str, succeeded: bool) -> bool:
+    TASKS.labels(task, "success" if succeeded else "failure").inc()
+    return succeeded
+
+def task_span(task, name: str, submission_id: Optional[str]) -> Span:
+    """
+    Start the span for a result task, continuing the execution service's trace and recording
+    how long the task was queued for.
+    """
+    parent, published_at = context_from_task(task.request.get("trace"))
+    if published_at is not None:
+        record_child("queue wait", parent, published_at, max(0.0, time.time() - published_at), {"queue": config.OUTPUT_QUEUE_NAME})
+    return Span(name, parent, {"submission_id": submission_id})
+
+@celery.task(name="result", queue=config.OUTPUT_QUEUE_NAME, bind=True)
+def process_result(self, result: dict):
+    with task_span(self, "store result", result.get("submission_id")) as span:
+        return count_task("result", run_async(_process_result(result, span.context)))
+
+async def _process_result(result: dict, trace: Optional[TraceContext] = None):
     submission_id = result.get("submission_id")
-    test_number = result.get("test_number", 0)
     if not submission_id:
-        print("Missing submission_id in result payload")
+        logger.warning("Missing submission_id in result payload")
+        return False
+    return await _add_results(submission_id, [result], trace)
+
+@celery.task(name="result_batch", queue=config.OUTPUT_QUEUE_NAME, bind=True)
+def process_result_batch(self, batch: dict):
+    with task_span(self, "store result batch", batch.get("submission_id")) as span:
+        span.tag("results", len(batch.get("results", [])))
+        return count_task("result_batch", run_async(_process_result_batch(batch, span.context)))
+
+async def _process_result_batch(batch: dict, trace: Optional[TraceContext] = None):
+    submission_id = batch.get("submission_id")
+    if not submission_id:
+        logger.warning("Missing submission_id in result batch payload")
         return False
-    
+    return await _add_results(submission_id, batch.get("results", []), trace)
+
+async def _add_results(submission_id: str, results: list, trace: Optional[TraceContext] = None):
+    """
+    Store results for a submission in bulk, skipping tests already processed. Results are
+    upserted into submission_results without locking the submission row; once every test
+    has a result, the status and aggregated results are written to the submission once.
+    Fail fast submissions report the tests they skip, so they complete the same way.
+    """
     db = await connect_db()
     try: 
-        stmt = select(Submission).where(Submission.submission_id == submission_id).with_for_update()
-        result_obj = await db.execute(stmt)
-        submission = result_obj.scalar_one_or_none()
-        
-        if not submission:
-            print(f"Submission with ID {submission_id} not found.")
-            return False
-    
-        if not isinstance(submission.results, list):
-            submission.results = []
-            
-        print(f"Updating submission {submission_id} with new result.")
-
-        existing_test = next((test for test in submission.results if test.get("test_number") == test_number), None)
-        
-        if existing_test:
-            print(f"Test {test_number} already processed for submission {submission_id}")
-            return True
-        
-        print(f"Updating submission {submission_id} with test {test_number} result.")
-
-        submission.results.append({
-            "test_number": result.get("test_number"),
-            "passed": result.get("passed"),
-            "inputs": result.get("inputs"),
-            "expected": result.get("expected"),
-            "output": result.get("output"),
-            "stdout": result.get("stdout"),
-            "error": result.get("error"),
-            "timestamp": datetime.utcnow().isoformat()
-        })
-        submission.updated_at = datetime.utcnow()
-        
-        from sqlalchemy.orm.attributes import flag_modified
-        flag_modified(submission, "results")
-        
-        if len(submission.results) == submission.num_tests:
-            submission.status = "passed" if all(test["passed"] for test in submission.results) else "failed"
-        
-        await db.commit()
-        await db.refresh(submission)
-        
-        print(f"Successfully added test {test_number} to submission {submission_id}. Total tests: {len(submission.results)}")
-        return True
-    except Exception as e:
-        print("Error updating database:", e)
+        rows = [
+            {
+                "submission_id": submission_id,
+                "test_number": result.get("test_number", 0),
+                "passed": bool(result.get("passed")),
+                "result": {
+                    "test_number": result.get("test_number"),
+                    "passed": result.get("passed"),
+                    "inputs": result.get("inputs"),
+                    "expected": result.get("expected"),
+                    "output": result.get("output"),
+                    "stdout": result.get("stdout"),
+                    "error": result.get("error"),
+                    "skipped": bool(result.get("skipped")),
+                    "retried": bool(result.get("retried")),
+                    "runner_failed": bool(result.get("runner_failed")),
+                    "wall_time": result.get("wall_time"),
+                    "cpu_time": result.get("cpu_time"),
+                    "max_rss": result.get("max_rss"),
+                    "timestamp": datetime.utcnow().isoformat()
+                },
+            }
+            for result in results
+        ]
+        if rows:
+            stmt = insert(SubmissionResult).values(rows).on_conflict_do_nothing(
+                index_elements=[SubmissionResult.submission_id, SubmissionResult.test_number]
+            ).returning(SubmissionResult.result)
+            with Span("insert results", trace, {"rows": len(rows)}):
+                start = time.perf_counter()
+                inserted = (await db.execute(stmt)).scalars().all()
+                await db.commit()
+                DB_WRITE_LATENCY.labels("insert_results").observe(time.perf_counter() - start)
+            RESULTS_STORED.inc(len(inserted))
+            logger.debug("Added results", extra={"fields": {
+                "submission_id": submission_id, "added": len(inserted), "received": len(rows)
+            }})
+            if inserted:
+                await publish(submission_id, {"type": "results", "results": list(inserted)})
+
+        # Checked after committing, so whichever transaction stores the last result sees
+        # every result. Also checked for redelivered results, in case an earlier attempt
+        # stored them but failed before completing the submission
+        with Span("complete submission", trace):
+            return await _complete_submission(db, submission_id)
+    except Exception:
+        logger.exception("Error updating database", extra={"fields": {"submission_id": submission_id}})
         await db.rollback()
         return False
     finally:
         await db.close()
+
+async def _complete_submission(db, submission_id: str):
+    """Write the final status and results to the submission if every test has a result."""
+    submission = (await db.execute(
+        select(Submission.num_tests, Submission.status).where(Submission.submission_id == submission_id)
+    )).one_or_none()
+    if not submission:
+        logger.warning("Submission not found", extra={"fields": {"submission_id": submission_id}})
+        return False
+    if submission.status != "pending":
+        return True
+
+    count, all_passed = (await db.execute(
+        select(func.count(), func.bool_and(SubmissionResult.passed))
+        .where(SubmissionResult.submission_id == submission_id)
+    )).one()
+    if count < submission.num_tests:
+        return True
+
+    stored = (await db.execute(
+        select(SubmissionResult.result)
+        .where(SubmissionResult.submission_id == submission_id)
+        .order_by(SubmissionResult.test_number)
+    )).scalars().all()
+
+    # Only the first transaction to see the submission complete updates it
+    status = "passed" if all_passed else "failed"
+    start = time.perf_counter()
+    updated = await db.execute(
+        update(Submission)
+        .where(Submission.submission_id == submission_id, Submission.status == "pending")
+        .values(
+            status=status,
+            results=list(stored),
+            updated_at=datetime.utcnow()
+        )
+    )
+    duplicates = []
+    if updated.rowcount:
+        # Identical submissions made while this one was executing share its results
+        duplicates = (await db.execute(
+            update(Submission)
+            .where(Submission.duplicate_of == submission_id, Submission.status == "pending")
+            .values(
+                status=status,
+                results=list(stored),
+                updated_at=datetime.utcnow()
+            )
+            .returning(Submission.submission_id)
+        )).scalars().all()
+    await db.commit()
+    DB_WRITE_LATENCY.labels("complete_submission").observe(time.perf_counter() - start)
+    if updated.rowcount:
+        logger.info("Submission completed", extra={"fields": {
+            "submission_id": submission_id, "status": status, "tests": count, "duplicates": len(duplicates)
+        }})
+        await publish(submission_id, {"type": "complete", "status": status})
+        for duplicate_id in duplicates:
+            await publish(str(duplicate_id), {"type": "complete", "status": status})
+    return True
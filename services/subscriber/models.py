@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import UUID
@@ -19,9 +19,18 @@ class Submission(Base):
     function_name = Column(String, nullable=False)
     status = Column(String, nullable=False, default='pending')
     results = Column(JSONB, default=list)
+    # Identifies identical code for the same test suite, set by the submission service
+    code_hash = Column(String, nullable=True)
+    # The submission whose execution this one's results were taken from
+    duplicate_of = Column(UUID(as_uuid=True), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Serves a user's history newest first, in keyset order
+    __table_args__ = (
+        Index('ix_submissions_user_created', user_id, created_at.desc(), submission_id.desc()),
+    )
+
     def to_dict(self):
         return {
             'submission_id': self.submission_id,
@@ -33,6 +42,16 @@ class Submission(Base):
             'function_name': self.function_name,
             'status': self.status,
             'results': self.results,
+            'duplicate_of': self.duplicate_of,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
+
+class SubmissionResult(Base):
+    __tablename__ = 'submission_results'
+
+    submission_id = Column(UUID(as_uuid=True), ForeignKey('submissions.submission_id', ondelete='CASCADE'), primary_key=True)
+    test_number = Column(Integer, primary_key=True)
+    passed = Column(Boolean, nullable=False, default=False)
+    result = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,143 @@
+import os
+import uuid
+
+import pytest
+
+# These tests store results in a real Postgres database, which they create tables in
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+pytest.importorskip("celery")
+if not DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+os.environ.update({
+    "SUBMISSION_DATABASE_URL": DATABASE_URL,
+    "CELERY_BROKER_URL": "memory://",
+    "OUTPUT_QUEUE_NAME": "outputq",
+    "RESULTS_REDIS_URL": "",
+})
+
+from sqlalchemy import select
+
+import database
+from main import run_async, _process_result, _process_result_batch
+from models import Base, Submission, SubmissionResult
+
+
+async def create_tables():
+    async with database.get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+run_async(create_tables())
+
+
+def create_submission(num_tests: int, duplicate_of=None) -> str:
+    async def create():
+        db = await database.connect_db()
+        submission = Submission(
+            user_id="user", problem_id="problem", language="python", code="def solve(): pass",
+            num_tests=num_tests, function_name="solve", status="pending", results=[],
+            duplicate_of=duplicate_of,
+        )
+        db.add(submission)
+        await db.commit()
+        await db.close()
+        return str(submission.submission_id)
+    return run_async(create())
+
+
+def load_submission(submission_id: str):
+    async def load():
+        db = await database.connect_db()
+        submission = await db.get(Submission, uuid.UUID(submission_id))
+        stored = (await db.execute(
+            select(SubmissionResult.test_number).where(SubmissionResult.submission_id == submission.submission_id)
+        )).scalars().all()
+        await db.close()
+        return submission, sorted(stored)
+    return run_async(load())
+
+
+def result(submission_id: str, test_number: int, passed: bool = True) -> dict:
+    return {
+        "submission_id": submission_id, "test_number": test_number, "passed": passed,
+        "inputs": [test_number], "expected": "1", "output": "1", "stdout": "", "error": "",
+    }
+
+def test_stores_a_batch_of_results():
+    """Test that a batch stores a row per result without completing a partial submission"""
+    submission_id = create_submission(3)
+
+    assert run_async(_process_result_batch({
+        "submission_id": submission_id, "results": [result(submission_id, 0), result(submission_id, 1)]
+    }))
+
+    submission, stored = load_submission(submission_id)
+    assert stored == [0, 1]
+    assert submission.status == "pending"
+
+def test_completes_once_every_result_is_stored():
+    """Test that the last result writes the status and ordered results to the submission"""
+    submission_id = create_submission(2)
+
+    run_async(_process_result(result(submission_id, 1, passed=False)))
+    run_async(_process_result(result(submission_id, 0)))
+
+    submission, _ = load_submission(submission_id)
+    assert submission.status == "failed"
+    assert [stored["test_number"] for stored in submission.results] == [0, 1]
+
+def test_ignores_redelivered_results():
+    """Test that results delivered again are not stored twice and don't change the status"""
+    submission_id = create_submission(1)
+    batch = {"submission_id": submission_id, "results": [result(submission_id, 0)]}
+
+    assert run_async(_process_result_batch(batch))
+    assert run_async(_process_result_batch({**batch, "results": [result(submission_id, 0, passed=False)]}))
+
+    submission, stored = load_submission(submission_id)
+    assert stored == [0]
+    assert submission.status == "passed"
+    assert len(submission.results) == 1
+
+def test_completes_attached_submissions():
+    """Test that identical submissions attached to an execution are completed with it"""
+    submission_id = create_submission(1)
+    duplicate_id = create_submission(1, duplicate_of=uuid.UUID(submission_id))
+
+    run_async(_process_result(result(submission_id, 0)))
+
+    duplicate, _ = load_submission(duplicate_id)
+    assert duplicate.status == "passed"
+    assert [stored["test_number"] for stored in duplicate.results] == [0]
+
+def test_rejects_results_without_a_submission():
+    """Test that a result without a submission_id is not stored"""
+    assert not run_async(_process_result_batch({"results": []}))
+
+def test_reuses_pooled_connections():
+    """Test that tasks in a worker process share one engine and reuse its connections"""
+    engine = database.get_engine()
+    before = database.pool_stats()
+
+    for _ in range(3):
+        submission_id = create_submission(1)
+        run_async(_process_result(result(submission_id, 0)))
+
+    assert database.get_engine() is engine
+    stats = database.pool_stats()
+    assert stats["checkouts"] > before["checkouts"]
+    assert stats["connects"] == before["connects"]
+
+def test_replaces_the_engine_after_dispose():
+    """Test that a disposed engine, as on worker process shutdown, is created again on use"""
+    engine = database.get_engine()
+
+    run_async(database.dispose_engine())
+
+    assert database.get_engine() is not engine
+    submission_id = create_submission(1)
+    assert run_async(_process_result(result(submission_id, 0)))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
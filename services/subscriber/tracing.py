@@ -0,0 +1,159 @@
+"""
+Tracing for the subscriber.
+
+Result tasks arrive with the trace context of the execution service in their `trace` header,
+along with the time they were published. The worker records spans for the time spent queued
+and for storing the results, so they join the rest of the submission's trace. Spans are
+exported as Zipkin JSON to TRACE_EXPORT_URL - a Zipkin compatible collector
+(http://.../api/v2/spans) or a file (file:///path, one span per line).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from typing import NamedTuple, Optional, Tuple
+
+from config import config
+
+SERVICE_NAME = "subscriber"
+
+# Seconds between exports of finished spans
+FLUSH_INTERVAL = 1.0
+
+logger = logging.getLogger("subscriber")
+
+
+class TraceContext(NamedTuple):
+    trace_id: str
+    span_id: Optional[str] = None
+
+
+def _new_id(length: int) -> str:
+    return os.urandom(length // 2).hex()
+
+
+def context_from_task(header: Optional[dict]) -> Tuple[Optional[TraceContext], Optional[float]]:
+    """
+    Return the trace context and publish time from the `trace` header of a task, or
+    (None, None) if it was sent without one.
+    """
+    if not header or not header.get("trace_id"):
+        return None, None
+    return TraceContext(header["trace_id"], header.get("parent_id")), header.get("published_at")
+
+
+class Span:
+    """
+    A timed operation within a trace, exported when it finishes. Used as a context manager,
+    or finished explicitly with `finish`.
+    """
+
+    def __init__(self, name: str, parent: Optional[TraceContext] = None, tags: Optional[dict] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else _new_id(32)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.id = _new_id(16)
+        self.tags = dict(tags or {})
+        self.timestamp = time.time()
+        self._started = time.perf_counter()
+
+    @property
+    def context(self) -> TraceContext:
+        """The context for spans (and services) called within this span."""
+        return TraceContext(self.trace_id, self.id)
+
+    def tag(self, key: str, value):
+        self.tags[key] = value
+
+    def finish(self):
+        record(self.name, self.context, self.parent_id, self.timestamp, time.perf_counter() - self._started, self.tags)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.tag("error", exc_type.__name__)
+        self.finish()
+
+
+def record(name: str, context: TraceContext, parent_id: Optional[str], timestamp: float, duration: float, tags: Optional[dict] = None):
+    """Export a span which has already finished, given its start time and duration in seconds."""
+    if not config.TRACE_EXPORT_URL:
+        return
+    span = {
+        "traceId": context.trace_id,
+        "id": context.span_id,
+        "name": name,
+        "timestamp": int(timestamp * 1_000_000),
+        "duration": max(1, int(duration * 1_000_000)),
+        "localEndpoint": {"serviceName": SERVICE_NAME},
+        "tags": {k: str(v) for k, v in (tags or {}).items()},
+    }
+    if parent_id:
+        span["parentId"] = parent_id
+    _exporter.add(span)
+
+
+def record_child(name: str, parent: Optional[TraceContext], timestamp: float, duration: float, tags: Optional[dict] = None):
+    """Export a finished span within parent's trace, e.g. for work timed by another process."""
+    if parent is not None:
+        record(name, TraceContext(parent.trace_id, _new_id(16)), parent.span_id, timestamp, duration, tags)
+
+
+class _Exporter:
+    """
+    Buffers finished spans and exports them from a background thread. Forked worker
+    processes start with an empty buffer and their own thread.
+    """
+
+    def __init__(self):
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._spans = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, span: dict):
+        with self._lock:
+            self._spans.append(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if not spans:
+            return
+        url = config.TRACE_EXPORT_URL
+        try:
+            if url.startswith("file://"):
+                with open(url[len("file://"):], "a") as f:
+                    f.writelines(json.dumps(span) + "\n" for span in spans)
+            else:
+                request = urllib.request.Request(
+                    url, data=json.dumps(spans).encode(), headers={"Content-Type": "application/json"}
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            logger.warning("Failed to export spans", extra={"fields": {"spans": len(spans), "error": str(e)}})
+
+
+_exporter = _Exporter()
+
+
+def flush():
+    """Export any buffered spans now, e.g. before the process exits."""
+    _exporter.flush()
+